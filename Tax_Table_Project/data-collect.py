@@ -1,32 +1,204 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+
+DEFAULT_URL = "https://www.sars.gov.za/tax-rates/income-tax/rates-of-tax-for-individuals/"
 
 
-def scrape_table(url, table_class, header_match=None, is_rebate=False):
+class HttpCache:
     """
-    Scrapes a specific table from the webpage based on its class and header match.
+    On-disk HTTP cache for scraped pages.
 
-    :param url: URL of the page to scrape.
+    Each URL keeps its body, its ETag and Last-Modified validators and the tables
+    already parsed from it. Pages are revalidated with If-None-Match and
+    If-Modified-Since, so an unchanged page is neither downloaded nor parsed again.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: Directory for cached pages; created if missing.
+        """
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def load(self, url):
+        """
+        :param url: The page URL.
+        :return: Cached metadata (etag, last_modified, parsed tables) and body, or (None, None).
+        """
+        try:
+            with open(self._path(url, "json"), encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(self._path(url, "html"), encoding="utf-8") as body_file:
+                return meta, body_file.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def store(self, url, meta, body=None):
+        """
+        Saves a page's metadata and, when given, its body. Files are replaced atomically.
+
+        :param url: The page URL.
+        :param meta: Metadata with validators and parsed tables.
+        :param body: The page HTML, or None to keep the cached body.
+        """
+        with self._lock:
+            items = [("json", json.dumps(meta))] + ([("html", body)] if body is not None else [])
+            for suffix, content in items:
+                path = self._path(url, suffix)
+                with open(f"{path}.tmp", "w", encoding="utf-8") as cache_file:
+                    cache_file.write(content)
+                os.replace(f"{path}.tmp", path)
+
+
+class Page:
+    """A fetched page: its HTML, whether it changed since it was cached, and its cache metadata."""
+
+    def __init__(self, url, html, changed, meta=None):
+        self.url = url
+        self.html = html
+        self.changed = changed
+        self.meta = meta if meta is not None else {"url": url, "parsed": {}}
+
+
+def fetch_page(url, cache=None, session=None):
+    """
+    Fetches a page, revalidating a cached copy with a conditional GET.
+
+    :param url: URL of the page.
+    :param cache: HttpCache to use, or None to always download.
+    :param session: requests.Session to use, so concurrent fetches share connections.
+    :return: The Page.
+    :raises requests.exceptions.RequestException: If the page cannot be fetched.
+    """
+    session = session or requests
+    meta, body = cache.load(url) if cache else (None, None)
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=30)
+    if response.status_code == 304 and meta:
+        return Page(url, body, changed=False, meta=meta)
+    response.raise_for_status()
+
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        # Only the server's own validators are sent back; without them the page is downloaded again
+        "last_modified": response.headers.get("Last-Modified"),
+        "parsed": {}
+    }
+    page = Page(url, response.text, changed=True, meta=meta)
+    if cache:
+        cache.store(url, meta, response.text)
+    return page
+
+
+def fetch_pages(urls, cache=None, max_workers=8):
+    """
+    Fetches several pages (e.g. year or archive pages) concurrently.
+
+    :param urls: URLs to fetch.
+    :param cache: HttpCache shared by the fetches.
+    :param max_workers: Maximum concurrent downloads.
+    :return: Dictionary of URL to Page, or to the RequestException that stopped it.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def fetch(url):
+        try:
+            return fetch_page(url, cache, session)
+        except requests.exceptions.RequestException as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(urls, executor.map(fetch, urls)))
+
+
+def parse_table(html, table_class, header_match=None, is_rebate=False):
+    """
+    Parses the target table out of a page.
+    Only <table> elements with the target class are parsed (SoupStrainer); the rest
+    of the document is skipped.
+
+    :param html: The page HTML.
     :param table_class: Class name of the target table.
     :param header_match: Text in the header to identify the specific table.
     :param is_rebate: Set to True for rebate table processing.
     :return: List of dictionaries containing table data.
+    :raises ValueError: If no matching table is found.
     """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("table", class_=table_class))
+
+    tables = soup.find_all("table")
+    if not tables:
+        raise ValueError("No tables found with the specified class!")
 
-        tables = soup.find_all("table", {"class": table_class})
-        if not tables:
-            raise ValueError("No tables found with the specified class!")
+    for table in tables:
+        header = table.find("tr").get_text(strip=True)
+        if header_match and header_match in header:
+            return extract_table_data(table, is_rebate=is_rebate)
 
-        for table in tables:
-            header = table.find("tr").get_text(strip=True)
-            if header_match and header_match in header:
-                return extract_table_data(table, is_rebate=is_rebate)
+    raise ValueError(f"No table found with header matching '{header_match}'!")
 
-        raise ValueError(f"No table found with header matching '{header_match}'!")
+
+def scrape_page_table(page, table_class, header_match=None, is_rebate=False, cache=None):
+    """
+    Parses a table from a fetched page, reusing the tables parsed earlier if the page has not changed.
+
+    :param page: The fetched Page.
+    :param table_class: Class name of the target table.
+    :param header_match: Text in the header to identify the specific table.
+    :param is_rebate: Set to True for rebate table processing.
+    :param cache: HttpCache the page came from, which also keeps its parsed tables.
+    :return: List of dictionaries containing table data.
+    :raises ValueError: If no matching table is found.
+    """
+    parse_key = f"{table_class}|{header_match}|{is_rebate}"
+    if not page.changed and parse_key in page.meta["parsed"]:
+        return page.meta["parsed"][parse_key]
+
+    table_data = parse_table(page.html, table_class, header_match, is_rebate)
+    page.meta["parsed"][parse_key] = table_data
+    if cache:
+        cache.store(page.url, page.meta)
+    return table_data
+
+
+def scrape_table(url, table_class, header_match=None, is_rebate=False, cache=None, page=None):
+    """
+    Scrapes a specific table from the webpage based on its class and header match.
+
+    :param url: URL of the page to scrape.
+    :param table_class: Class name of the target table.
+    :param header_match: Text in the header to identify the specific table.
+    :param is_rebate: Set to True for rebate table processing.
+    :param cache: Optional HttpCache for conditional requests and parsed tables.
+    :param page: Already fetched Page (e.g. from fetch_pages or a saved fixture), skipping the download.
+    :return: List of dictionaries containing table data.
+    """
+    try:
+        page = page or fetch_page(url, cache)
+        return scrape_page_table(page, table_class, header_match, is_rebate, cache)
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the webpage: {e}")
@@ -35,6 +207,17 @@ def scrape_table(url, table_class, header_match=None, is_rebate=False):
         print(str(ve))
         return None
 
+
+def load_fixture(path):
+    """
+    Loads a saved HTML page, for scraping offline.
+
+    :param path: Path of the saved page.
+    :return: A Page that scrape_table can parse without network access.
+    """
+    with open(path, encoding="utf-8") as fixture_file:
+        return Page(f"file://{os.path.abspath(path)}", fixture_file.read(), changed=True)
+
 def extract_table_data(table, is_rebate=False):
     """
     Extracts table data into a structured list of dictionaries.
@@ -134,46 +317,85 @@ def validate_rebate_table_data(rebate_table):
     return validated_table
 
 
-def scrape_tax_table_2024(url):
+def scrape_tax_table_2024(url, cache=None, page=None):
     """
     Scrapes and validates the tax table for 2024.
 
     :param url: URL of the page to scrape.
+    :param cache: Optional HttpCache.
+    :param page: Already fetched Page, e.g. a saved fixture.
     :return: Validated list of dictionaries containing processed tax table data.
     """
-    tax_table = scrape_table(url, "ms-rteTable-default", "Taxable income")
+    tax_table = scrape_table(url, "ms-rteTable-default", "Taxable income", cache=cache, page=page)
     if tax_table:
         return validate_tax_table_data(tax_table)
     return None
 
 
-def scrape_rebate_table(url):
+def scrape_rebate_table(url, cache=None, page=None):
     """
     Scrapes and validates the rebate table.
 
     :param url: URL of the page to scrape.
+    :param cache: Optional HttpCache.
+    :param page: Already fetched Page, e.g. a saved fixture.
     :return: Validated list of dictionaries containing rebate table data.
     """
-    rebate_table = scrape_table(url, "ms-rteTable-default", "Tax Rebate", is_rebate=True)
+    rebate_table = scrape_table(url, "ms-rteTable-default", "Tax Rebate", is_rebate=True, cache=cache, page=page)
     if rebate_table:
         return validate_rebate_table_data(rebate_table)
     return None
 
 
+def scrape_pages(urls, cache=None, max_workers=8):
+    """
+    Fetches pages concurrently and scrapes the tax and rebate tables of each.
+
+    :param urls: URLs of the pages to scrape.
+    :param cache: Optional HttpCache.
+    :param max_workers: Maximum concurrent downloads.
+    :return: Dictionary of URL to {"tax_table": ..., "rebate_table": ..., "changed": ...}.
+    """
+    results = {}
+    for url, page in fetch_pages(urls, cache, max_workers).items():
+        if isinstance(page, Exception):
+            print(f"Error fetching {url}: {page}")
+            results[url] = None
+            continue
+        results[url] = {
+            "tax_table": scrape_tax_table_2024(url, cache, page),
+            "rebate_table": scrape_rebate_table(url, cache, page),
+            "changed": page.changed
+        }
+    return results
+
+
 if __name__ == "__main__":
-    url = "https://www.sars.gov.za/tax-rates/income-tax/rates-of-tax-for-individuals/"
+    parser = argparse.ArgumentParser(description="Scrape the SARS tax and rebate tables.")
+    parser.add_argument("urls", nargs="*", default=[DEFAULT_URL], help="year or archive pages to scrape")
+    parser.add_argument("--cache-dir", default=".scrape-cache", help="on-disk HTTP cache ('' disables it)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--fixture", action="append", help="scrape a saved HTML page instead of fetching")
+    args = parser.parse_args()
 
-    print("Scraping Tax Table for 2024...")
-    tax_table_2024 = scrape_tax_table_2024(url)
-    if tax_table_2024:
-        print("Tax Table for 2024:")
-        for entry in tax_table_2024:
-            print(entry)
+    if args.fixture:
+        pages = {path: load_fixture(path) for path in args.fixture}
+        results = {
+            path: {"tax_table": scrape_tax_table_2024(path, page=page), "rebate_table": scrape_rebate_table(path, page=page)}
+            for path, page in pages.items()
+        }
+    else:
+        results = scrape_pages(args.urls, HttpCache(args.cache_dir) if args.cache_dir else None, args.workers)
 
-    print("\nScraping Rebate Table...")
-    rebate_table = scrape_rebate_table(url)
-    if rebate_table:
-        print("Rebate Table:")
-        for entry in rebate_table:
-            print(entry)
-            
+    for url, result in results.items():
+        if not result:
+            continue
+        print(f"\nScraped {url}" + ("" if result.get("changed", True) else " (unchanged, from cache)"))
+        if result["tax_table"]:
+            print("Tax Table for 2024:")
+            for entry in result["tax_table"]:
+                print(entry)
+        if result["rebate_table"]:
+            print("Rebate Table:")
+            for entry in result["rebate_table"]:
+                print(entry)
@@ -0,0 +1,380 @@
+"""
+Ingests scraped tax and rebate tables into the databases.
+
+    python Tax_Table_Project/ingest.py --financial-year 2026                 # scrape the SARS page
+    python Tax_Table_Project/ingest.py --financial-year 2026 --fixture Tax_Table_Project/fixtures/rates-of-tax-for-individuals.html
+    python Tax_Table_Project/ingest.py --financial-year 2026 --input scraped.json --dry-run
+
+The scraped brackets become the financial year's tax_table period, its tax_brackets
+rows and the tax_period_<year> table the period names, and every rebate year in the
+scraped rebate table is written to rebate_table.
+The data is validated first, compared with what is stored, and only the differences
+are written: changed rows are updated, new rows inserted and stale rows removed with
+one executemany per kind of change, in one transaction per database. Re-running with
+the same data changes nothing. A diff report lists every change.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, inspect, text
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_URL = "https://www.sars.gov.za/tax-rates/income-tax/rates-of-tax-for-individuals/"
+
+
+def load_script(name, file_name):
+    """
+    Imports one of the project scripts, whose file names are not valid module names.
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def period_dates(financial_year):
+    """
+    Returns:
+        tuple: First and last day of a financial year (1 March to the end of February).
+    """
+    effective_date = datetime.date(financial_year - 1, 3, 1)
+    end_date = datetime.date(financial_year, 3, 1) - datetime.timedelta(days=1)
+    return effective_date, end_date
+
+
+def to_date(value):
+    """
+    Convert a stored date (date object or ISO string) into a datetime.date.
+    """
+    if hasattr(value, 'year'):
+        return value
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def validate_brackets(brackets):
+    """
+    Checks that scraped brackets form one consistent table.
+    Args:
+        brackets (list): Dictionaries with min_income, max_income, tax_on_previous_bracket and tax_percentage.
+    Returns:
+        list: Problems found; empty if the brackets are valid.
+    """
+    problems = []
+    if not brackets:
+        return ["No tax brackets"]
+    brackets = sorted(brackets, key=lambda bracket: bracket['min_income'])
+    for position, bracket in enumerate(brackets):
+        if any(bracket.get(field) is None for field in
+               ('min_income', 'max_income', 'tax_on_previous_bracket', 'tax_percentage')):
+            problems.append(f"Bracket {position + 1} is incomplete: {bracket}")
+            continue
+        if bracket['max_income'] < bracket['min_income']:
+            problems.append(f"Bracket starting at {bracket['min_income']} ends before it starts")
+        if not 0 <= bracket['tax_percentage'] <= 100:
+            problems.append(f"Bracket starting at {bracket['min_income']} has tax percentage {bracket['tax_percentage']}")
+        if position and brackets[position - 1].get('max_income') is not None:
+            previous = brackets[position - 1]
+            if bracket['min_income'] != previous['max_income'] + 1:
+                problems.append(f"Brackets ending at {previous['max_income']} and starting at {bracket['min_income']} "
+                                "leave a gap or overlap")
+            if bracket['tax_on_previous_bracket'] < previous['tax_on_previous_bracket']:
+                problems.append(f"Tax on previous brackets decreases at {bracket['min_income']}")
+    return problems
+
+
+def rebates_from_scrape(rebate_table):
+    """
+    Flattens scraped rebate rows ({'age_group': ..., '2026': ..., '2025': ...}) into rebate values.
+    Returns:
+        dict: Rebate values keyed by (financial_year, age_group).
+    """
+    rebates = {}
+    for entry in rebate_table or []:
+        for key, value in entry.items():
+            if key != 'age_group' and value is not None:
+                rebates[(int(key), entry['age_group'])] = float(value)
+    return rebates
+
+
+def validate_rebates(rebates):
+    """
+    Returns:
+        list: Problems found in the rebate values; empty if they are valid.
+    """
+    return [f"Rebate for {age_group} in {year} must be positive" for (year, age_group), value in rebates.items()
+            if value <= 0]
+
+
+def diff_rows(stored, scraped):
+    """
+    Compares stored and scraped rows with the same keys.
+    Args:
+        stored (dict): Stored values by key.
+        scraped (dict): Scraped values by key.
+    Returns:
+        dict: Keys and values to add, update (with old and new values) and remove.
+    """
+    return {
+        'added': {key: value for key, value in scraped.items() if key not in stored},
+        'updated': {key: (stored[key], value) for key, value in scraped.items()
+                    if key in stored and stored[key] != value},
+        'removed': {key: value for key, value in stored.items() if key not in scraped}
+    }
+
+
+def ingest_tax_table(engine, financial_year, brackets, dry_run=False):
+    """
+    Writes a financial year's period and brackets to the tax database, changing only what differs.
+    Args:
+        engine: Tax database engine.
+        financial_year (int): The financial year of the brackets.
+        brackets (list): Validated brackets.
+        dry_run (bool): Report the differences without writing them.
+    Returns:
+        dict: The period and bracket differences.
+    """
+    migration = load_script('migrate_to_tax_brackets', os.path.join('tax', 'migrate-to-tax-brackets.py'))
+    tax_table, tax_brackets = migration.tax_table, migration.tax_brackets
+    effective_date, end_date = period_dates(financial_year)
+    table_name = f"tax_period_{financial_year}"
+
+    with engine.connect() as conn:
+        with conn.begin():  # One transaction for the period and its brackets
+            if not dry_run:
+                migration.metadata.create_all(conn)
+                migration.create_tax_table_indexes(conn)
+
+            table_names = inspect(conn).get_table_names()
+            stored_period = {}
+            stored_brackets = {}
+            stored_period_rows = {}
+            if 'tax_table' in table_names:
+                for row in conn.execute(text("SELECT table_name, effective_date, end_date FROM tax_table "
+                                             "WHERE financial_year = :financial_year"), {'financial_year': financial_year}):
+                    stored_period[financial_year] = (row.table_name, to_date(row.effective_date), to_date(row.end_date))
+            if 'tax_brackets' in table_names:
+                for row in conn.execute(text("SELECT min_income, max_income, tax_on_previous_bracket, tax_percentage "
+                                             "FROM tax_brackets WHERE financial_year = :financial_year"),
+                                        {'financial_year': financial_year}):
+                    stored_brackets[row.min_income] = (row.max_income, float(row.tax_on_previous_bracket),
+                                                       float(row.tax_percentage))
+
+            if table_name in table_names:
+                for row in conn.execute(text("SELECT min_income, max_income, tax_on_previous_bracket, tax_percentage "
+                                             f"FROM {table_name}")):
+                    stored_period_rows[row.min_income] = (row.max_income, float(row.tax_on_previous_bracket),
+                                                          float(row.tax_percentage))
+
+            scraped_brackets = {
+                bracket['min_income']: (bracket['max_income'], float(bracket['tax_on_previous_bracket']),
+                                        float(bracket['tax_percentage']))
+                for bracket in brackets
+            }
+            period_diff = diff_rows(stored_period, {financial_year: (table_name, effective_date, end_date)})
+            period_diff['removed'] = {}
+            bracket_diff = diff_rows(stored_brackets, scraped_brackets)
+            # The period table tax_table.table_name names, which migrate-to-tax-brackets.py reads back
+            period_table_diff = diff_rows(stored_period_rows, scraped_brackets)
+
+            if not dry_run:
+                if period_diff['added']:
+                    conn.execute(tax_table.insert(), [
+                        {'table_name': table_name, 'financial_year': financial_year,
+                         'effective_date': effective_date, 'end_date': end_date}
+                    ])
+                if period_diff['updated']:
+                    conn.execute(tax_table.update().where(tax_table.c.financial_year == financial_year).values(
+                        table_name=table_name, effective_date=effective_date, end_date=end_date))
+
+                def bracket_rows(changes):
+                    return [{'financial_year': financial_year, 'min_income': min_income, 'max_income': values[0],
+                             'tax_on_previous_bracket': values[1], 'tax_percentage': values[2]}
+                            for min_income, values in changes.items()]
+
+                if bracket_diff['added']:
+                    conn.execute(tax_brackets.insert(), bracket_rows(bracket_diff['added']))
+                if bracket_diff['updated']:
+                    conn.execute(text(
+                        "UPDATE tax_brackets SET max_income = :max_income, "
+                        "tax_on_previous_bracket = :tax_on_previous_bracket, tax_percentage = :tax_percentage "
+                        "WHERE financial_year = :financial_year AND min_income = :min_income"
+                    ), bracket_rows({key: new for key, (old, new) in bracket_diff['updated'].items()}))
+                if bracket_diff['removed']:
+                    conn.execute(text("DELETE FROM tax_brackets WHERE financial_year = :financial_year "
+                                      "AND min_income = :min_income"), bracket_rows(bracket_diff['removed']))
+
+                if table_name not in table_names or any(period_table_diff.values()):
+                    write_period_table(conn, table_name, effective_date, end_date, brackets)
+
+    return {'tax_table': period_diff, 'tax_brackets': bracket_diff, table_name: period_table_diff}
+
+
+def write_period_table(conn, table_name, effective_date, end_date, brackets):
+    """
+    Creates a tax_period_<year> table, as initial-tables.py does, or replaces its rows with the brackets.
+    Re-running migrate-to-tax-brackets.py then folds in the same brackets instead of stale ones.
+    Args:
+        conn: Open connection to the tax database, inside the ingest transaction.
+        table_name (str): Name of the period table.
+        effective_date (datetime.date): First day of the period.
+        end_date (datetime.date): Last day of the period.
+        brackets (list): Validated brackets.
+    """
+    period_table = Table(table_name, MetaData(),
+                         Column('id', Integer, primary_key=True, autoincrement=True),
+                         Column('min_income', Integer),
+                         Column('max_income', Integer),
+                         Column('tax_on_previous_bracket', Float),
+                         Column('tax_percentage', Float))
+    period_table.create(conn, checkfirst=True)
+
+    # Older period tables carry the period dates on every row
+    has_dates = {'effective_date', 'end_date'} <= {column['name'] for column in inspect(conn).get_columns(table_name)}
+    dates = {'effective_date': effective_date, 'end_date': end_date} if has_dates else {}
+    columns = ['min_income', 'max_income', 'tax_on_previous_bracket', 'tax_percentage'] + list(dates)
+    conn.execute(text(f"DELETE FROM {table_name}"))
+    conn.execute(text(f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join(':' + column for column in columns)})"),
+                 [{**{column: bracket[column] for column in columns[:4]}, **dates} for bracket in brackets])
+
+
+def ingest_rebates(engine, rebates, dry_run=False):
+    """
+    Writes rebate values to the rebate database, changing only what differs.
+    Stored rebates that were not scraped are left alone.
+    Args:
+        engine: Rebate database engine.
+        rebates (dict): Rebate values keyed by (financial_year, age_group).
+        dry_run (bool): Report the differences without writing them.
+    Returns:
+        dict: The rebate differences.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            if 'rebate_table' not in inspect(conn).get_table_names():
+                if dry_run:
+                    return {'rebate_table': diff_rows({}, rebates)}
+                metadata = MetaData()
+                Table('rebate_table', metadata,
+                      Column('id', Integer, primary_key=True, autoincrement=True),
+                      Column('age_group', String),
+                      Column('financial_year', Integer),
+                      Column('rebate_value', Float)).create(conn)
+
+            # The service reads financial_year/rebate_value; initial-table.py created year/rebate_amount
+            columns = {column['name'] for column in inspect(conn).get_columns('rebate_table')}
+            year_column = 'financial_year' if 'financial_year' in columns else 'year'
+            value_column = 'rebate_value' if 'rebate_value' in columns else 'rebate_amount'
+
+            years = sorted({year for year, _ in rebates})
+            stored = {}
+            if years:
+                rows = conn.execute(text(
+                    f"SELECT {year_column} AS financial_year, age_group, {value_column} AS rebate_value "
+                    f"FROM rebate_table WHERE {year_column} IN ({', '.join(str(year) for year in years)})"
+                ))
+                for row in rows:
+                    stored[(row.financial_year, row.age_group)] = float(row.rebate_value)
+
+            rebate_diff = diff_rows(stored, rebates)
+            rebate_diff['removed'] = {}
+
+            if not dry_run:
+                if rebate_diff['added']:
+                    conn.execute(text(
+                        f"INSERT INTO rebate_table (age_group, {year_column}, {value_column}) "
+                        "VALUES (:age_group, :financial_year, :rebate_value)"
+                    ), [{'age_group': age_group, 'financial_year': year, 'rebate_value': value}
+                        for (year, age_group), value in rebate_diff['added'].items()])
+                if rebate_diff['updated']:
+                    conn.execute(text(
+                        f"UPDATE rebate_table SET {value_column} = :rebate_value "
+                        f"WHERE {year_column} = :financial_year AND age_group = :age_group"
+                    ), [{'age_group': age_group, 'financial_year': year, 'rebate_value': new}
+                        for (year, age_group), (old, new) in rebate_diff['updated'].items()])
+
+    return {'rebate_table': rebate_diff}
+
+
+def load_scraped_data(args):
+    """
+    Reads the tables to ingest from a JSON file, a saved page or the SARS website.
+    Returns:
+        tuple: The scraped tax brackets and rebate rows.
+    """
+    if args.input:
+        with open(args.input, encoding='utf-8') as input_file:
+            scraped = json.load(input_file)
+        return scraped.get('tax_table'), scraped.get('rebate_table')
+
+    data_collect = load_script('data_collect', 'data-collect.py')
+    page = data_collect.load_fixture(args.fixture) if args.fixture else None
+    url = args.fixture or args.url
+    return data_collect.scrape_tax_table_2024(url, page=page), data_collect.scrape_rebate_table(url, page=page)
+
+
+def print_report(report):
+    """
+    Prints the differences, one line per changed row.
+    """
+    for table, diff in report.items():
+        changes = sum(len(rows) for rows in diff.values())
+        print(f"{table}: {len(diff['added'])} added, {len(diff['updated'])} updated, {len(diff['removed'])} removed")
+        if not changes:
+            continue
+        for key, value in diff['added'].items():
+            print(f"  + {key}: {value}")
+        for key, (old, new) in diff['updated'].items():
+            print(f"  ~ {key}: {old} -> {new}")
+        for key, value in diff['removed'].items():
+            print(f"  - {key}: {value}")
+
+
+def report_as_json(report):
+    """Converts a report into JSON-serializable lists."""
+    return {
+        table: {
+            kind: [{'key': key, 'value': value} for key, value in rows.items()]
+            for kind, rows in diff.items()
+        }
+        for table, diff in report.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest scraped tax and rebate tables into the databases.")
+    parser.add_argument('--financial-year', type=int, required=True, help="financial year of the scraped brackets")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--url', default=DEFAULT_URL, help="page to scrape")
+    source.add_argument('--fixture', help="saved HTML page to scrape offline")
+    source.add_argument('--input', help="JSON file with tax_table and rebate_table lists")
+    parser.add_argument('--tax-db-uri', default=os.getenv("TAX_DB_URI", 'sqlite:///app/databases/tax_database.db'))
+    parser.add_argument('--rebate-db-uri', default=os.getenv("REBATE_DB_URI", 'sqlite:///app/databases/rebate_database.db'))
+    parser.add_argument('--dry-run', action='store_true', help="report the differences without writing them")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    brackets, rebate_table = load_scraped_data(args)
+    rebates = rebates_from_scrape(rebate_table)
+    problems = validate_brackets(brackets) + validate_rebates(rebates)
+    if problems:
+        for problem in problems:
+            print(f"Invalid data: {problem}")
+        raise SystemExit(1)
+
+    try:
+        report = ingest_tax_table(create_engine(args.tax_db_uri), args.financial_year, brackets, args.dry_run)
+    except ValueError as e:
+        print(f"Ingest aborted: {e}")
+        raise SystemExit(1)
+    if rebates:
+        report.update(ingest_rebates(create_engine(args.rebate_db_uri), rebates, args.dry_run))
+
+    if args.json:
+        print(json.dumps(report_as_json(report), indent=2, default=str))
+    else:
+        print_report(report)
+        print("Dry run: nothing was written." if args.dry_run else "Ingest committed.")
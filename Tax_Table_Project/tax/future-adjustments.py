@@ -1,52 +1,47 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Float, Date
-from datetime import datetime
+import importlib.util
+import os
+
+from sqlalchemy import create_engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 # Database connection
-engine = create_engine('sqlite:///app/databases/tax_database.db')  # Ensure the path to your database file is correct
-metadata = MetaData()
+engine = create_engine(os.getenv("TAX_DB_URI", 'sqlite:///app/databases/tax_database.db'))  # Ensure the path to your database file is correct
 
-def create_and_populate_future_table(table_name, effective_date, end_date, tax_data):
+
+def load_ingest():
     """
-    Creates and populates a new table in the database.
-    Args:
-        table_name (str): The name of the table to create (e.g., tax_period_<year>).
-        effective_date (datetime.date): The effective date for the table.
-        end_date (datetime.date): The end date for the table.
-        tax_data (list): The data to populate the table with.
+    Imports ingest.py, which writes a financial year to every table the brackets are kept in.
     """
-    # Define table schema
-    table = Table(
-        table_name, metadata,
-        Column('id', Integer, primary_key=True, autoincrement=True),
-        Column('min_income', Integer),
-        Column('max_income', Integer),
-        Column('tax_on_previous_bracket', Float),
-        Column('tax_percentage', Float),
-        Column('effective_date', Date),
-        Column('end_date', Date)
-    )
+    spec = importlib.util.spec_from_file_location('ingest', os.path.join(os.path.dirname(HERE), 'ingest.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
-    # Create the table in the database
-    metadata.create_all(engine)
-    print(f"Table '{table_name}' created successfully!")
 
-    # Add effective_date and end_date to each row in tax_data
-    for entry in tax_data:
-        entry['effective_date'] = effective_date
-        entry['end_date'] = end_date
-
-    # Insert data into the table
-    with engine.connect() as conn:
-        with conn.begin():  # Begin a transaction
-            conn.execute(table.insert(), tax_data)
-            print(f"Data committed into '{table_name}' successfully!")
+def create_and_populate_future_table(financial_year, tax_data):
+    """
+    Writes a future financial year's brackets to the tax database: its tax_table period, its rows in
+    the consolidated tax_brackets table the service loads, and its tax_period_<year> table.
+    Running the script again with corrected values updates all three, so a migrated year is never
+    left serving the old brackets from tax_brackets.
+    Args:
+        financial_year (int): The financial year of the brackets (1 March to the end of February).
+        tax_data (list): The brackets to store.
+    Returns:
+        dict: The period and bracket differences written.
+    """
+    ingest = load_ingest()
+    problems = ingest.validate_brackets(tax_data)
+    if problems:
+        raise ValueError("; ".join(problems))
+    report = ingest.ingest_tax_table(engine, financial_year, tax_data)
+    ingest.print_report(report)
+    return report
 
 if __name__ == "__main__":
     # Update the following values before running the script:
     newest_year = 2027  # Update to the desired year
-    effective_date = datetime.strptime(f"{newest_year - 1}-03-01", "%Y-%m-%d").date()
-    end_date = datetime.strptime(f"{newest_year}-02-28", "%Y-%m-%d").date()
-    table_name = f"tax_period_{newest_year}"  # Dynamic table name based on the year
 
     # Tax bracket data: Update the values as needed
     tax_data = [
@@ -59,10 +54,5 @@ if __name__ == "__main__":
         {'min_income': 1817001, 'max_income': 9999999999, 'tax_on_previous_bracket': 644489, 'tax_percentage': 45},
     ]
 
-    # Create and populate the new table
-    create_and_populate_future_table(
-        table_name=table_name,
-        effective_date=effective_date,
-        end_date=end_date,
-        tax_data=tax_data
-    )
\ No newline at end of file
+    # Write the brackets to tax_table, tax_brackets and the tax_period_<year> table
+    create_and_populate_future_table(financial_year=newest_year, tax_data=tax_data)
@@ -0,0 +1,180 @@
+import os
+import sys
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, Integer, Float, Date, String, Index,
+                        PrimaryKeyConstraint, inspect, text)
+from datetime import datetime
+
+# Database connection
+engine = create_engine(os.getenv("TAX_DB_URI", 'sqlite:///app/databases/tax_database.db'))  # Ensure the path to your database file is correct
+metadata = MetaData()
+
+# Period metadata, as created by initial-tables.py
+tax_table = Table(
+    'tax_table', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('table_name', String, nullable=False),  # Name of the original tax period table
+    Column('financial_year', Integer, nullable=False),
+    Column('effective_date', Date, nullable=False),
+    Column('end_date', Date, nullable=False),
+    Index('ix_tax_table_financial_year', 'financial_year', unique=True),
+    Index('ix_tax_table_period', 'effective_date', 'end_date')
+)
+
+# Consolidated tax brackets of every financial year
+tax_brackets = Table(
+    'tax_brackets', metadata,
+    Column('financial_year', Integer, nullable=False),  # Links to tax_table.financial_year
+    Column('min_income', Integer, nullable=False),
+    Column('max_income', Integer, nullable=False),
+    Column('tax_on_previous_bracket', Float, nullable=False),
+    Column('tax_percentage', Float, nullable=False),
+    PrimaryKeyConstraint('financial_year', 'min_income'),
+    # Covering index: a bracket lookup is answered from the index alone
+    Index('ix_tax_brackets_lookup', 'financial_year', 'min_income', 'max_income',
+          'tax_on_previous_bracket', 'tax_percentage')
+)
+
+
+def to_date(value):
+    """
+    Convert a stored date (date object or ISO string) into a datetime.date.
+    """
+    if hasattr(value, 'year'):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def read_period_tables(conn):
+    """
+    Reads every tax_period_<year> table with its period dates.
+    Args:
+        conn: An open connection to the tax database.
+    Returns:
+        list: One dictionary per period with table_name, financial_year, effective_date, end_date and brackets.
+    """
+    inspector = inspect(conn)
+    table_names = inspector.get_table_names()
+
+    period_metadata = {}
+    if 'tax_table' in table_names:
+        for row in conn.execute(text("SELECT table_name, financial_year, effective_date, end_date FROM tax_table;")):
+            period_metadata.setdefault(row.table_name, row)
+
+    periods = []
+    for table_name in table_names:
+        if not table_name.startswith('tax_period_'):
+            continue
+
+        columns = {column['name'] for column in inspector.get_columns(table_name)}
+        has_dates = {'effective_date', 'end_date'} <= columns
+        select_dates = ", effective_date, end_date" if has_dates else ""
+        rows = conn.execute(text(
+            f"SELECT min_income, max_income, tax_on_previous_bracket, tax_percentage{select_dates} FROM {table_name};"
+        )).fetchall()
+
+        if table_name in period_metadata:
+            financial_year = period_metadata[table_name].financial_year
+            effective_date = to_date(period_metadata[table_name].effective_date)
+            end_date = to_date(period_metadata[table_name].end_date)
+        elif has_dates and rows:
+            financial_year = int(table_name.rsplit('_', 1)[-1])
+            effective_date = min(to_date(row.effective_date) for row in rows)
+            end_date = max(to_date(row.end_date) for row in rows)
+        else:
+            print(f"Skipping '{table_name}': no period dates found.")
+            continue
+
+        periods.append({
+            'table_name': table_name,
+            'financial_year': financial_year,
+            'effective_date': effective_date,
+            'end_date': end_date,
+            'brackets': [
+                {'financial_year': financial_year, 'min_income': row.min_income, 'max_income': row.max_income,
+                 'tax_on_previous_bracket': row.tax_on_previous_bracket, 'tax_percentage': row.tax_percentage}
+                for row in rows
+            ]
+        })
+
+    return periods
+
+
+def duplicate_financial_years(conn):
+    """
+    Finds financial years with more than one tax_table row, which the unique
+    ix_tax_table_financial_year index cannot be created over.
+    Args:
+        conn: An open connection to the tax database.
+    Returns:
+        dict: The table names of the rows of each duplicated financial year.
+    """
+    if 'tax_table' not in inspect(conn).get_table_names():
+        return {}
+    duplicates = {}
+    for row in conn.execute(text(
+        "SELECT financial_year, table_name FROM tax_table WHERE financial_year IN "
+        "(SELECT financial_year FROM tax_table GROUP BY financial_year HAVING COUNT(*) > 1) "
+        "ORDER BY financial_year, id;"
+    )):
+        duplicates.setdefault(row.financial_year, []).append(row.table_name)
+    return duplicates
+
+
+def create_tax_table_indexes(conn):
+    """
+    Creates the tax_table indexes that are missing; create_all skips the indexes of a tax_table that already exists.
+    Args:
+        conn: An open connection to the tax database.
+    Raises:
+        ValueError: If tax_table has several rows for a financial year, listing them.
+    """
+    duplicates = duplicate_financial_years(conn)
+    if duplicates:
+        listing = "; ".join(f"{financial_year}: {', '.join(table_names)}"
+                            for financial_year, table_names in duplicates.items())
+        raise ValueError(f"tax_table has more than one row for these financial years ({listing}). "
+                         "Delete the extra rows so each year has one period, then run the migration again.")
+    for index in tax_table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def migrate_to_tax_brackets():
+    """
+    Folds every tax_period_<year> table into the consolidated tax_brackets table.
+    Missing tax_table rows are added, and brackets already migrated for a year are
+    replaced, so the migration can be re-run safely. The original period tables
+    are left in place.
+    """
+    with engine.connect() as conn:
+        with conn.begin():  # Begin a transaction
+            metadata.create_all(conn)
+            create_tax_table_indexes(conn)
+            print("Table 'tax_brackets' and its indexes created successfully!")
+
+            periods = read_period_tables(conn)
+            existing_years = {row[0] for row in conn.execute(text("SELECT financial_year FROM tax_table;"))}
+
+            for period in periods:
+                financial_year = period['financial_year']
+                if financial_year not in existing_years:
+                    conn.execute(tax_table.insert(), {
+                        'table_name': period['table_name'],
+                        'financial_year': financial_year,
+                        'effective_date': period['effective_date'],
+                        'end_date': period['end_date']
+                    })
+
+                conn.execute(tax_brackets.delete().where(tax_brackets.c.financial_year == financial_year))
+                if period['brackets']:
+                    conn.execute(tax_brackets.insert(), period['brackets'])
+                print(f"Migrated {len(period['brackets'])} brackets from '{period['table_name']}'.")
+
+            print(f"Data committed into 'tax_brackets' for {len(periods)} periods successfully!")
+
+
+if __name__ == "__main__":
+    try:
+        migrate_to_tax_brackets()
+    except ValueError as e:
+        sys.exit(f"Migration aborted: {e}")
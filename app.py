@@ -1,38 +1,275 @@
-from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, text
-import os
+import time
+
+# Startup timing covers the imports below
+app_import_started = time.perf_counter()
+
+from flask import Flask, Response, abort, g, request, jsonify, stream_with_context
+import atexit
+import hashlib
+import hmac
+import json
 import logging
-import datetime
-import requests
+import math
+from downstream import DownstreamClient, DownstreamError
+from delivery_queue import DeliveryQueue, QueueFullError
+from single_flight import SingleFlightCache, caller_key
+from app_config import (
+    TAX_DB_URI, REBATE_DB_URI, USER_INPUT_SERVICE_BASE_URL, CALCULATION_SERVICE_BASE_URL, LOCAL_PAYE_MODE,
+    ASYNC_DELIVERY, USER_INPUT_CACHE_TTL, USER_INPUT_CACHE_SIZE, DATA_RELOAD_INTERVAL, ADMIN_TOKEN,
+    TAX_SNAPSHOT_PATH, DATABASE_PATHS, READY_REQUIRE_HEALTHY_DOWNSTREAM, TABLE_CACHE_MAX_AGE, TAX_CURVE_MAX_POINTS,
+    TAX_CURVE_MAX_VALUES, TAX_FREE_SHORT_CIRCUIT, CALCULATION_SERVICE_FORMAT
+)
+from tax_index import load_tax_index, verify_tax_index
+from snapshot import SnapshotError, load_snapshot
+from index_reloader import TaxIndexHolder
+from readiness import Readiness
+from metrics import CONTENT_TYPE, MetricsRegistry
+from profiling import profiled_view, timed_stage
+import request_log
+import wire_format
+from bulk import BULK_CHUNK_SIZE, BULK_WORKERS, INPUT_FORMATS, WorkerPool, stream_results
+from deduction_tables import NO_BRACKET, load_deduction_tables, verify_deduction_tables
+from tax_details import (
+    build_rebate_table, build_tax_curves, build_tax_table, build_threshold_table, calculate_annual_tax,
+    lookup_tax_details, parse_income_points, resolve_tax_details_batch
+)
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-
-# Database connection setup
-TAX_DB_URI = os.getenv("TAX_DB_URI", "sqlite:///C:/Users/USER-PC/Desktop/Salary Calculator Backend Development/Databases/tax_database.db")
-REBATE_DB_URI = os.getenv("REBATE_DB_URI", "sqlite:///C:/Users/USER-PC/Desktop/Salary Calculator Backend Development/Databases/rebate_database.db")
-USER_INPUT_SERVICE_BASE_URL = os.getenv("USER_INPUT_SERVICE_BASE_URL", "https://salary-calculator-user-input.onrender.com")
-CALCULATION_SERVICE_BASE_URL = os.getenv("CALCULATION_SERVICE_BASE_URL", "https://salary-calculator-calculation-service.onrender.com")
+# Startup timings and warm-up state reported by /ready
+readiness = Readiness(app_import_started, require_healthy_downstream=READY_REQUIRE_HEALTHY_DOWNSTREAM)
+readiness.record("imports", app_import_started)
 
-# Validate environment variables
-if not TAX_DB_URI or not REBATE_DB_URI:
-    raise ValueError("Environment variables TAX_DB_URI and REBATE_DB_URI must be set.")
+# Configure logging: plain text, or JSON written from a background thread
+request_log.configure_logging()
 
 logging.info(f"TAX_DB_URI: {TAX_DB_URI}")
 logging.info(f"REBATE_DB_URI: {REBATE_DB_URI}")
 logging.info(f"USER_INPUT_SERVICE_BASE_URL: {USER_INPUT_SERVICE_BASE_URL}")
 logging.info(f"CALCULATION_SERVICE_BASE_URL: {CALCULATION_SERVICE_BASE_URL}")
+logging.info(f"LOCAL_PAYE_MODE: {LOCAL_PAYE_MODE}")
+logging.info(f"ASYNC_DELIVERY: {ASYNC_DELIVERY}")
+logging.info(f"USER_INPUT_CACHE_TTL: {USER_INPUT_CACHE_TTL}")
+logging.info(f"DATA_RELOAD_INTERVAL: {DATA_RELOAD_INTERVAL}")
+logging.info(f"TAX_SNAPSHOT_PATH: {TAX_SNAPSHOT_PATH}")
 
-# Create database engines
+# Database engines, created on first use so that starting from a snapshot never imports SQLAlchemy
+database_engines = {}
+
+def get_database_engines():
+    """
+    Create the database engines on first use.
+    Returns:
+        tuple: The tax and rebate database engines.
+    """
+    if not database_engines:
+        from sqlalchemy import create_engine
+        try:
+            database_engines["tax"] = create_engine(TAX_DB_URI, future=True)
+            database_engines["rebate"] = create_engine(REBATE_DB_URI, future=True)
+        except Exception as e:
+            logging.error(f"Error creating database engines: {e}")
+            raise
+    return database_engines["tax"], database_engines["rebate"]
+
+def load_tax_data():
+    """
+    Load the tax and rebate tables from the snapshot, or from the databases
+    when the snapshot is missing, corrupt or stale.
+    Returns:
+        TaxIndex: The loaded index.
+    """
+    if TAX_SNAPSHOT_PATH:
+        try:
+            return load_snapshot(TAX_SNAPSHOT_PATH, DATABASE_PATHS)
+        except SnapshotError as e:
+            logging.info(f"Loading tax and rebate tables from the databases: {e}")
+    tax_engine, rebate_engine = get_database_engines()
+    return load_tax_index(tax_engine, rebate_engine)
+
+# Load tax periods, brackets and rebates into memory so requests never query the databases.
+# The index is rebuilt in the background whenever the database files change.
+tables_started = time.perf_counter()
 try:
-    tax_engine = create_engine(TAX_DB_URI, future=True)
-    rebate_engine = create_engine(REBATE_DB_URI, future=True)
+    tax_index_holder = TaxIndexHolder(load_tax_data, DATABASE_PATHS, poll_interval=DATA_RELOAD_INTERVAL,
+                                      on_reload=lambda tax_index: verify_tables(readiness, tax_index))
 except Exception as e:
-    logging.error(f"Error creating database engines: {e}")
+    logging.error(f"Error loading tax and rebate tables: {e}")
     raise
+readiness.record("load_tables", tables_started)
+
+# Pooled keep-alive clients for the downstream services
+user_input_client = DownstreamClient("User Input Service", USER_INPUT_SERVICE_BASE_URL)
+calculation_client = DownstreamClient("Calculation Service", CALCULATION_SERVICE_BASE_URL)
+
+# Concurrent User Input Service fetches for the same caller share one outbound call
+user_input_cache = SingleFlightCache(ttl=USER_INPUT_CACHE_TTL, max_size=USER_INPUT_CACHE_SIZE)
+
+# Background delivery queue to the Calculation Service, flushed on shutdown
+delivery_queue = None
+if ASYNC_DELIVERY:
+    delivery_queue = DeliveryQueue(
+        calculation_client, "/receive-tax-rebate-details", wire_format=CALCULATION_SERVICE_FORMAT
+    )
+
+# Process pool for bulk chunks, started by the first bulk request of each process and shared by the rest
+bulk_pool = None
+if BULK_WORKERS:
+    bulk_pool = WorkerPool(BULK_WORKERS, (TAX_SNAPSHOT_PATH, TAX_DB_URI, REBATE_DB_URI, DATABASE_PATHS))
+
+def shutdown():
+    """
+    Flush the delivery queue and stop the bulk worker pool of this process.
+    Runs at interpreter exit, and explicitly in pre-fork workers, which leave with os._exit.
+    """
+    if delivery_queue is not None:
+        delivery_queue.stop()
+    if bulk_pool is not None:
+        bulk_pool.shutdown()
+
+atexit.register(shutdown)
+
+# Prometheus metrics, served by /metrics
+metrics = MetricsRegistry()
+stage_latency = metrics.histogram(
+    "tax_details_stage_duration_seconds", "Time spent in each stage of resolving tax details.", ("stage",)
+)
+# Times a stage for the histogram and for the request's log summary
+time_stage = request_log.stage_timer(stage_latency)
+request_outcomes = metrics.counter(
+    "tax_details_requests_total", "Tax details requests by endpoint and outcome.", ("endpoint", "outcome")
+)
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint",)
+)
+http_responses = metrics.counter(
+    "http_responses_total", "HTTP responses by endpoint and status code.", ("endpoint", "status")
+)
+
+def collect_pool_gauges():
+    """
+    Read the connection pool state of the database engines, if they have been created.
+    Returns:
+        dict: Connection counts by (database, state).
+    """
+    values = {}
+    for database, engine in database_engines.items():
+        for state in ("size", "checkedin", "checkedout", "overflow"):
+            reader = getattr(engine.pool, state, None)
+            if reader:
+                values[(database, state)] = reader()
+    return values
+
+def collect_downstream_errors():
+    """
+    Returns:
+        dict: Failed downstream calls by (service, kind).
+    """
+    return {
+        (client.name, kind): count
+        for client in (user_input_client, calculation_client) for kind, count in list(client.errors.items())
+    }
+
+def collect_circuit_states():
+    """
+    Returns:
+        dict: 1 for the current circuit breaker state of each downstream service.
+    """
+    return {(client.name, client.circuit_breaker.state): 1 for client in (user_input_client, calculation_client)}
+
+metrics.gauge("db_pool_connections", "Database connection pool state.", ("database", "state"), collect_pool_gauges)
+metrics.collected_counter("downstream_errors_total", "Failed downstream calls by service and kind.",
+                          ("service", "kind"), collect_downstream_errors)
+metrics.gauge("downstream_circuit_state", "Circuit breaker state of each downstream service.",
+              ("service", "state"), collect_circuit_states)
+metrics.collected_counter("user_input_cache_events_total", "User Input Service cache hits, misses and coalesced calls.",
+                          ("event",), lambda: {(event,): count for event, count in user_input_cache.stats().items()
+                                               if event in ("hits", "misses", "coalesced")})
+metrics.collected_counter("log_records_dropped_total", "Log records dropped because the log queue was full.",
+                          (), lambda: {(): request_log.dropped_records()})
+if delivery_queue:
+    metrics.gauge("delivery_queue_payloads", "Calculation Service deliveries by state.", ("state",),
+                  lambda: {("pending",): delivery_queue.pending(), ("delivered",): delivery_queue.delivered,
+                           ("dead_lettered",): delivery_queue.dead_lettered})
+
+def endpoint_label():
+    """
+    Returns:
+        str: The endpoint of the current request for metric labels, or "unmatched" if no route matched.
+    """
+    return request.endpoint or "unmatched"
+
+def record_outcome(outcome):
+    """
+    Count the outcome of a tax details request.
+    Args:
+        outcome (str): e.g. "ok", "no_tax_period" or "calculation_service_error".
+    """
+    request_outcomes.inc(endpoint_label(), outcome)
+    request_log.annotate(outcome=outcome)
+
+def verify_tables(readiness, tax_index):
+    """
+    Verify an index and build its vectorized lookup arrays and deduction tables,
+    at warm-up and again whenever a reload swaps in a new index.
+    Args:
+        readiness (Readiness): Receives the problems found, which keep /ready failing.
+        tax_index (TaxIndex): The index to verify.
+    """
+    try:
+        problems = verify_tax_index(tax_index)
+        for period in tax_index.periods:
+            tax_index.bracket_arrays(period)
+        problems += verify_deduction_tables(get_deduction_tables(tax_index), tax_index)
+    except Exception as e:
+        logging.error(f"Error verifying tax and rebate tables: {e}")
+        problems = [f"Verification failed: {e}"]
+    readiness.table_problems = problems
+
+def warm_up(readiness):
+    """
+    Verify the loaded tables, build the vectorized lookup arrays and deduction tables
+    and open a pooled connection to each downstream service, recording its health.
+    Args:
+        readiness (Readiness): Receives the results and timings.
+    """
+    started = time.perf_counter()
+    verify_tables(readiness, tax_index_holder.current)
+    readiness.record("verify_tables", started)
+
+    started = time.perf_counter()
+    readiness.downstream = {
+        client.name: client.check_health() for client in (user_input_client, calculation_client)
+    }
+    readiness.record("downstream_health", started)
+
+@app.before_request
+def start_background_tasks():
+    """Make sure this process has warmed up and polls for changed tax and rebate data."""
+    readiness.ensure_warm_up(warm_up)
+    tax_index_holder.ensure_polling()
+
+@app.before_request
+def start_request_timer():
+    """Note when the request started, for the latency metrics, and whether to log its summary."""
+    g.request_started = time.perf_counter()
+    g.request_summary = request_log.start_request(endpoint_label())
+
+@app.after_request
+def observe_request(response):
+    """Record the latency and status code of the request and log its summary line if sampled."""
+    started = g.get("request_started")
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, endpoint_label())
+    http_responses.inc(endpoint_label(), str(response.status_code))
+    summary_args = (g.get("request_summary"), request.method, request.path, response.status_code)
+    if response.is_streamed:
+        # Log a streamed response, e.g. bulk results, once the body is sent and its outcome is known
+        response.call_on_close(lambda: request_log.finish_request(*summary_args))
+    else:
+        request_log.finish_request(*summary_args)
+    return response
 
 # Root route
 @app.route("/", methods=["GET"])
@@ -41,25 +278,43 @@ def home():
     return "Welcome to the Tax Table Service!", 200
 
 # Helper function to fetch user input from User Input Service
+@timed_stage("fetch_user_input")
 def fetch_user_input():
     """
     Fetch user input from the User Input Service.
+    Concurrent callers with the same credentials share a single outbound call, and
+    successful responses are cached for them for USER_INPUT_CACHE_TTL seconds (default 0).
+    Returns:
+        dict: Data returned from User Input Service.
+    """
+    with time_stage("fetch_user_input"):
+        return user_input_cache.get(
+            caller_key("user-input", request.headers), request_user_input, cacheable=lambda result: "error" not in result
+        )
+
+def request_user_input():
+    """
+    Request user input from the User Input Service.
     Returns:
         dict: Data returned from User Input Service.
     """
-    url = f"{USER_INPUT_SERVICE_BASE_URL}/get-user-input"
     try:
-        response = requests.get(url)
+        response = user_input_client.get("/get-user-input")
         if response.status_code == 200:
             return response.json()
         else:
-            logging.error(f"Error fetching user input: {response.status_code} - {response.json().get('error', 'Unknown error')}")
+            logging.error("Error fetching user input: %s - %s", response.status_code, response.json().get("error", "Unknown error"))
             return {"error": response.json().get("error", "Unknown error")}
-    except requests.RequestException as e:
-        logging.error(f"Failed to connect to User Input Service: {e}")
+    except DownstreamError as e:
+        logging.error("Failed to connect to User Input Service: %s", e)
         return {"error": "Connection to User Input Service failed"}
+    except ValueError as e:
+        # The body is not JSON, e.g. an HTML error page from a proxy in front of the service
+        logging.error("Invalid response from User Input Service: %s", e)
+        return {"error": "Invalid response from User Input Service"}
 
 # Helper function to forward data to Calculation Service
+@timed_stage("send_to_calculation_service")
 def send_to_calculation_service(data):
     """
     Send tax details and rebate details to Calculation Service.
@@ -68,113 +323,462 @@ def send_to_calculation_service(data):
     Returns:
         dict: Response from Calculation Service.
     """
-    url = f"{CALCULATION_SERVICE_BASE_URL}/receive-tax-rebate-details"
+    with time_stage("send_to_calculation_service"):
+        return post_to_calculation_service(data)
+
+def post_to_calculation_service(data):
+    """
+    Post tax details and rebate details to Calculation Service.
+    Args:
+        data (dict): Tax and rebate details to send.
+    Returns:
+        dict: Response from Calculation Service.
+    """
     try:
-        response = requests.post(url, json=data)
+        response = calculation_client.post(
+            "/receive-tax-rebate-details", **wire_format.request_arguments(data, CALCULATION_SERVICE_FORMAT)
+        )
+        body = wire_format.decode_response(response)
         if response.status_code == 200:
-            logging.info("Tax and rebate details successfully sent to Calculation Service.")
-            return response.json()
+            logging.debug("Tax and rebate details successfully sent to Calculation Service.")
+            return body
         else:
-            logging.error(f"Error sending tax and rebate details: {response.status_code} - {response.json().get('error', 'Unknown error')}")
-            return {"error": response.json().get("error", "Unknown error")}
-    except requests.RequestException as e:
-        logging.error(f"Failed to connect to Calculation Service: {e}")
+            logging.error("Error sending tax and rebate details: %s - %s", response.status_code, body.get("error", "Unknown error"))
+            return {"error": body.get("error", "Unknown error")}
+    except DownstreamError as e:
+        logging.error("Failed to connect to Calculation Service: %s", e)
         return {"error": "Connection to Calculation Service failed"}
+    except ValueError as e:
+        # The body is neither JSON nor MessagePack, e.g. an HTML error page from a proxy
+        logging.error("Invalid response from Calculation Service: %s", e)
+        return {"error": "Invalid response from Calculation Service"}
+
+def read_body():
+    """
+    Decode the request body: MessagePack for an application/msgpack Content-Type, otherwise JSON.
+    Returns:
+        The decoded body.
+    """
+    if not wire_format.is_msgpack(request.mimetype):
+        return request.json
+    if not wire_format.msgpack_available():
+        abort(415)
+    try:
+        return wire_format.unpack(request.get_data())
+    except ValueError:
+        abort(400, description="Failed to decode MessagePack object")
+
+def respond(body, status_code=200):
+    """
+    Build a response in the format the client's Accept header prefers.
+    Args:
+        body: The response body.
+        status_code (int): HTTP status code.
+    Returns:
+        Response: MessagePack if the client asks for it, otherwise JSON as built by jsonify.
+    """
+    if wire_format.negotiate(request.headers.get("Accept")) == "msgpack":
+        response = Response(wire_format.pack(body), status=status_code, mimetype=wire_format.MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(body)
+        response.status_code = status_code
+    response.vary.add("Accept")
+    return response
 
 @app.route("/get-tax-details", methods=["POST"])
+@profiled_view
 def get_tax_details():
     """
     Fetch applicable tax details and rebate details.
+    Set "compute_locally" in the body (or LOCAL_PAYE_MODE) to skip the Calculation Service.
+    Send X-Profile (with PROFILING_ENABLED) to profile the request.
+    Bodies and responses are JSON, or MessagePack by Content-Type and Accept.
+    """
+    logging.debug("Accessing /get-tax-details route")
+    data = read_body()
+    compute_locally = data.get("compute_locally", LOCAL_PAYE_MODE)
+    # Only a JSON boolean: the string "false" would otherwise switch local mode on
+    if not isinstance(compute_locally, bool):
+        record_outcome("invalid_request")
+        return respond({"error": "compute_locally must be true or false"}, 400)
+    return resolve_tax_details(data, compute_locally=compute_locally)
+
+@app.route("/calculate-tax", methods=["POST"])
+def calculate_tax():
+    """
+    Fetch applicable tax details and compute annual and monthly PAYE in-process.
     """
-    logging.info("Accessing /get-tax-details route")
-    data = request.json
+    logging.debug("Accessing /calculate-tax route")
+    return resolve_tax_details(read_body(), compute_locally=True)
 
+def resolve_tax_details(data, compute_locally=False):
+    """
+    Resolve tax and rebate details for a request body.
+    Args:
+        data (dict): The request body.
+        compute_locally (bool): Compute the tax in-process instead of sending it to the Calculation Service.
+    Returns:
+        Response: JSON or MessagePack response.
+    """
     # Fetch missing user input from User Input Service if not provided
     if not all([data.get("month"), data.get("year"), data.get("age_group")]):
         user_input = fetch_user_input()
         if "error" in user_input:
-            return jsonify({"error": user_input["error"]}), 500
+            record_outcome("user_input_error")
+            return respond({"error": user_input["error"]}, 500)
         # Merge data with user input
         data = {**user_input, **data}
 
     # Validate and prepare data for calculation
     try:
-        month = data["month"]
-        year = data["year"]
-        age_group = data["age_group"]
-        projected_annual_income = data["projected_annual_income"]
-        projected_annual_income_plus_bonus_leave = data["projected_annual_income_plus_bonus_leave"]
-
-        input_date = datetime.datetime(year, month, 1)
-
-        # Find the relevant tax period table
-        relevant_table = None
-        with tax_engine.connect() as connection:
-            tables_query = text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'tax_period_%';")
-            tables = connection.execute(tables_query).fetchall()
-            logging.info(f"Available tax period tables: {[table[0] for table in tables]}")
-
-            for table in tables:
-                table_name = table[0]
-                check_date_query = text(f"SELECT COUNT(*) FROM {table_name} WHERE effective_date <= :date AND end_date >= :date;")
-                count = connection.execute(check_date_query, {"date": input_date}).scalar()
-                if count > 0:
-                    relevant_table = table_name
-                    break
-
-            if not relevant_table:
-                logging.warning("No applicable tax period table found")
-                return jsonify({"error": "No applicable tax period table found"}), 404
-
-            logging.info(f"Relevant tax period table: {relevant_table}")
-
-            # Query the relevant table for the projected income details
-            income_query = text(f"""
-                SELECT min_income, tax_on_previous_bracket, tax_percentage
-                FROM {relevant_table}
-                WHERE min_income <= :income AND max_income >= :income;
-            """)
-            row_projected_income = connection.execute(income_query, {"income": projected_annual_income}).fetchone()
-
-            if not row_projected_income:
-                logging.warning("No matching tax row found for projected_annual_income")
-                return jsonify({"error": "No matching tax row for projected_annual_income"}), 404
-
-        # Query the rebate table for rebate details
-        with rebate_engine.connect() as connection:
-            rebate_query = text("SELECT rebate_value FROM rebate_table WHERE age_group = :age_group AND financial_year = :financial_year")
-            rebate_row = connection.execute(rebate_query, {"age_group": age_group, "financial_year": year}).fetchone()
-
-            if not rebate_row:
-                logging.warning("No matching rebate row found")
-                return jsonify({"error": "No matching rebate row found"}), 404
-
-        # Compile tax details
-        tax_details = {
-            "financial_year": year,
-            "projected_annual_income_min_income": row_projected_income["min_income"],
-            "projected_annual_income_tax_on_previous_brackets": row_projected_income["tax_on_previous_bracket"],
-            "projected_annual_income_tax_percentage": row_projected_income["tax_percentage"],
-            "rebate_value": rebate_row["rebate_value"]
-        }
+        # Use one index snapshot for the whole request, even if a reload swaps in a new one
+        tax_index = tax_index_holder.current
+
+        body, status_code, outcome = lookup_tax_details(
+            tax_index, data, compute_locally, time_stage, short_circuit=TAX_FREE_SHORT_CIRCUIT
+        )
+        if status_code is not None:
+            record_outcome(outcome)
+            return respond(body, status_code)
+        tax_details = body
+
+        # Queue tax and rebate details for the Calculation Service and return immediately
+        if delivery_queue:
+            try:
+                with time_stage("enqueue_delivery"):
+                    delivery_id = delivery_queue.submit(tax_details)
+            except QueueFullError as e:
+                record_outcome("queue_full")
+                logging.warning("Rejecting request: %s", e)
+                return respond({"error": str(e)}, 503)
+            record_outcome("accepted")
+            return respond({**tax_details, "delivery_id": delivery_id}, 202)
 
         # Send tax and rebate details to Calculation Service
         response_to_calculation_service = send_to_calculation_service(tax_details)
         if "error" in response_to_calculation_service:
-            return jsonify({"error": response_to_calculation_service["error"]}), 500
+            record_outcome("calculation_service_error")
+            return respond({"error": response_to_calculation_service["error"]}, 500)
 
-        return jsonify(response_to_calculation_service), 200
+        record_outcome("ok")
+        return respond(response_to_calculation_service, 200)
 
     except Exception as e:
-        logging.error(f"Error in /get-tax-details: {e}")
-        return jsonify({"error": "Database error"}), 500
+        record_outcome("error")
+        logging.error("Error resolving tax details: %s", e)
+        return respond({"error": "Database error"}, 500)
+
+@app.route("/get-tax-details/batch", methods=["POST"])
+def get_tax_details_batch():
+    """
+    Fetch tax details and rebate details for a batch of records, e.g. a payroll run.
+    Expects a JSON (or MessagePack) array of records with the same fields as /get-tax-details.
+    Results are returned in input order, with an "error" entry for records that failed.
+    """
+    logging.debug("Accessing /get-tax-details/batch route")
+    records = read_body()
+    if not isinstance(records, list):
+        return respond({"error": "Request body must be a JSON array of records"}, 400)
+
+    # Fetch user input once for every record missing month, year or age_group
+    if any(isinstance(record, dict) and not all([record.get("month"), record.get("year"), record.get("age_group")])
+           for record in records):
+        user_input = fetch_user_input()
+        if "error" in user_input:
+            record_outcome("user_input_error")
+            return respond({"error": user_input["error"]}, 500)
+        records = [{**user_input, **record} if isinstance(record, dict) else record for record in records]
+
+    try:
+        with time_stage("resolve_batch"):
+            results = resolve_tax_details_batch(tax_index_holder.current, records)
+    except Exception as e:
+        record_outcome("error")
+        logging.error("Error in /get-tax-details/batch: %s", e)
+        return respond({"error": "Database error"}, 500)
+
+    errors = sum(1 for result in results if "error" in result)
+    record_outcome("ok" if not errors else "partial")
+    logging.debug("Resolved %d of %d batch records", len(results) - errors, len(results))
+    return respond({"results": results}, 200)
+
+@app.route("/get-tax-details/bulk", methods=["POST"])
+def get_tax_details_bulk():
+    """
+    Stream tax details for a payroll file, e.g. a year-end reconciliation.
+    The body is CSV with a header row (Content-Type text/csv or ?format=csv), NDJSON, or
+    a stream of MessagePack maps (Content-Type application/msgpack or ?format=msgpack),
+    with the same fields as /get-tax-details/batch records. Results are streamed back as
+    NDJSON, one line per record in input order with its 1-based "row", while the
+    body is still being processed; clients accepting application/msgpack get a stream
+    of MessagePack maps instead. Invalid records and chunks that fail get error rows.
+    With BULK_WORKERS set, chunks are resolved in a process pool, shared by all bulk
+    requests, whose workers load their own copy of the tables.
+    """
+    logging.debug("Accessing /get-tax-details/bulk route")
+    input_format = request.args.get("format")
+    if not input_format:
+        if request.mimetype == "text/csv":
+            input_format = "csv"
+        elif wire_format.is_msgpack(request.mimetype):
+            input_format = "msgpack"
+        else:
+            input_format = "ndjson"
+    if input_format not in INPUT_FORMATS:
+        return jsonify({"error": f"Unsupported format, expected one of: {', '.join(INPUT_FORMATS)}"}), 400
+    output_format = "msgpack" if wire_format.negotiate(request.headers.get("Accept")) == "msgpack" else "ndjson"
+    if input_format == "msgpack" and not wire_format.msgpack_available():
+        abort(415)
+
+    def results():
+        # Pool workers compare it with the data their own index was loaded from
+        data_version = tax_index_holder.data_version
+        outcome = yield from stream_results(
+            request.stream, input_format, tax_index_holder.current, chunk_size=BULK_CHUNK_SIZE,
+            pool=bulk_pool, data_version=data_version, output_format=output_format
+        )
+        record_outcome(outcome)
+
+    mimetype = wire_format.MSGPACK_MIMETYPE if output_format == "msgpack" else "application/x-ndjson"
+    response = Response(stream_with_context(results()), mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+def encode_table(document):
+    """
+    Serialize a table document and derive its strong ETag from the bytes.
+    Args:
+        document (dict): The document, or None if it does not exist.
+    Returns:
+        tuple: The JSON body and ETag, or (None, None).
+    """
+    if document is None:
+        return None, None
+    body = json.dumps(document, sort_keys=True, separators=(",", ":")).encode()
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+def table_response(body, etag, not_found_error):
+    """
+    Build a cacheable table response, answering 304 when the client's copy is current.
+    Args:
+        body (bytes): The JSON body, or None if the table does not exist.
+        etag (str): Strong ETag of the body.
+        not_found_error (str): Error message for a missing table.
+    Returns:
+        Response: 200 with the table, 304, or 404.
+    """
+    if body is None:
+        return jsonify({"error": not_found_error}), 404
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = TABLE_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route("/tax-tables/<int:financial_year>", methods=["GET"])
+def get_tax_table(financial_year):
+    """
+    Return every bracket of a financial year's tax table with its period dates.
+    Responses carry a strong ETag and Cache-Control, and If-None-Match requests get 304
+    while the table is unchanged. Bodies and ETags are built once per loaded index.
+    """
+    tax_index = tax_index_holder.current
+
+    def build():
+        period = tax_index.period_for_year(financial_year)
+        return encode_table(build_tax_table(period) if period else None)
+
+    body, etag = tax_index.cached_document(("tax-table", financial_year), build)
+    return table_response(body, etag, "No tax table found for financial year")
+
+@app.route("/rebates/<int:financial_year>", methods=["GET"])
+def get_rebates(financial_year):
+    """
+    Return the total (stacked) rebate of each age group of a financial year, the same
+    value /get-tax-details sends as rebate_value, with the per-tier rebates, cacheable
+    like /tax-tables.
+    """
+    tax_index = tax_index_holder.current
+
+    def build():
+        rebate_tiers = tax_index.rebates_for_year(financial_year)
+        if not rebate_tiers:
+            return encode_table(None)
+        rebates = tax_index.rebates_for_year(financial_year, cumulative=True)
+        return encode_table(build_rebate_table(financial_year, rebates, rebate_tiers))
+
+    body, etag = tax_index.cached_document(("rebates", financial_year), build)
+    return table_response(body, etag, "No rebates found for financial year")
+
+@app.route("/tax-free-thresholds/<int:financial_year>", methods=["GET"])
+def get_tax_free_thresholds(financial_year):
+    """
+    Return the total (stacked) rebate of each age group and the annual and monthly
+    income below which no tax is due, cacheable like /tax-tables.
+    """
+    tax_index = tax_index_holder.current
+
+    def build():
+        thresholds = tax_index.tax_free_thresholds(financial_year)
+        return encode_table(build_threshold_table(financial_year, thresholds) if thresholds else None)
+
+    body, etag = tax_index.cached_document(("tax-free-thresholds", financial_year), build)
+    return table_response(body, etag, "No tax table or rebates found for financial year")
+
+@app.route("/tax-curve", methods=["POST"])
+def get_tax_curve():
+    """
+    Compute tax, effective rate and marginal rate over a range of incomes, e.g. for
+    take-home pay charts. Body: "incomes" (an array) or "income_range" ({"start", "stop",
+    "step"}, stop inclusive), plus "financial_years" and "age_groups" arrays.
+    Every curve is computed in one vectorized pass and returned as columnar arrays.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    financial_years = body.get("financial_years")
+    age_groups = body.get("age_groups")
+    if (not isinstance(financial_years, list) or not financial_years
+            or not all(isinstance(year, int) and not isinstance(year, bool) for year in financial_years)):
+        return jsonify({"error": "financial_years must be a non-empty array of years"}), 400
+    if not isinstance(age_groups, list) or not age_groups or not all(isinstance(group, str) for group in age_groups):
+        return jsonify({"error": "age_groups must be a non-empty array of age groups"}), 400
+    # Each distinct year and age group is one curve, however often it is repeated
+    financial_years = list(dict.fromkeys(financial_years))
+    age_groups = list(dict.fromkeys(age_groups))
+    try:
+        incomes = parse_income_points(body, TAX_CURVE_MAX_POINTS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(incomes) * len(financial_years) * len(age_groups) > TAX_CURVE_MAX_VALUES:
+        return jsonify({"error": f"At most {TAX_CURVE_MAX_VALUES} values are allowed: "
+                                 "reduce the incomes, financial years or age groups"}), 400
+
+    with time_stage("tax_curve"):
+        curves = build_tax_curves(tax_index_holder.current, incomes, financial_years, age_groups)
+    return jsonify(curves), 200
+
+def get_deduction_tables(tax_index):
+    """
+    Returns:
+        DeductionTables: The monthly deduction tables of an index, loaded once per index.
+    """
+    return tax_index.cached_document(("deduction-tables",), lambda: load_deduction_tables(tax_index))
+
+@app.route("/deductions/<int:financial_year>", methods=["GET"])
+def get_monthly_deduction(financial_year):
+    """
+    Return the monthly PAYE deduction for a monthly remuneration and age group,
+    e.g. /deductions/2026?age_group=Primary&monthly_income=25000.
+    The deduction is read from the materialized deduction table of the year and age
+    group with a single array index. Above the largest band the formula is used instead.
+    """
+    age_group = request.args.get("age_group")
+    monthly_income = request.args.get("monthly_income", type=float)
+    if not age_group or monthly_income is None or not math.isfinite(monthly_income) or monthly_income < 0:
+        return jsonify({"error": "age_group and a non-negative monthly_income are required"}), 400
+
+    tax_index = tax_index_holder.current
+    deduction_tables = get_deduction_tables(tax_index)
+    band = deduction_tables.band(monthly_income)
+    if band is not None:
+        deduction = deduction_tables.lookup(financial_year, age_group, band)
+        if deduction is None:
+            return jsonify({"error": "No deduction table found for financial year and age group"}), 404
+        if deduction == NO_BRACKET:
+            return jsonify({"error": "No matching tax row for monthly_income"}), 404
+        return jsonify({
+            "financial_year": financial_year,
+            "age_group": age_group,
+            "monthly_income": monthly_income,
+            "band_min": band * deduction_tables.band_width,
+            "band_max": (band + 1) * deduction_tables.band_width,
+            "monthly_deduction": deduction / 100,
+            "source": "table"
+        }), 200
+
+    # Above the tables: compute the deduction on the exact remuneration
+    period = tax_index.period_for_year(financial_year)
+    rebate_value = tax_index.find_rebate(financial_year, age_group)
+    if period is None or rebate_value is None:
+        return jsonify({"error": "No deduction table found for financial year and age group"}), 404
+    bracket = tax_index.find_bracket(period, monthly_income * 12)
+    if not bracket:
+        return jsonify({"error": "No matching tax row for monthly_income"}), 404
+    return jsonify({
+        "financial_year": financial_year,
+        "age_group": age_group,
+        "monthly_income": monthly_income,
+        "monthly_deduction": round(calculate_annual_tax(bracket, rebate_value, monthly_income * 12) / 12, 2),
+        "source": "formula"
+    }), 200
+
+def admin_authorized():
+    """
+    Check the admin token. Without a configured ADMIN_TOKEN nobody is authorized.
+    Returns:
+        bool: True if the request may use the /admin endpoints.
+    """
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode())
+
+def admin_denied():
+    """
+    Returns:
+        tuple: The error response and status code for a request that may not use the /admin endpoints.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled: ADMIN_TOKEN is not configured"}), 403
+    return jsonify({"error": "Unauthorized"}), 401
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """
+    Force a reload of the tax and rebate tables in this process and report the active data version.
+    """
+    if not admin_authorized():
+        return admin_denied()
+    try:
+        tax_index_holder.reload()
+    except Exception as e:
+        logging.error(f"Error reloading tax and rebate tables: {e}")
+        return jsonify({"error": "Reload failed", **tax_index_holder.status()}), 500
+    return jsonify(tax_index_holder.status()), 200
+
+@app.route("/admin/data-version", methods=["GET"])
+def admin_data_version():
+    """
+    Report the data version of the active tax and rebate tables.
+    """
+    if not admin_authorized():
+        return admin_denied()
+    return jsonify(tax_index_holder.status()), 200
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe: passes once the tables are loaded and verified and downstream health is known.
+    Reports the warm-up results and startup timings.
+    """
+    status_code = 200 if readiness.is_ready() else 503
+    return jsonify(readiness.report()), status_code
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Prometheus metrics of this process: per-stage latency, request outcomes,
+    database pool state and downstream errors.
+    """
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
 @app.route("/health", methods=["GET"])
 def health():
     """
     Health check endpoint.
+    Also reports the User Input Service cache counters.
     """
-    return jsonify({"status": "OK"}), 200
+    return jsonify({"status": "OK", "user_input_cache": user_input_cache.stats()}), 200
 
 if __name__ == "__main__":
     logging.info("Starting Flask app")
@@ -0,0 +1,63 @@
+import os
+
+# Database connection setup
+TAX_DB_URI = os.getenv("TAX_DB_URI", "sqlite:///C:/Users/USER-PC/Desktop/Salary Calculator Backend Development/Databases/tax_database.db")
+REBATE_DB_URI = os.getenv("REBATE_DB_URI", "sqlite:///C:/Users/USER-PC/Desktop/Salary Calculator Backend Development/Databases/rebate_database.db")
+USER_INPUT_SERVICE_BASE_URL = os.getenv("USER_INPUT_SERVICE_BASE_URL", "https://salary-calculator-user-input.onrender.com")
+CALCULATION_SERVICE_BASE_URL = os.getenv("CALCULATION_SERVICE_BASE_URL", "https://salary-calculator-calculation-service.onrender.com")
+# Compute PAYE in-process instead of forwarding to the Calculation Service
+LOCAL_PAYE_MODE = os.getenv("LOCAL_PAYE_MODE", "false").lower() == "true"
+# Encoding of the tax details posted to the Calculation Service: json or msgpack
+CALCULATION_SERVICE_FORMAT = os.getenv("CALCULATION_SERVICE_FORMAT", "json").lower()
+# Forward tax details to the Calculation Service from a background queue
+ASYNC_DELIVERY = os.getenv("ASYNC_DELIVERY", "false").lower() == "true"
+# Seconds to cache User Input Service responses (0 only coalesces concurrent fetches)
+USER_INPUT_CACHE_TTL = float(os.getenv("USER_INPUT_CACHE_TTL", "0"))
+USER_INPUT_CACHE_SIZE = int(os.getenv("USER_INPUT_CACHE_SIZE", "128"))
+# Seconds between checks for changed tax and rebate databases (0 disables hot reload)
+DATA_RELOAD_INTERVAL = float(os.getenv("DATA_RELOAD_INTERVAL", "30"))
+# Token required by the /admin endpoints when set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Seconds clients may reuse /tax-tables and /rebates responses before revalidating them
+TABLE_CACHE_MAX_AGE = int(os.getenv("TABLE_CACHE_MAX_AGE", "300"))
+# Answer incomes below the tax-free threshold directly, without the Calculation Service
+TAX_FREE_SHORT_CIRCUIT = os.getenv("TAX_FREE_SHORT_CIRCUIT", "false").lower() == "true"
+# Largest number of income points a /tax-curve request may ask for
+TAX_CURVE_MAX_POINTS = int(os.getenv("TAX_CURVE_MAX_POINTS", "100000"))
+# Largest number of values a /tax-curve response may hold: incomes x financial years x age groups
+TAX_CURVE_MAX_VALUES = int(os.getenv("TAX_CURVE_MAX_VALUES", "1000000"))
+
+# Keep /ready failing until every downstream service answers its health check
+READY_REQUIRE_HEALTHY_DOWNSTREAM = os.getenv("READY_REQUIRE_HEALTHY_DOWNSTREAM", "false").lower() == "true"
+
+# Validate environment variables
+if not TAX_DB_URI or not REBATE_DB_URI:
+    raise ValueError("Environment variables TAX_DB_URI and REBATE_DB_URI must be set.")
+if CALCULATION_SERVICE_FORMAT not in ("json", "msgpack"):
+    raise ValueError("CALCULATION_SERVICE_FORMAT must be json or msgpack.")
+
+
+def sqlite_database_path(uri):
+    """
+    Return the file path of an SQLite database URI.
+    Args:
+        uri (str): Database URI, e.g. sqlite:///path/to/tax_database.db.
+    Returns:
+        str: The database file path, or None for other databases and in-memory SQLite.
+    """
+    if not uri.startswith("sqlite") or "://" not in uri:
+        return None
+    path = uri.split("://", 1)[1].split("?", 1)[0]
+    if not path.startswith("/"):
+        return None
+    path = path[1:]
+    if not path or path == ":memory:":
+        return None
+    return path
+
+
+# SQLite files holding the tax and rebate tables, watched for changes
+DATABASE_PATHS = [path for path in (sqlite_database_path(TAX_DB_URI), sqlite_database_path(REBATE_DB_URI)) if path]
+# Compiled snapshot of the tax and rebate tables, used at startup while it matches the databases.
+# Staleness is only checked against SQLite files, so by default the snapshot is only used with them.
+TAX_SNAPSHOT_PATH = os.getenv("TAX_SNAPSHOT_PATH", "tax_rules.snapshot" if len(DATABASE_PATHS) == 2 else "")
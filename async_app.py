@@ -0,0 +1,376 @@
+"""
+asyncio serving mode for the Tax Table Service.
+
+The request path (/get-tax-details and /calculate-tax, plus /, /ready and /health)
+runs on a single aiohttp event loop. The User Input and Calculation Service calls
+are awaited instead of holding a thread each, so thousands of requests can be in
+flight on one core. Lookups use the same in-memory index and lookup_tax_details as
+app.py and return the same responses.
+
+    SERVER_MODE=async python serve.py
+
+The table, batch, bulk, admin and metrics endpoints are served by the threaded and
+prefork modes only.
+"""
+import time
+
+# Startup timing covers the imports below
+app_import_started = time.perf_counter()
+
+import asyncio
+import json
+import logging
+
+from aiohttp import web
+
+from app_config import (
+    TAX_DB_URI, REBATE_DB_URI, USER_INPUT_SERVICE_BASE_URL, CALCULATION_SERVICE_BASE_URL, LOCAL_PAYE_MODE,
+    ASYNC_DELIVERY, USER_INPUT_CACHE_TTL, USER_INPUT_CACHE_SIZE, DATA_RELOAD_INTERVAL, TAX_SNAPSHOT_PATH,
+    DATABASE_PATHS, READY_REQUIRE_HEALTHY_DOWNSTREAM, TAX_FREE_SHORT_CIRCUIT, CALCULATION_SERVICE_FORMAT
+)
+from bulk import load_worker_index
+from downstream import AsyncDownstreamClient, DownstreamError
+from index_reloader import TaxIndexHolder
+from readiness import Readiness
+import request_log
+from single_flight import AsyncSingleFlightCache, caller_key
+from tax_details import lookup_tax_details
+from tax_index import verify_tax_index
+import wire_format
+
+# Startup timings and warm-up state reported by /ready
+readiness = Readiness(app_import_started, require_healthy_downstream=READY_REQUIRE_HEALTHY_DOWNSTREAM)
+readiness.record("imports", app_import_started)
+
+# Configure logging: plain text, or JSON written from a background thread
+request_log.configure_logging()
+
+logging.info(f"TAX_DB_URI: {TAX_DB_URI}")
+logging.info(f"REBATE_DB_URI: {REBATE_DB_URI}")
+logging.info(f"USER_INPUT_SERVICE_BASE_URL: {USER_INPUT_SERVICE_BASE_URL}")
+logging.info(f"CALCULATION_SERVICE_BASE_URL: {CALCULATION_SERVICE_BASE_URL}")
+logging.info(f"LOCAL_PAYE_MODE: {LOCAL_PAYE_MODE}")
+if ASYNC_DELIVERY:
+    logging.warning("ASYNC_DELIVERY is not supported in async mode, tax details are sent directly")
+
+# Load tax periods, brackets and rebates into memory, from the snapshot while it is current
+tables_started = time.perf_counter()
+try:
+    tax_index_holder = TaxIndexHolder(
+        lambda: load_worker_index(TAX_SNAPSHOT_PATH, TAX_DB_URI, REBATE_DB_URI, DATABASE_PATHS),
+        DATABASE_PATHS, poll_interval=DATA_RELOAD_INTERVAL,
+        on_reload=lambda tax_index: verify_tables(readiness, tax_index)
+    )
+except Exception as e:
+    logging.error(f"Error loading tax and rebate tables: {e}")
+    raise
+readiness.record("load_tables", tables_started)
+
+# Pooled keep-alive clients for the downstream services, opened inside the event loop
+user_input_client = AsyncDownstreamClient("User Input Service", USER_INPUT_SERVICE_BASE_URL)
+calculation_client = AsyncDownstreamClient("Calculation Service", CALCULATION_SERVICE_BASE_URL)
+
+# Times a stage for the request's log summary
+time_stage = request_log.stage_timer()
+
+# Concurrent User Input Service fetches for the same caller share one outbound call
+user_input_cache = AsyncSingleFlightCache(ttl=USER_INPUT_CACHE_TTL, max_size=USER_INPUT_CACHE_SIZE)
+
+
+def json_response(body, status=200):
+    """
+    Build a JSON response with the same body Flask's jsonify produces.
+    Args:
+        body (dict): The response body.
+        status (int): HTTP status code.
+    Returns:
+        web.Response: The response.
+    """
+    text = json.dumps(body, sort_keys=True, separators=(",", ":")) + "\n"
+    return web.Response(text=text, status=status, content_type="application/json")
+
+
+def negotiated_response(request, body, status=200):
+    """
+    Build a response in the format the client's Accept header prefers.
+    Args:
+        request (web.Request): The request.
+        body: The response body.
+        status (int): HTTP status code.
+    Returns:
+        web.Response: MessagePack if the client asks for it, otherwise the same JSON as json_response.
+    """
+    if wire_format.negotiate(request.headers.get("Accept")) == "msgpack":
+        response = web.Response(body=wire_format.pack(body), status=status, content_type=wire_format.MSGPACK_MIMETYPE)
+    else:
+        response = json_response(body, status)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+@web.middleware
+async def log_request(request, handler):
+    """Log the summary line of sampled requests, keyed by handler name like Flask endpoints."""
+    summary = request_log.start_request(getattr(request.match_info.handler, "__name__", None))
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        request_log.finish_request(summary, request.method, request.path, status)
+
+
+def verify_tables(readiness, tax_index):
+    """
+    Verify an index and build its vectorized lookup arrays, at warm-up and again
+    whenever a reload swaps in a new index.
+    Args:
+        readiness (Readiness): Receives the problems found, which keep /ready failing.
+        tax_index (TaxIndex): The index to verify.
+    """
+    try:
+        problems = verify_tax_index(tax_index)
+        for period in tax_index.periods:
+            tax_index.bracket_arrays(period)
+    except Exception as e:
+        logging.error(f"Error verifying tax and rebate tables: {e}")
+        problems = [f"Verification failed: {e}"]
+    readiness.table_problems = problems
+
+
+def warm_up(readiness, loop):
+    """
+    Verify the loaded tables, build the vectorized lookup arrays and open a pooled
+    connection to each downstream service on the event loop, recording its health.
+    Args:
+        readiness (Readiness): Receives the results and timings.
+        loop (asyncio.AbstractEventLoop): The server's event loop.
+    """
+    started = time.perf_counter()
+    verify_tables(readiness, tax_index_holder.current)
+    readiness.record("verify_tables", started)
+
+    started = time.perf_counter()
+    readiness.downstream = asyncio.run_coroutine_threadsafe(check_downstream_health(), loop).result()
+    readiness.record("downstream_health", started)
+
+
+async def check_downstream_health():
+    """
+    Returns:
+        dict: Health of each downstream service by name.
+    """
+    clients = (user_input_client, calculation_client)
+    statuses = await asyncio.gather(*(client.check_health() for client in clients))
+    return {client.name: status for client, status in zip(clients, statuses)}
+
+
+async def start_background_tasks(app):
+    """Warm up and poll for changed tax and rebate data once the server is running."""
+    loop = asyncio.get_running_loop()
+    readiness.ensure_warm_up(lambda readiness: warm_up(readiness, loop))
+    tax_index_holder.ensure_polling()
+
+
+async def close_downstream_clients(app):
+    """Close the downstream sessions on shutdown."""
+    await user_input_client.close()
+    await calculation_client.close()
+
+
+async def home(request):
+    """Welcome route for the service."""
+    return web.Response(text="Welcome to the Tax Table Service!", content_type="text/html")
+
+
+async def fetch_user_input(headers):
+    """
+    Fetch user input from the User Input Service.
+    Concurrent callers with the same credentials share a single outbound call, and
+    successful responses are cached for them for USER_INPUT_CACHE_TTL seconds (default 0).
+    Args:
+        headers (Mapping): Headers of the request the input is fetched for.
+    Returns:
+        dict: Data returned from User Input Service.
+    """
+    return await user_input_cache.get(
+        caller_key("user-input", headers), request_user_input, cacheable=lambda result: "error" not in result
+    )
+
+
+async def request_user_input():
+    """
+    Request user input from the User Input Service.
+    Returns:
+        dict: Data returned from User Input Service.
+    """
+    try:
+        response = await user_input_client.get("/get-user-input")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logging.error("Error fetching user input: %s - %s", response.status_code, response.json().get("error", "Unknown error"))
+            return {"error": response.json().get("error", "Unknown error")}
+    except DownstreamError as e:
+        logging.error("Failed to connect to User Input Service: %s", e)
+        return {"error": "Connection to User Input Service failed"}
+    except ValueError as e:
+        # The body is not JSON, e.g. an HTML error page from a proxy in front of the service
+        logging.error("Invalid response from User Input Service: %s", e)
+        return {"error": "Invalid response from User Input Service"}
+
+
+async def post_to_calculation_service(data):
+    """
+    Post tax details and rebate details to Calculation Service.
+    Args:
+        data (dict): Tax and rebate details to send.
+    Returns:
+        dict: Response from Calculation Service.
+    """
+    try:
+        response = await calculation_client.post(
+            "/receive-tax-rebate-details", **wire_format.request_arguments(data, CALCULATION_SERVICE_FORMAT)
+        )
+        body = wire_format.decode_response(response)
+        if response.status_code == 200:
+            logging.debug("Tax and rebate details successfully sent to Calculation Service.")
+            return body
+        else:
+            logging.error("Error sending tax and rebate details: %s - %s", response.status_code, body.get("error", "Unknown error"))
+            return {"error": body.get("error", "Unknown error")}
+    except DownstreamError as e:
+        logging.error("Failed to connect to Calculation Service: %s", e)
+        return {"error": "Connection to Calculation Service failed"}
+    except ValueError as e:
+        # The body is neither JSON nor MessagePack, e.g. an HTML error page from a proxy
+        logging.error("Invalid response from Calculation Service: %s", e)
+        return {"error": "Invalid response from Calculation Service"}
+
+
+async def get_tax_details(request):
+    """
+    Fetch applicable tax details and rebate details.
+    Set "compute_locally" in the body (or LOCAL_PAYE_MODE) to skip the Calculation Service.
+    Bodies and responses are JSON, or MessagePack by Content-Type and Accept.
+    """
+    logging.debug("Accessing /get-tax-details route")
+    data = await read_body(request)
+    if data is None:
+        return negotiated_response(request, {"error": "Request body must be a JSON object"}, 400)
+    compute_locally = data.get("compute_locally", LOCAL_PAYE_MODE)
+    # Only a JSON boolean: the string "false" would otherwise switch local mode on
+    if not isinstance(compute_locally, bool):
+        request_log.annotate(outcome="invalid_request")
+        return negotiated_response(request, {"error": "compute_locally must be true or false"}, 400)
+    return await resolve_tax_details(request, data, compute_locally=compute_locally)
+
+
+async def calculate_tax(request):
+    """
+    Fetch applicable tax details and compute annual and monthly PAYE in-process.
+    """
+    logging.debug("Accessing /calculate-tax route")
+    data = await read_body(request)
+    if data is None:
+        return negotiated_response(request, {"error": "Request body must be a JSON object"}, 400)
+    return await resolve_tax_details(request, data, compute_locally=True)
+
+
+async def read_body(request):
+    """
+    Returns:
+        dict: The JSON (or, for an application/msgpack Content-Type, MessagePack) object
+        in the request body, or None if the body is not one.
+    """
+    try:
+        if wire_format.is_msgpack(request.content_type):
+            if not wire_format.msgpack_available():
+                raise web.HTTPUnsupportedMediaType()
+            data = wire_format.unpack(await request.read())
+        else:
+            data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def resolve_tax_details(request, data, compute_locally=False):
+    """
+    Resolve tax and rebate details for a request body.
+    Args:
+        request (web.Request): The request, for the response format.
+        data (dict): The request body.
+        compute_locally (bool): Compute the tax in-process instead of sending it to the Calculation Service.
+    Returns:
+        web.Response: JSON or MessagePack response.
+    """
+    # Fetch missing user input from User Input Service if not provided
+    if not all([data.get("month"), data.get("year"), data.get("age_group")]):
+        user_input = await fetch_user_input(request.headers)
+        if "error" in user_input:
+            request_log.annotate(outcome="user_input_error")
+            return negotiated_response(request, {"error": user_input["error"]}, 500)
+        # Merge data with user input
+        data = {**user_input, **data}
+
+    try:
+        # Use one index snapshot for the whole request, even if a reload swaps in a new one
+        body, status_code, outcome = lookup_tax_details(
+            tax_index_holder.current, data, compute_locally, time_stage, short_circuit=TAX_FREE_SHORT_CIRCUIT
+        )
+        if status_code is not None:
+            request_log.annotate(outcome=outcome)
+            return negotiated_response(request, body, status_code)
+
+        # Send tax and rebate details to Calculation Service
+        with time_stage("send_to_calculation_service"):
+            response_to_calculation_service = await post_to_calculation_service(body)
+        if "error" in response_to_calculation_service:
+            request_log.annotate(outcome="calculation_service_error")
+            return negotiated_response(request, {"error": response_to_calculation_service["error"]}, 500)
+
+        request_log.annotate(outcome="ok")
+        return negotiated_response(request, response_to_calculation_service)
+
+    except Exception as e:
+        request_log.annotate(outcome="error")
+        logging.error("Error resolving tax details: %s", e)
+        return negotiated_response(request, {"error": "Database error"}, 500)
+
+
+async def ready(request):
+    """
+    Readiness probe: passes once the tables are loaded and verified and downstream health is known.
+    """
+    status_code = 200 if readiness.is_ready() else 503
+    return json_response(readiness.report(), status_code)
+
+
+async def health(request):
+    """
+    Health check endpoint.
+    Also reports the User Input Service cache counters.
+    """
+    return json_response({"status": "OK", "user_input_cache": user_input_cache.stats()})
+
+
+def create_app():
+    """
+    Build the aiohttp application.
+    Returns:
+        web.Application: The application.
+    """
+    app = web.Application(middlewares=[log_request])
+    app.router.add_get("/", home)
+    app.router.add_post("/get-tax-details", get_tax_details)
+    app.router.add_post("/calculate-tax", calculate_tax)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/health", health)
+    app.on_startup.append(start_background_tasks)
+    app.on_cleanup.append(close_downstream_clients)
+    return app
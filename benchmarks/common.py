@@ -0,0 +1,42 @@
+"""
+Shared helpers for benchmark result files.
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+
+def git_commit():
+    """Return the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(params):
+    """
+    Describe a benchmark run so result files from different commits can be compared.
+    Args:
+        params (dict): The benchmark parameters.
+    Returns:
+        dict: Commit, time, Python version, platform and parameters.
+    """
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params
+    }
+
+
+def write_results(path, results):
+    """Write benchmark results as JSON."""
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {path}")
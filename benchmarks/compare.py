@@ -0,0 +1,79 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.10
+
+Exits with status 1 when any metric is worse than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# Metrics where a higher value is better; every other metric is a latency or a cost
+HIGHER_IS_BETTER = ("throughput_rps",)
+LOAD_METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def flatten(results):
+    """
+    Flatten a result file into metric names and values.
+    Returns:
+        dict: e.g. {"load.c8.p95_ms": 12.3, "micro.index.find_bracket": 410.0}.
+    """
+    metrics = {}
+    for level in results.get("load", []):
+        for metric in LOAD_METRICS:
+            if metric in level:
+                metrics[f"load.c{level['concurrency']}.{metric}"] = level[metric]
+    for name, value in results.get("micro_ns_per_op", {}).items():
+        metrics[f"micro.{name}"] = value
+    return metrics
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare the metrics present in both result sets.
+    Args:
+        baseline (dict): Baseline results.
+        current (dict): Current results.
+        threshold (float): Relative change counted as a regression, e.g. 0.1 for 10%.
+    Returns:
+        list: One dictionary per metric with both values, the relative change and whether it regressed.
+    """
+    baseline_metrics = flatten(baseline)
+    current_metrics = flatten(current)
+    rows = []
+    for name in sorted(baseline_metrics.keys() & current_metrics.keys()):
+        before, after = baseline_metrics[name], current_metrics[name]
+        change = (after - before) / before if before else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        rows.append({"metric": name, "baseline": before, "current": after,
+                     "change": round(change, 4), "regression": worse > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as baseline_file, open(args.current, encoding="utf-8") as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    rows = compare(baseline, current, args.threshold)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"baseline {baseline['meta'].get('commit')} -> current {current['meta'].get('commit')}")
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['metric']:<45} {row['baseline']:>12} {row['current']:>12} {row['change']:>+8.1%} {flag}")
+
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Concurrency benchmark: threaded against asyncio serving.
+
+Starts slow stub User Input and Calculation services and the app in each server
+mode, then keeps a fixed number of /get-tax-details requests in flight from an
+asyncio client and reports throughput and latency per mode and level. With slow
+downstream services the threaded mode is capped at WEB_THREADS requests in flight,
+while the async mode keeps every request in flight on one event loop.
+
+    python -m benchmarks.concurrency --modes threaded async --concurrency 50 500 2000 \
+        --downstream-latency-ms 200 --output concurrency.json
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from benchmarks.common import run_metadata, write_results
+from benchmarks.load_test import request_bodies, start_services, stop_services, summarize_level
+
+
+async def drive_level(port, concurrency, duration, warm_up, bodies):
+    """
+    Keep a fixed number of /get-tax-details requests in flight.
+    Args:
+        port (int): App port.
+        concurrency (int): Requests kept in flight.
+        duration (float): Seconds to measure for.
+        warm_up (float): Seconds to run before measuring.
+        bodies (list): Encoded request bodies, used round-robin.
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles in milliseconds.
+    """
+    import aiohttp
+
+    started = time.perf_counter()
+    measure_from = started + warm_up
+    stop_at = measure_from + duration
+    latencies = []
+    errors = 0
+    url = f"http://127.0.0.1:{port}/get-tax-details"
+    headers = {"Content-Type": "application/json"}
+
+    async def client(session, worker):
+        nonlocal errors
+        position = worker
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                break
+            try:
+                async with session.post(url, data=bodies[position % len(bodies)], headers=headers) as response:
+                    await response.read()
+                    ok = response.status in (200, 404)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            if request_started >= measure_from:
+                if ok:
+                    latencies.append(time.perf_counter() - request_started)
+                else:
+                    errors += 1
+            position += concurrency
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        await asyncio.gather(*(client(session, worker) for worker in range(concurrency)))
+
+    return summarize_level(concurrency, duration, latencies, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare threaded and asyncio serving under many in-flight requests.")
+    parser.add_argument("--modes", nargs="+", choices=["threaded", "prefork", "async"], default=["threaded", "async"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per concurrency level")
+    parser.add_argument("--warm-up", type=float, default=2.0, help="unmeasured seconds before each level")
+    parser.add_argument("--years", type=int, default=30, help="financial years of tax_period_* tables")
+    parser.add_argument("--last-year", type=int, default=2027)
+    parser.add_argument("--year", type=int, default=2025, help="year returned by the User Input stub")
+    parser.add_argument("--downstream-latency-ms", type=float, default=200.0)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    bodies = request_bodies(1000)
+    levels = []
+    for mode in args.modes:
+        args.server_mode = mode
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            processes, port = start_services(fixture_dir, args)
+            try:
+                for concurrency in args.concurrency:
+                    result = {"mode": mode, **asyncio.run(drive_level(port, concurrency, args.duration,
+                                                                      args.warm_up, bodies))}
+                    print(json.dumps(result))
+                    levels.append(result)
+            finally:
+                stop_services(processes)
+
+    # Throughput of each mode relative to the first one, per concurrency level
+    baseline = {result["concurrency"]: result["throughput_rps"] for result in levels if result["mode"] == args.modes[0]}
+    for result in levels:
+        if baseline.get(result["concurrency"]):
+            result["throughput_gain"] = round(result["throughput_rps"] / baseline[result["concurrency"]], 2)
+    for mode in args.modes[1:]:
+        gains = {result["concurrency"]: result.get("throughput_gain") for result in levels if result["mode"] == mode}
+        print(f"{mode} throughput vs {args.modes[0]}: {gains}")
+
+    results = {
+        "meta": run_metadata({key: value for key, value in vars(args).items() if key not in ("output", "server_mode")}),
+        "concurrency": levels
+    }
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
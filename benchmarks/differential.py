@@ -0,0 +1,468 @@
+"""
+Differential test and benchmark of the fast lookup paths against the reference SQL.
+
+Generates (date, income, age_group) cases, resolves each one's tax period table,
+bracket and total rebate with the reference queries (benchmarks/reference.py, the
+per-request SQL /get-tax-details ran before the in-memory index), and checks every
+fast path against them:
+    index       TaxIndex.resolve_period, find_bracket and find_rebate, one case at a time
+    snapshot    the same lookups on the index memory-mapped from a snapshot file
+    vectorized  TaxIndex.find_brackets over every case of a period in one pass
+    batch       resolve_tax_details_batch in chunks, as /get-tax-details/batch and /bulk do,
+                with the first of the case's month as its date
+    tax_free    TaxIndex.is_tax_free: a short-circuited case must owe no tax by the reference formula
+                (an income in a gap between brackets by the bracket below the gap)
+    consolidated  reference.query_tax_bracket on the consolidated tax_brackets table (with --consolidated)
+
+Boundary cases cover every period's first and last day and the days around them,
+28 February and leap-year 29 February, and every bracket's bounds with the fractional
+incomes in the gaps between brackets (e.g. 237100.5), 0, negative incomes and the
+9999999999 top bracket. Random cases fill up to --cases, half of them near a bracket bound.
+
+The reference runs set-based (one statement per period table over all cases, with
+the same predicates), and a sample of cases is also resolved with the per-row
+reference functions to check the set-based form and time the original queries.
+Mismatches are reported with examples, and the exit status is 1 if there are any.
+
+    python -m benchmarks.differential --cases 2000000 --output differential.json
+"""
+import argparse
+import calendar
+import datetime
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from benchmarks import reference
+from benchmarks.common import run_metadata, write_results
+from benchmarks.fixtures import AGE_GROUPS, build_fixtures, period_dates
+from snapshot import build_snapshot, load_snapshot
+from tax_details import calculate_annual_tax, resolve_tax_details_batch
+from tax_index import REBATE_TIERS, TaxBracket, load_tax_index
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Age groups of the cases; the last one has no rebate rows
+CASE_AGE_GROUPS = AGE_GROUPS + ("Unknown",)
+
+# Incomes checked in every period besides its bracket bounds
+SPECIAL_INCOMES = (-1.0, 0.0, 0.5, 1.0, 9999999999.0, 9999999999.5, 10000000000.0, 1e12)
+
+# Records per resolve_tax_details_batch call, as in bulk processing
+BATCH_CHUNK_SIZE = 5000
+
+# Mismatches kept per path as examples
+MAX_EXAMPLES = 10
+
+
+def bound_incomes(periods):
+    """
+    Args:
+        periods (list): TaxPeriod entries.
+    Returns:
+        list: Every bracket bound of the periods with the incomes just inside and outside
+        it, plus SPECIAL_INCOMES.
+    """
+    incomes = set(SPECIAL_INCOMES)
+    for period in periods:
+        for bracket in period.brackets:
+            for bound in (bracket.min_income, bracket.max_income):
+                incomes.update((bound - 1, bound - 0.5, bound - 0.01, bound, bound + 0.01, bound + 0.5, bound + 1))
+    return sorted(float(income) for income in incomes)
+
+
+def boundary_dates(first_year, last_year):
+    """
+    Returns:
+        list: The first and last days of every period and the days around them, plus
+        28 February, leap-year 29 February and 1 March of every year.
+    """
+    dates = set()
+    for financial_year in range(first_year - 1, last_year + 2):
+        effective_date, end_date = period_dates(financial_year)
+        for day in (effective_date, end_date):
+            dates.update(day + datetime.timedelta(days=offset) for offset in (-1, 0, 1))
+        dates.update((datetime.date(financial_year, 2, 28), datetime.date(financial_year, 3, 1),
+                      datetime.date(financial_year, 1, 1), datetime.date(financial_year, 12, 31)))
+        if calendar.isleap(financial_year):
+            dates.add(datetime.date(financial_year, 2, 29))
+    return sorted(dates)
+
+
+def generate_cases(tax_index, first_year, last_year, count, seed=0):
+    """
+    Build boundary cases for every period, then random cases up to count.
+    Returns:
+        tuple: Lists of dates, incomes and age groups, one entry per case.
+    """
+    import numpy as np
+
+    # Each boundary date is checked at the bracket bounds of its own and the adjacent periods
+    dates, incomes, age_groups = [], [], []
+    for day in boundary_dates(first_year, last_year):
+        periods = [period for period in tax_index.periods if period.financial_year in (day.year, day.year + 1)]
+        for income in bound_incomes(periods):
+            dates.append(day)
+            incomes.append(income)
+            age_groups.append(CASE_AGE_GROUPS[len(age_groups) % len(CASE_AGE_GROUPS)])
+
+    incomes_at_bounds = np.asarray(bound_incomes(tax_index.periods))
+    incomes_at_bounds = incomes_at_bounds[(incomes_at_bounds >= 0) & (incomes_at_bounds < 1e10)]
+
+    remaining = max(count - len(dates), 0)
+    rng = np.random.default_rng(seed)
+    first_date = period_dates(first_year)[0] - datetime.timedelta(days=60)
+    span = (period_dates(last_year)[1] - first_date).days + 120
+    days = [first_date + datetime.timedelta(days=offset) for offset in range(span + 1)]
+
+    near_bound = rng.random(remaining) < 0.5
+    random_incomes = np.where(
+        near_bound,
+        rng.choice(incomes_at_bounds, remaining) + rng.integers(-3, 4, remaining) * rng.choice([0.01, 0.5, 1.0], remaining),
+        np.round(rng.uniform(0, 3000000, remaining), 2)
+    )
+    dates.extend(days[offset] for offset in rng.integers(0, span + 1, remaining).tolist())
+    incomes.extend(random_incomes.tolist())
+    age_groups.extend(CASE_AGE_GROUPS[position] for position in rng.integers(0, len(CASE_AGE_GROUPS), remaining).tolist())
+    return dates, incomes, age_groups
+
+
+def reference_total_rebate(connection, age_group, year):
+    """
+    Total rebate from the reference rebate query: the age group's own row, plus the
+    rows of the age groups it stacks on.
+    Returns:
+        float: The total rebate, or None if the age group has no row for the year.
+    """
+    own = reference.find_rebate(connection, age_group, year)
+    if own is None or age_group not in REBATE_TIERS:
+        return own
+    tiers = REBATE_TIERS[:REBATE_TIERS.index(age_group) + 1]
+    return sum(reference.find_rebate(connection, tier, year) or 0.0 for tier in tiers)
+
+
+def resolve_reference(tax_connection, rebate_connection, dates, incomes, age_groups):
+    """
+    Resolve every case with the set-based reference queries.
+    Returns:
+        list: (table_name, (min_income, tax_on_previous_bracket, tax_percentage), total rebate)
+        for each case, with None where the reference finds nothing.
+    """
+    tables = reference.find_tax_period_tables(tax_connection, dates)
+    brackets = [None] * len(dates)
+    positions_by_table = {}
+    for position, table_name in enumerate(tables):
+        if table_name:
+            positions_by_table.setdefault(table_name, []).append(position)
+    for table_name, positions in positions_by_table.items():
+        found = reference.find_tax_brackets(tax_connection, table_name, [incomes[position] for position in positions])
+        for position, bracket in zip(positions, found):
+            brackets[position] = bracket
+
+    rebates = {}
+    for key in set(zip((day.year for day in dates), age_groups)):
+        rebates[key] = reference_total_rebate(rebate_connection, key[1], key[0])
+    return [
+        (table_name, bracket, rebates[(day.year, age_group)])
+        for table_name, bracket, day, age_group in zip(tables, brackets, dates, age_groups)
+    ]
+
+
+def bracket_key(bracket):
+    """
+    Returns:
+        tuple: The fields the reference bracket query returns, or None.
+    """
+    if bracket is None:
+        return None
+    return bracket.min_income, bracket.tax_on_previous_bracket, bracket.tax_percentage
+
+
+def resolve_scalar(tax_index, dates, incomes, age_groups):
+    """Resolve every case one at a time, as /get-tax-details does."""
+    results = []
+    for day, income, age_group in zip(dates, incomes, age_groups):
+        period = tax_index.resolve_period(day)
+        if period is None:
+            results.append((None, None, tax_index.find_rebate(day.year, age_group)))
+            continue
+        results.append((period.table_name, bracket_key(tax_index.find_bracket(period, income)),
+                        tax_index.find_rebate(day.year, age_group)))
+    return results
+
+
+def resolve_vectorized(tax_index, dates, incomes, age_groups):
+    """Resolve each distinct date once, then every case of a period in one find_brackets pass."""
+    periods_by_date = {}
+    positions_by_period = {}
+    results = [None] * len(dates)
+    for position, day in enumerate(dates):
+        if day not in periods_by_date:
+            periods_by_date[day] = tax_index.resolve_period(day)
+        period = periods_by_date[day]
+        if period is None:
+            results[position] = (None, None, tax_index.find_rebate(day.year, age_groups[position]))
+        else:
+            positions_by_period.setdefault(period.table_name, (period, []))[1].append(position)
+    for period, positions in positions_by_period.values():
+        found = tax_index.find_brackets(period, [incomes[position] for position in positions]).tolist()
+        for position, bracket_position in zip(positions, found):
+            bracket = period.brackets[bracket_position] if bracket_position >= 0 else None
+            results[position] = (period.table_name, bracket_key(bracket),
+                                 tax_index.find_rebate(dates[position].year, age_groups[position]))
+    return results
+
+
+def resolve_batch(tax_index, dates, incomes, age_groups):
+    """
+    Resolve every case with resolve_tax_details_batch, in chunks.
+    Returns:
+        list: (bracket key, rebate) or the error message for each case.
+    """
+    results = []
+    for start in range(0, len(dates), BATCH_CHUNK_SIZE):
+        records = [
+            {"month": day.month, "year": day.year, "age_group": age_group,
+             "projected_annual_income": income, "projected_annual_income_plus_bonus_leave": income}
+            for day, income, age_group in zip(dates[start:start + BATCH_CHUNK_SIZE],
+                                               incomes[start:start + BATCH_CHUNK_SIZE],
+                                               age_groups[start:start + BATCH_CHUNK_SIZE])
+        ]
+        for details in resolve_tax_details_batch(tax_index, records):
+            if "error" in details:
+                results.append(details["error"])
+            else:
+                results.append(((details["projected_annual_income_min_income"],
+                                 details["projected_annual_income_tax_on_previous_brackets"],
+                                 details["projected_annual_income_tax_percentage"]), details["rebate_value"]))
+    return results
+
+
+def expected_batch(expected):
+    """
+    Returns:
+        object: What resolve_tax_details_batch must return for a reference resolution.
+    """
+    table_name, bracket, rebate_value = expected
+    if table_name is None:
+        return "No applicable tax period table found"
+    if bracket is None:
+        return "No matching tax row for projected_annual_income"
+    if rebate_value is None:
+        return "No matching rebate row found"
+    return bracket, rebate_value
+
+
+def check_tax_free(tax_index, dates, incomes, age_groups, expected, expected_below_gaps):
+    """
+    Args:
+        expected_below_gaps (dict): Reference result for the rounded-down income of each
+        case in a gap between brackets, by case position.
+    Returns:
+        list: For each case, True if it is short-circuited as tax-free and the reference
+        formula agrees it owes no tax (or it is not short-circuited), else the reference tax.
+    """
+    results = []
+    for position, (day, income, age_group) in enumerate(zip(dates, incomes, age_groups)):
+        table_name, bracket, rebate_value = expected[position]
+        period = tax_index.resolve_period(day)
+        rebate = tax_index.find_rebate(day.year, age_group)
+        if period is None or rebate is None or not tax_index.is_tax_free(period, rebate, income):
+            results.append(True)
+            continue
+        if bracket is None and position in expected_below_gaps:
+            table_name, bracket, rebate_value = expected_below_gaps[position]
+        if bracket is None or rebate_value is None:
+            results.append("short-circuited without a reference bracket or rebate")
+            continue
+        tax = calculate_annual_tax(TaxBracket(bracket[0], None, bracket[1], bracket[2]), rebate_value, income)
+        results.append(True if tax == 0 else f"short-circuited but reference tax is {tax}")
+    return results
+
+
+def resolve_consolidated(tax_connection, tax_index, dates, incomes, age_groups):
+    """Resolve cases with one consolidated tax_brackets query each."""
+    results = []
+    for day, income, age_group in zip(dates, incomes, age_groups):
+        row = reference.query_tax_bracket(tax_connection, day, income)
+        if row is None:
+            results.append(None)
+        else:
+            financial_year, bracket = row
+            results.append((tax_index.period_for_year(financial_year).table_name, bracket_key(bracket)))
+    return results
+
+
+def expected_consolidated(expected):
+    """The consolidated query finds nothing when either the period or the bracket is missing."""
+    table_name, bracket, _ = expected
+    return None if table_name is None or bracket is None else (table_name, bracket)
+
+
+def resolve_reference_per_row(tax_connection, rebate_connection, dates, incomes, age_groups):
+    """Resolve cases with the per-row reference queries, as /get-tax-details did before the index."""
+    results = []
+    for day, income, age_group in zip(dates, incomes, age_groups):
+        table_name = reference.find_tax_period_table(tax_connection, day)
+        bracket = reference.find_tax_bracket(tax_connection, table_name, income) if table_name else None
+        results.append((table_name, tuple(bracket) if bracket else None,
+                        reference_total_rebate(rebate_connection, age_group, day.year)))
+    return results
+
+
+def compare(name, expected, actual, dates, incomes, age_groups, elapsed, positions=None):
+    """
+    Compare a path's results with the expected ones.
+    Args:
+        name (str): Path name.
+        expected (list): Expected result per checked case.
+        actual (list): The path's result per checked case.
+        dates, incomes, age_groups (list): The cases.
+        elapsed (float): Seconds the path took.
+        positions (list): Case positions of the checked results, when a sample was checked.
+    Returns:
+        dict: Cases checked, mismatches, throughput and mismatch examples.
+    """
+    positions = positions if positions is not None else range(len(expected))
+    mismatches = 0
+    examples = []
+    for position, wanted, got in zip(positions, expected, actual):
+        if wanted != got:
+            mismatches += 1
+            if len(examples) < MAX_EXAMPLES:
+                examples.append({"date": dates[position].isoformat(), "income": incomes[position],
+                                 "age_group": age_groups[position], "expected": wanted, "actual": got})
+    result = {"path": name, "cases": len(expected), "mismatches": mismatches,
+              "cases_per_second": round(len(expected) / elapsed) if elapsed else None,
+              "seconds": round(elapsed, 3)}
+    if examples:
+        result["examples"] = examples
+    return result
+
+
+def timed(function, *args):
+    """
+    Returns:
+        tuple: The function's result and the seconds it took.
+    """
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def migrate_fixtures(tax_path):
+    """Fold the fixture's tax_period_* tables into tax_brackets with the migration script."""
+    script = os.path.join(REPO_DIR, "Tax_Table_Project", "tax", "migrate-to-tax-brackets.py")
+    subprocess.run([sys.executable, script], env={**os.environ, "TAX_DB_URI": f"sqlite:///{tax_path}"},
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def run_differential(fixture_dir, args):
+    """
+    Build fixtures and cases, resolve them with the reference and every fast path, and compare.
+    Returns:
+        list: Result of each path.
+    """
+    first_year = args.last_year - args.years + 1
+    tax_path, rebate_path = build_fixtures(fixture_dir, args.years, args.last_year)
+    if args.consolidated:
+        migrate_fixtures(tax_path)
+    tax_engine = create_engine(f"sqlite:///{tax_path}", future=True)
+    rebate_engine = create_engine(f"sqlite:///{rebate_path}", future=True)
+    tax_index = load_tax_index(tax_engine, rebate_engine)
+    snapshot_path = os.path.join(fixture_dir, "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, [tax_path, rebate_path])
+    snapshot_index = load_snapshot(snapshot_path, [tax_path, rebate_path])
+
+    dates, incomes, age_groups = generate_cases(tax_index, first_year, args.last_year, args.cases, args.seed)
+    print(f"{len(dates)} cases", file=sys.stderr)
+    sample = list(range(0, len(dates), max(len(dates) // args.sql_cases, 1)))[:args.sql_cases]
+    sample_cases = ([dates[position] for position in sample], [incomes[position] for position in sample],
+                    [age_groups[position] for position in sample])
+
+    results = []
+    with tax_engine.connect() as tax_connection, rebate_engine.connect() as rebate_connection:
+        expected, elapsed = timed(resolve_reference, tax_connection, rebate_connection, dates, incomes, age_groups)
+        results.append({"path": "reference.set_based", "cases": len(expected), "mismatches": None,
+                        "cases_per_second": round(len(expected) / elapsed), "seconds": round(elapsed, 3)})
+
+        actual, elapsed = timed(resolve_reference_per_row, tax_connection, rebate_connection, *sample_cases)
+        results.append(compare("reference.per_row", [expected[position] for position in sample], actual,
+                               dates, incomes, age_groups, elapsed, sample))
+
+        if args.consolidated:
+            actual, elapsed = timed(resolve_consolidated, tax_connection, tax_index, *sample_cases)
+            results.append(compare("consolidated", [expected_consolidated(expected[position]) for position in sample],
+                                   actual, dates, incomes, age_groups, elapsed, sample))
+
+    for name, function, index in (("index", resolve_scalar, tax_index), ("snapshot", resolve_scalar, snapshot_index),
+                                  ("vectorized", resolve_vectorized, tax_index)):
+        actual, elapsed = timed(function, index, dates, incomes, age_groups)
+        results.append(compare(name, expected, actual, dates, incomes, age_groups, elapsed))
+        del actual
+
+    actual, elapsed = timed(resolve_batch, tax_index, dates, incomes, age_groups)
+    first_of_month = [day.replace(day=1) for day in dates]
+    month_expected = expected
+    if any(day.day != 1 for day in dates):
+        with tax_engine.connect() as tax_connection, rebate_engine.connect() as rebate_connection:
+            month_expected = resolve_reference(tax_connection, rebate_connection, first_of_month, incomes, age_groups)
+    results.append(compare("batch", [expected_batch(value) for value in month_expected], actual,
+                           first_of_month, incomes, age_groups, elapsed))
+    del actual
+
+    # Gap incomes have no reference bracket; the tax formula is continuous, so they are
+    # checked against the bracket their income rounds down into
+    gaps = [position for position, (table_name, bracket, _) in enumerate(expected) if table_name and bracket is None]
+    with tax_engine.connect() as tax_connection, rebate_engine.connect() as rebate_connection:
+        below_gaps = resolve_reference(tax_connection, rebate_connection, [dates[position] for position in gaps],
+                                       [math.floor(incomes[position]) for position in gaps],
+                                       [age_groups[position] for position in gaps])
+    actual, elapsed = timed(check_tax_free, tax_index, dates, incomes, age_groups, expected, dict(zip(gaps, below_gaps)))
+    results.append(compare("tax_free", [True] * len(dates), actual, dates, incomes, age_groups, elapsed))
+
+    tax_engine.dispose()
+    rebate_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the fast lookup paths against the reference SQL queries.")
+    parser.add_argument("--cases", type=int, default=1000000, help="boundary plus random cases to check")
+    parser.add_argument("--sql-cases", type=int, default=2000, help="cases also resolved with per-row SQL")
+    parser.add_argument("--years", type=int, default=30, help="financial years of tax_period_* tables")
+    parser.add_argument("--last-year", type=int, default=2027)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--consolidated", action="store_true",
+                        help="migrate the fixtures into tax_brackets and check query_tax_bracket too")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        results = run_differential(fixture_dir, args)
+
+    print(f"{'path':<20} {'cases':>10} {'mismatches':>10} {'cases/s':>12}")
+    for result in results:
+        mismatches = "-" if result["mismatches"] is None else result["mismatches"]
+        print(f"{result['path']:<20} {result['cases']:>10} {mismatches:>10} "
+              f"{result['cases_per_second'] or 0:>12}")
+        for example in result.get("examples", []):
+            print(f"    {json.dumps(example)}")
+
+    if args.output:
+        write_results(args.output, {
+            "meta": run_metadata({key: value for key, value in vars(args).items() if key != "output"}),
+            "differential": results
+        })
+    if any(result["mismatches"] for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Generates tax and rebate SQLite fixtures for benchmarks.
+
+Each financial year gets its own tax_period_<year> table (the layout written by
+Tax_Table_Project/tax/future-adjustments.py) plus a row in tax_table, and the
+rebate table gets a row per age group and year.
+
+    python -m benchmarks.fixtures --output-dir /tmp/tax-fixtures --years 30
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+
+AGE_GROUPS = ("Primary", "Secondary (65 and older)", "Tertiary (75 and older)")
+REBATES = {"Primary": 17235, "Secondary (65 and older)": 9444, "Tertiary (75 and older)": 3145}
+
+# 2024 brackets as (min_income, max_income, tax_on_previous_bracket, tax_percentage)
+BASE_BRACKETS = [
+    (1, 237100, 0, 18),
+    (237101, 370500, 42678, 26),
+    (370501, 512800, 77362, 31),
+    (512801, 673000, 121475, 36),
+    (673001, 857900, 179147, 39),
+    (857901, 1817000, 251258, 41),
+    (1817001, 9999999999, 644489, 45),
+]
+
+
+def period_dates(financial_year):
+    """
+    Returns:
+        tuple: First and last day of a financial year (1 March to the end of February).
+    """
+    effective_date = datetime.date(financial_year - 1, 3, 1)
+    end_date = datetime.date(financial_year, 3, 1) - datetime.timedelta(days=1)
+    return effective_date, end_date
+
+
+def year_brackets(financial_year, first_year):
+    """
+    Brackets for a financial year: the 2024 thresholds shifted by 2% per year, with the
+    tax on previous brackets recomputed so the table stays consistent.
+    Returns:
+        list: (min_income, max_income, tax_on_previous_bracket, tax_percentage) tuples.
+    """
+    factor = 1.02 ** (financial_year - first_year)
+    brackets = []
+    tax_on_previous_bracket = 0
+    for position, (min_income, max_income, _, tax_percentage) in enumerate(BASE_BRACKETS):
+        if position:
+            min_income = brackets[-1][1] + 1
+        if max_income != 9999999999:
+            max_income = int(max_income * factor)
+        brackets.append((min_income, max_income, tax_on_previous_bracket, tax_percentage))
+        tax_on_previous_bracket += round((max_income - min_income + 1) * tax_percentage / 100)
+    return brackets
+
+
+def build_fixtures(output_dir, years=30, last_year=2027):
+    """
+    Write tax_database.db and rebate_database.db fixtures, replacing existing ones.
+    Args:
+        output_dir (str): Directory for the database files.
+        years (int): Number of financial years to generate.
+        last_year (int): The latest financial year.
+    Returns:
+        tuple: Paths of the tax and rebate databases.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tax_path = os.path.join(output_dir, "tax_database.db")
+    rebate_path = os.path.join(output_dir, "rebate_database.db")
+    for path in (tax_path, rebate_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    first_year = last_year - years + 1
+    with sqlite3.connect(tax_path) as connection:
+        connection.execute(
+            "CREATE TABLE tax_table (id INTEGER PRIMARY KEY AUTOINCREMENT, table_name VARCHAR NOT NULL, "
+            "financial_year INTEGER NOT NULL, effective_date DATE NOT NULL, end_date DATE NOT NULL)"
+        )
+        for financial_year in range(first_year, last_year + 1):
+            table_name = f"tax_period_{financial_year}"
+            effective_date, end_date = period_dates(financial_year)
+            connection.execute(
+                f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, min_income INTEGER, "
+                "max_income INTEGER, tax_on_previous_bracket FLOAT, tax_percentage FLOAT, "
+                "effective_date DATE, end_date DATE)"
+            )
+            connection.executemany(
+                f"INSERT INTO {table_name} (min_income, max_income, tax_on_previous_bracket, tax_percentage, "
+                "effective_date, end_date) VALUES (?, ?, ?, ?, ?, ?)",
+                [bracket + (effective_date.isoformat(), end_date.isoformat())
+                 for bracket in year_brackets(financial_year, first_year)]
+            )
+            connection.execute(
+                "INSERT INTO tax_table (table_name, financial_year, effective_date, end_date) VALUES (?, ?, ?, ?)",
+                (table_name, financial_year, effective_date.isoformat(), end_date.isoformat())
+            )
+
+    with sqlite3.connect(rebate_path) as connection:
+        connection.execute(
+            "CREATE TABLE rebate_table (id INTEGER PRIMARY KEY AUTOINCREMENT, age_group VARCHAR, "
+            "financial_year INTEGER, rebate_value FLOAT)"
+        )
+        # Requests look rebates up by calendar year, so cover the year before the first period too
+        connection.executemany(
+            "INSERT INTO rebate_table (age_group, financial_year, rebate_value) VALUES (?, ?, ?)",
+            [(age_group, financial_year, REBATES[age_group])
+             for financial_year in range(first_year - 1, last_year + 1) for age_group in AGE_GROUPS]
+        )
+
+    return tax_path, rebate_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate tax and rebate SQLite fixtures.")
+    parser.add_argument("--output-dir", default="benchmark_fixtures")
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--last-year", type=int, default=2027)
+    args = parser.parse_args()
+    tax_path, rebate_path = build_fixtures(args.output_dir, args.years, args.last_year)
+    print(f"Wrote {tax_path} and {rebate_path}")
+
+
+if __name__ == "__main__":
+    main()
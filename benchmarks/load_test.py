@@ -0,0 +1,230 @@
+"""
+Load test for /get-tax-details.
+
+Generates fixtures, starts stub User Input and Calculation services and the app
+(serve.py) as subprocesses, then drives the endpoint at fixed concurrency levels
+with keep-alive connections and reports throughput and latency percentiles.
+
+    python -m benchmarks.load_test --concurrency 1 8 32 --duration 10 --output results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import run_metadata, write_results
+from benchmarks.fixtures import build_fixtures
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    """Return a TCP port that is free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, path, timeout=60):
+    """
+    Poll a local endpoint until it answers 200.
+    Raises:
+        RuntimeError: If it does not become ready within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", path)
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Service on port {port} did not become ready")
+
+
+def start_services(fixture_dir, args):
+    """
+    Start the stub services and the app.
+    Returns:
+        tuple: The running processes and the app port.
+    """
+    tax_path, rebate_path = build_fixtures(fixture_dir, args.years, args.last_year)
+    user_input_port, calculation_port, app_port = free_port(), free_port(), free_port()
+    stub = [sys.executable, "-m", "benchmarks.stubs", "--latency-ms", str(args.downstream_latency_ms)]
+    processes = [
+        subprocess.Popen(stub + ["--port", str(user_input_port), "--year", str(args.year)], cwd=REPO_DIR),
+        subprocess.Popen(stub + ["--port", str(calculation_port)], cwd=REPO_DIR)
+    ]
+    env = {
+        **os.environ,
+        "TAX_DB_URI": f"sqlite:///{tax_path}",
+        "REBATE_DB_URI": f"sqlite:///{rebate_path}",
+        "USER_INPUT_SERVICE_BASE_URL": f"http://127.0.0.1:{user_input_port}",
+        "CALCULATION_SERVICE_BASE_URL": f"http://127.0.0.1:{calculation_port}",
+        "TAX_SNAPSHOT_PATH": "",
+        "DATA_RELOAD_INTERVAL": "0",
+        "HOST": "127.0.0.1",
+        "PORT": str(app_port),
+        "SERVER_MODE": args.server_mode
+    }
+    log_file = open(os.path.join(fixture_dir, "app.log"), "wb")
+    processes.append(subprocess.Popen([sys.executable, "serve.py"], cwd=REPO_DIR, env=env,
+                                      stdout=log_file, stderr=subprocess.STDOUT))
+    wait_until_ready(user_input_port, "/health")
+    wait_until_ready(calculation_port, "/health")
+    wait_until_ready(app_port, "/ready")
+    return processes, app_port
+
+
+def stop_services(processes):
+    """Terminate the started processes and wait for them to exit."""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def request_bodies(count, seed=0):
+    """
+    Build request bodies with incomes spread over every bracket.
+    Month, year and age group are left out so each request fetches them from the User Input stub.
+    """
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(count):
+        income = rng.randint(1, 2500000)
+        bodies.append(json.dumps({
+            "projected_annual_income": income,
+            "projected_annual_income_plus_bonus_leave": income + rng.randint(0, 50000)
+        }).encode())
+    return bodies
+
+
+def run_level(port, concurrency, duration, warm_up, bodies):
+    """
+    Drive /get-tax-details with a fixed number of keep-alive clients.
+    Args:
+        port (int): App port.
+        concurrency (int): Number of concurrent clients.
+        duration (float): Seconds to measure for.
+        warm_up (float): Seconds to run before measuring.
+        bodies (list): Encoded request bodies, used round-robin.
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles in milliseconds.
+    """
+    started = time.perf_counter()
+    measure_from = started + warm_up
+    stop_at = measure_from + duration
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    headers = {"Content-Type": "application/json"}
+
+    def client(worker):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        position = worker
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                break
+            try:
+                connection.request("POST", "/get-tax-details", body=bodies[position % len(bodies)], headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status in (200, 404)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            if request_started >= measure_from:
+                if ok:
+                    latencies[worker].append(time.perf_counter() - request_started)
+                else:
+                    errors[worker] += 1
+            position += concurrency
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize_level(concurrency, duration, [latency for worker_latencies in latencies
+                                                   for latency in worker_latencies], sum(errors))
+
+
+def summarize_level(concurrency, duration, latencies, errors):
+    """
+    Summarize the measured requests of one concurrency level.
+    Args:
+        concurrency (int): Number of concurrent clients.
+        duration (float): Measured seconds.
+        latencies (list): Latency of every successful request in seconds.
+        errors (int): Failed requests.
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles in milliseconds.
+    """
+    samples = sorted(latencies)
+    result = {"concurrency": concurrency, "requests": len(samples), "errors": errors,
+              "throughput_rps": round(len(samples) / duration, 1)}
+    if len(samples) >= 2:
+        percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+        result.update({
+            "p50_ms": round(percentiles[49] * 1000, 3),
+            "p95_ms": round(percentiles[94] * 1000, 3),
+            "p99_ms": round(percentiles[98] * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3)
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /get-tax-details against generated fixtures.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per concurrency level")
+    parser.add_argument("--warm-up", type=float, default=2.0, help="unmeasured seconds before each level")
+    parser.add_argument("--years", type=int, default=30, help="financial years of tax_period_* tables")
+    parser.add_argument("--last-year", type=int, default=2027)
+    parser.add_argument("--year", type=int, default=2025, help="year returned by the User Input stub")
+    parser.add_argument("--downstream-latency-ms", type=float, default=5.0)
+    parser.add_argument("--server-mode", choices=["threaded", "prefork", "async"], default="threaded")
+    parser.add_argument("--fixture-dir", help="where to write fixtures (default: a temporary directory)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixture_dir = args.fixture_dir or temp_dir
+        processes, port = start_services(fixture_dir, args)
+        try:
+            bodies = request_bodies(1000)
+            levels = []
+            for concurrency in args.concurrency:
+                result = run_level(port, concurrency, args.duration, args.warm_up, bodies)
+                print(json.dumps(result))
+                levels.append(result)
+        finally:
+            stop_services(processes)
+
+    results = {
+        "meta": run_metadata({key: value for key, value in vars(args).items() if key not in ("output", "fixture_dir")}),
+        "load": levels
+    }
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Per-request logging overhead.
+
+Replays the logging a /get-tax-details request does, in a fresh process per logging
+configuration with the log output written to a file, and reports the time per
+request spent on logging:
+    before        the previous request logging: eager f-string INFO records for the
+                  route and the tax period table, written on the request thread
+    off           LOG_LEVEL=WARNING: per-step records and summaries are skipped
+    text          one summary line per request with stage timings, written on the request thread
+    json          one JSON summary line per request, formatted and written by the background thread
+    json-sampled  as json, for 1% of requests
+
+The requests themselves are left out, as their cost would drown the difference.
+request_ns is the CPU time of the request thread per request; total_ns is the CPU
+time of the whole process, including draining the log queue afterwards, so it adds
+the writer thread's share.
+
+    python -m benchmarks.logging_overhead --requests 100000 --output logging.json
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import run_metadata, write_results
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = {
+    "before": {"LOG_FORMAT": "text", "LOG_LEVEL": "INFO"},
+    "off": {"LOG_FORMAT": "text", "LOG_LEVEL": "WARNING"},
+    "text": {"LOG_FORMAT": "text", "LOG_LEVEL": "INFO"},
+    # A queue large enough for the whole run, so every record is written and counted in total_ns
+    "json": {"LOG_FORMAT": "json", "LOG_LEVEL": "INFO", "LOG_QUEUE_SIZE": "1000000"},
+    "json-sampled": {"LOG_FORMAT": "json", "LOG_LEVEL": "INFO", "LOG_QUEUE_SIZE": "1000000", "LOG_SAMPLE_RATE": "0.01"}
+}
+
+STAGES = ("resolve_period", "find_rebate", "find_bracket")
+
+
+def log_request_before(table_name):
+    """The per-request logging of /get-tax-details before request summaries."""
+    logging.info("Accessing /get-tax-details route")
+    logging.info(f"Relevant tax period table: {table_name}")
+
+
+def log_request(table_name, time_stage):
+    """The per-request logging of /get-tax-details with request summaries."""
+    import request_log
+
+    summary = request_log.start_request("get_tax_details")
+    logging.debug("Accessing /get-tax-details route")
+    for stage in STAGES:
+        with time_stage(stage):
+            pass
+    logging.debug("Relevant tax period table: %s", table_name)
+    request_log.annotate(outcome="ok")
+    request_log.finish_request(summary, "POST", "/get-tax-details", 200)
+
+
+def run_worker(configuration, requests, repeat):
+    """
+    Time the request logging in this process, with the logging configured by the environment.
+    Returns:
+        dict: CPU nanoseconds per request on the request thread and in the whole process.
+    """
+    import request_log
+
+    request_log.configure_logging()
+    time_stage = request_log.stage_timer()
+    if configuration == "before":
+        replay = log_request_before
+    else:
+        def replay(table_name):
+            log_request(table_name, time_stage)
+    table_names = [f"tax_period_{year}" for year in range(1998, 2028)]
+
+    best_request = best_total = float("inf")
+    for _ in range(repeat):
+        thread_started, process_started = time.thread_time_ns(), time.process_time_ns()
+        for position in range(requests):
+            replay(table_names[position % len(table_names)])
+        thread_finished = time.thread_time_ns()
+        if request_log.queued_logging:
+            request_log.queued_logging.stop()
+            request_log.queued_logging.start()
+        best_request = min(best_request, thread_finished - thread_started)
+        best_total = min(best_total, time.process_time_ns() - process_started)
+    return {
+        "request_ns": round(best_request / requests, 1),
+        "total_ns": round(best_total / requests, 1),
+        "dropped": request_log.dropped_records()
+    }
+
+
+def run_configuration(name, log_dir, args):
+    """
+    Run the worker for one logging configuration in a fresh process.
+    Returns:
+        dict: The worker's timings and the size of the log it wrote.
+    """
+    log_path = os.path.join(log_dir, f"{name}.log")
+    env = {**os.environ, **CONFIGURATIONS[name]}
+    command = [sys.executable, "-m", "benchmarks.logging_overhead", "--worker", name,
+               "--requests", str(args.requests), "--repeat", str(args.repeat)]
+    with open(log_path, "wb") as log_file:
+        completed = subprocess.run(command, cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, stderr=log_file,
+                                   check=True)
+    result = json.loads(completed.stdout.decode().strip().splitlines()[-1])
+    return {"configuration": name, **result, "log_bytes": os.path.getsize(log_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-request cost of each logging configuration.")
+    parser.add_argument("--configurations", nargs="+", choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument("--requests", type=int, default=100000, help="requests per pass")
+    parser.add_argument("--repeat", type=int, default=5, help="passes per configuration; the fastest is reported")
+    parser.add_argument("--worker", choices=list(CONFIGURATIONS), help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.requests, args.repeat)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        for name in args.configurations:
+            result = run_configuration(name, log_dir, args)
+            print(json.dumps(result))
+            results.append(result)
+
+    # Request thread time of each configuration relative to the previous logging
+    baseline = next((result for result in results if result["configuration"] == "before"), None)
+    if baseline:
+        print("request_ns vs before: " + ", ".join(
+            f"{result['configuration']} {result['request_ns'] / baseline['request_ns']:.2f}x" for result in results))
+
+    if args.output:
+        write_results(args.output, {
+            "meta": run_metadata({key: value for key, value in vars(args).items() if key not in ("output", "worker")}),
+            "logging": results
+        })
+
+
+if __name__ == "__main__":
+    main()
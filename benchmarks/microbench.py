@@ -0,0 +1,120 @@
+"""
+Microbenchmarks for tax period resolution, bracket lookup and rebate lookup.
+
+Times the in-memory TaxIndex against the per-request SQL queries it replaced
+(benchmarks/reference.py), on generated fixtures.
+
+    python -m benchmarks.microbench --years 30 --output micro.json
+"""
+import argparse
+import datetime
+import json
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from benchmarks import reference
+from benchmarks.common import run_metadata, write_results
+from benchmarks.fixtures import AGE_GROUPS, build_fixtures, period_dates
+from tax_index import load_tax_index
+
+
+def time_per_op(function, inputs, repeat=5):
+    """
+    Time a function over a list of inputs.
+    Args:
+        function (callable): Called with each input.
+        inputs (list): Inputs for one pass.
+        repeat (int): Passes to run; the fastest is reported.
+    Returns:
+        float: Nanoseconds per call in the fastest pass.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for value in inputs:
+            function(value)
+        best = min(best, time.perf_counter_ns() - started)
+    return round(best / len(inputs), 1)
+
+
+def run_microbenchmarks(tax_path, rebate_path, first_year, last_year, operations=2000, sql_operations=200):
+    """
+    Run every microbenchmark.
+    Args:
+        tax_path (str): Tax database fixture.
+        rebate_path (str): Rebate database fixture.
+        first_year (int): First financial year in the fixtures.
+        last_year (int): Last financial year in the fixtures.
+        operations (int): Lookups per pass for in-memory paths.
+        sql_operations (int): Lookups per pass for SQL paths.
+    Returns:
+        dict: Nanoseconds per operation by benchmark name.
+    """
+    tax_engine = create_engine(f"sqlite:///{tax_path}", future=True)
+    rebate_engine = create_engine(f"sqlite:///{rebate_path}", future=True)
+    tax_index = load_tax_index(tax_engine, rebate_engine)
+
+    rng = random.Random(0)
+    first_date = period_dates(first_year)[0]
+    last_date = period_dates(last_year)[1]
+    dates = [first_date + datetime.timedelta(days=rng.randint(0, (last_date - first_date).days))
+             for _ in range(operations)]
+    incomes = [rng.randint(1, 2500000) for _ in range(operations)]
+    period = tax_index.periods[-1]
+    rebate_keys = [(rng.randint(first_year, last_year), rng.choice(AGE_GROUPS)) for _ in range(operations)]
+    datetimes = [datetime.datetime.combine(value, datetime.time()) for value in dates[:sql_operations]]
+
+    results = {
+        "index.resolve_period": time_per_op(tax_index.resolve_period, dates),
+        "index.find_bracket": time_per_op(lambda income: tax_index.find_bracket(period, income), incomes),
+        "index.find_rebate": time_per_op(lambda key: tax_index.find_rebate(*key), rebate_keys)
+    }
+
+    tax_index.bracket_arrays(period)
+    batch = incomes * 50
+    started = time.perf_counter_ns()
+    tax_index.find_brackets(period, batch)
+    results["index.find_brackets_vectorized"] = round((time.perf_counter_ns() - started) / len(batch), 1)
+
+    with tax_engine.connect() as tax_connection, rebate_engine.connect() as rebate_connection:
+        results["sql.resolve_period"] = time_per_op(
+            lambda value: reference.find_tax_period_table(tax_connection, value), datetimes, repeat=3)
+        results["sql.find_bracket"] = time_per_op(
+            lambda income: reference.find_tax_bracket(tax_connection, period.table_name, income),
+            incomes[:sql_operations], repeat=3)
+        results["sql.find_rebate"] = time_per_op(
+            lambda key: reference.find_rebate(rebate_connection, key[1], key[0]),
+            rebate_keys[:sql_operations], repeat=3)
+
+    tax_engine.dispose()
+    rebate_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark period resolution and bracket lookup.")
+    parser.add_argument("--years", type=int, default=30, help="financial years of tax_period_* tables")
+    parser.add_argument("--last-year", type=int, default=2027)
+    parser.add_argument("--operations", type=int, default=2000, help="lookups per pass for in-memory paths")
+    parser.add_argument("--sql-operations", type=int, default=200, help="lookups per pass for SQL paths")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        tax_path, rebate_path = build_fixtures(fixture_dir, args.years, args.last_year)
+        results = run_microbenchmarks(tax_path, rebate_path, args.last_year - args.years + 1, args.last_year,
+                                      args.operations, args.sql_operations)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(args.output, {
+            "meta": run_metadata({key: value for key, value in vars(args).items() if key != "output"}),
+            "micro_ns_per_op": results
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Reference lookups: the per-request SQL queries /get-tax-details ran before the
+in-memory index, and the single-statement lookup on the consolidated tax_brackets
+table. They are what the fast lookup paths are measured and checked against.
+"""
+from sqlalchemy import text
+
+from tax_index import TaxBracket
+
+
+def find_tax_period_table(connection, input_date):
+    """
+    Find the tax period table covering a date by scanning every tax_period_% table.
+    Args:
+        connection: An open connection to the tax database.
+        input_date (datetime.datetime): The date to resolve.
+    Returns:
+        str: The table name, or None if no period applies.
+    """
+    tables_query = text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'tax_period_%';")
+    tables = connection.execute(tables_query).fetchall()
+    for table in tables:
+        table_name = table[0]
+        check_date_query = text(f"SELECT COUNT(*) FROM {table_name} WHERE effective_date <= :date AND end_date >= :date;")
+        count = connection.execute(check_date_query, {"date": input_date}).scalar()
+        if count > 0:
+            return table_name
+    return None
+
+
+def find_tax_bracket(connection, table_name, income):
+    """
+    Find the bracket row of a period table containing an income.
+    Returns:
+        Row: min_income, tax_on_previous_bracket and tax_percentage, or None.
+    """
+    income_query = text(f"""
+        SELECT min_income, tax_on_previous_bracket, tax_percentage
+        FROM {table_name}
+        WHERE min_income <= :income AND max_income >= :income;
+    """)
+    return connection.execute(income_query, {"income": income}).fetchone()
+
+
+def find_rebate(connection, age_group, year):
+    """
+    Find the rebate value for an age group and year.
+    Returns:
+        float: The rebate value, or None.
+    """
+    rebate_query = text("SELECT rebate_value FROM rebate_table WHERE age_group = :age_group AND financial_year = :financial_year")
+    row = connection.execute(rebate_query, {"age_group": age_group, "financial_year": year}).fetchone()
+    return row[0] if row else None
+
+
+def find_tax_period_tables(connection, dates):
+    """
+    find_tax_period_table for many dates: the same per-table date predicate, evaluated
+    for every date in one statement per tax_period_% table, with the first matching
+    table winning as in the scan.
+    Args:
+        connection: An open connection to the tax database.
+        dates (list): datetime.date values to resolve.
+    Returns:
+        list: The table name for each date, or None where no period applies.
+    """
+    days = sorted({value.isoformat() for value in dates})
+    connection.execute(text("CREATE TEMP TABLE IF NOT EXISTS reference_dates (day DATE PRIMARY KEY);"))
+    connection.execute(text("DELETE FROM reference_dates;"))
+    connection.execute(text("INSERT INTO reference_dates (day) VALUES (:day);"), [{"day": day} for day in days])
+
+    tables_query = text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'tax_period_%';")
+    found = {}
+    for (table_name,) in connection.execute(tables_query).fetchall():
+        rows = connection.execute(text(f"""
+            SELECT DISTINCT d.day FROM reference_dates d
+            JOIN {table_name} p ON p.effective_date <= d.day AND p.end_date >= d.day;
+        """))
+        for (day,) in rows:
+            found.setdefault(day, table_name)
+    return [found.get(value.isoformat()) for value in dates]
+
+
+def find_tax_brackets(connection, table_name, incomes):
+    """
+    find_tax_bracket for many incomes: the same inclusive min_income/max_income
+    predicate, evaluated for every income in one statement.
+    Args:
+        connection: An open connection to the tax database.
+        table_name (str): The tax period table.
+        incomes (list): The incomes to look up.
+    Returns:
+        list: (min_income, tax_on_previous_bracket, tax_percentage) for each income, or None.
+    """
+    connection.execute(text("CREATE TEMP TABLE IF NOT EXISTS reference_incomes (position INTEGER PRIMARY KEY, income REAL);"))
+    connection.execute(text("DELETE FROM reference_incomes;"))
+    connection.execute(text("INSERT INTO reference_incomes (position, income) VALUES (:position, :income);"),
+                       [{"position": position, "income": float(income)} for position, income in enumerate(incomes)])
+    rows = connection.execute(text(f"""
+        SELECT i.position, b.min_income, b.tax_on_previous_bracket, b.tax_percentage
+        FROM reference_incomes i
+        JOIN {table_name} b ON b.min_income <= i.income AND b.max_income >= i.income
+        ORDER BY i.position, b.rowid;
+    """))
+    brackets = [None] * len(incomes)
+    for position, min_income, tax_on_previous_bracket, tax_percentage in rows:
+        if brackets[position] is None:
+            brackets[position] = (min_income, tax_on_previous_bracket, tax_percentage)
+    return brackets
+
+
+# Resolves the period and bracket for a date and income in one indexed statement
+# against the consolidated tax_brackets table
+TAX_BRACKET_QUERY = text("""
+    SELECT t.table_name, t.financial_year, b.min_income, b.max_income,
+           b.tax_on_previous_bracket, b.tax_percentage
+    FROM tax_table t
+    JOIN tax_brackets b ON b.financial_year = t.financial_year
+    WHERE t.effective_date <= :date AND t.end_date >= :date
+      AND b.min_income <= :income AND b.max_income >= :income
+    ORDER BY t.effective_date DESC, b.min_income DESC
+    LIMIT 1;
+""")
+
+
+def query_tax_bracket(connection, input_date, income):
+    """
+    Resolve the tax period and bracket for a date and income directly from the consolidated tables.
+    Args:
+        connection: An open connection to the tax database.
+        input_date (datetime.date): The date to resolve.
+        income (float): The income to look up.
+    Returns:
+        tuple: (financial_year, TaxBracket), or None if no period or bracket applies.
+    """
+    row = connection.execute(TAX_BRACKET_QUERY, {"date": input_date.isoformat(), "income": income}).fetchone()
+    if not row:
+        return None
+    return row.financial_year, TaxBracket(row.min_income, row.max_income, row.tax_on_previous_bracket, row.tax_percentage)
@@ -0,0 +1,147 @@
+"""
+Serialization cost and payload size of the JSON and MessagePack wire formats.
+
+Builds the payloads the service actually exchanges from generated fixtures: a
+/get-tax-details request body, the tax details posted to the Calculation Service,
+a locally computed /calculate-tax response and a /get-tax-details/batch response,
+then times encoding and decoding each one in both formats and reports the bytes on
+the wire. JSON is encoded as Flask's jsonify does (sorted keys, compact separators);
+MessagePack goes through wire_format, as the service sends it.
+
+    python -m benchmarks.serialization --batch-size 1000 --output serialization.json
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from benchmarks.common import run_metadata, write_results
+from benchmarks.fixtures import AGE_GROUPS, build_fixtures, period_dates
+from tax_details import lookup_tax_details, resolve_tax_details_batch
+from tax_index import load_tax_index
+import wire_format
+
+
+def encode_json(body):
+    """Encode a body as the JSON the service responds with."""
+    return json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+FORMATS = {
+    "json": (encode_json, json.loads),
+    "msgpack": (wire_format.pack, wire_format.unpack)
+}
+
+
+def time_per_call(function, value, calls, repeat=5):
+    """
+    Time repeated calls of a function on one value.
+    Args:
+        function (callable): Called with the value.
+        value: The argument.
+        calls (int): Calls per pass.
+        repeat (int): Passes to run; the fastest is reported.
+    Returns:
+        float: Nanoseconds per call in the fastest pass.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for _ in range(calls):
+            function(value)
+        best = min(best, time.perf_counter_ns() - started)
+    return round(best / calls, 1)
+
+
+def build_payloads(tax_index, last_year, batch_size):
+    """
+    Build one payload of each kind the service exchanges.
+    Args:
+        tax_index (TaxIndex): The loaded index.
+        last_year (int): Financial year of the requests.
+        batch_size (int): Records in the batch payload.
+    Returns:
+        dict: Payload by name.
+    """
+    rng = random.Random(0)
+    month_date = period_dates(last_year)[0]
+
+    def record():
+        income = rng.randint(100000, 2000000)
+        return {"month": month_date.month, "year": month_date.year, "age_group": rng.choice(AGE_GROUPS),
+                "projected_annual_income": income, "projected_annual_income_plus_bonus_leave": income + 25000}
+
+    request_body = record()
+    tax_details, _, _ = lookup_tax_details(tax_index, request_body)
+    calculation, _, _ = lookup_tax_details(tax_index, request_body, compute_locally=True)
+    batch = {"results": resolve_tax_details_batch(tax_index, [record() for _ in range(batch_size)])}
+    return {
+        "request": request_body,
+        "tax_details": tax_details,
+        "calculate_tax": calculation,
+        f"batch_{batch_size}": batch
+    }
+
+
+def run_benchmarks(payloads, calls):
+    """
+    Time encoding and decoding every payload in every format.
+    Args:
+        payloads (dict): Payload by name.
+        calls (int): Calls per pass for single-record payloads; batches use fewer.
+    Returns:
+        list: One result per payload and format, with ns per encode and decode and the encoded bytes.
+    """
+    results = []
+    for name, payload in payloads.items():
+        payload_calls = calls if not name.startswith("batch") else max(1, calls // 1000)
+        sizes = {}
+        for format_name, (encode, decode) in FORMATS.items():
+            encoded = encode(payload)
+            # Both formats must carry the same values for the comparison to mean anything
+            assert decode(encoded) == json.loads(encode_json(payload)), f"{format_name} round trip of {name} differs"
+            sizes[format_name] = len(encoded)
+            results.append({
+                "payload": name,
+                "format": format_name,
+                "encode_ns": time_per_call(encode, payload, payload_calls),
+                "decode_ns": time_per_call(decode, encoded, payload_calls),
+                "bytes": len(encoded),
+                "bytes_vs_json": round(len(encoded) / sizes["json"], 3)
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and MessagePack serialization cost and size.")
+    parser.add_argument("--years", type=int, default=5, help="financial years of tax_period_* tables")
+    parser.add_argument("--last-year", type=int, default=2027)
+    parser.add_argument("--batch-size", type=int, default=1000, help="records in the batch payload")
+    parser.add_argument("--calls", type=int, default=20000, help="calls per pass for single-record payloads")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        tax_path, rebate_path = build_fixtures(fixture_dir, args.years, args.last_year)
+        tax_engine = create_engine(f"sqlite:///{tax_path}", future=True)
+        rebate_engine = create_engine(f"sqlite:///{rebate_path}", future=True)
+        tax_index = load_tax_index(tax_engine, rebate_engine)
+        tax_engine.dispose()
+        rebate_engine.dispose()
+
+    results = run_benchmarks(build_payloads(tax_index, args.last_year, args.batch_size), args.calls)
+    for result in results:
+        print(json.dumps(result))
+
+    if args.output:
+        write_results(args.output, {
+            "meta": run_metadata({key: value for key, value in vars(args).items() if key != "output"}),
+            "serialization": results
+        })
+
+
+if __name__ == "__main__":
+    main()
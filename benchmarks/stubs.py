@@ -0,0 +1,80 @@
+"""
+Stub User Input and Calculation services with configurable latency.
+
+    python -m benchmarks.stubs --port 5101 --latency-ms 20
+serves GET /get-user-input, POST /receive-tax-rebate-details and GET /health.
+Bodies are read and written as JSON, or as MessagePack by Content-Type and Accept.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import wire_format
+
+USER_INPUT = {"month": 6, "year": 2025, "age_group": "Primary"}
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server that accepts bursts of thousands of connections."""
+
+    daemon_threads = True
+    # Without a long listen queue, connection bursts hit SYN retries that skew the latencies
+    request_queue_size = 1024
+
+
+def make_handler(latency, user_input=USER_INPUT):
+    """
+    Build a request handler class that sleeps for latency seconds before answering.
+    Args:
+        latency (float): Seconds to wait before every response.
+        user_input (dict): Body returned by GET /get-user-input.
+    """
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; without this Nagle adds ~40 ms per response
+        disable_nagle_algorithm = True
+
+        def _reply(self, body):
+            time.sleep(latency)
+            if wire_format.negotiate(self.headers.get("Accept")) == "msgpack":
+                payload, content_type = wire_format.pack(body), wire_format.MSGPACK_MIMETYPE
+            else:
+                payload, content_type = json.dumps(body).encode(), wire_format.JSON_MIMETYPE
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/get-user-input":
+                self._reply(user_input)
+            else:
+                self._reply({"status": "OK"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            data = self.rfile.read(length)
+            received = wire_format.decode(data, self.headers.get("Content-Type")) if data else None
+            self._reply({"received": received})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub downstream service.")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--year", type=int, default=USER_INPUT["year"], help="year returned as user input")
+    args = parser.parse_args()
+    user_input = {**USER_INPUT, "year": args.year}
+    server = StubServer(("127.0.0.1", args.port), make_handler(args.latency_ms / 1000, user_input))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
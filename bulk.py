@@ -0,0 +1,389 @@
+"""
+Streaming bulk tax details for payroll files.
+
+Records are read line by line from CSV (with a header row) or NDJSON, or one by one
+from a stream of MessagePack maps, resolved in chunks with the same logic as
+/get-tax-details/batch, and written back as NDJSON (or a MessagePack stream), one
+result per input record in input order. Only a bounded number of chunks is in
+flight at a time, so memory stays constant however large the file is.
+
+Resolve a file locally against the configured databases:
+    python bulk.py payroll.csv --output results.ndjson --workers 4
+or stream it through a running service:
+    python bulk.py payroll.csv --url http://localhost:5001
+"""
+import argparse
+import collections
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+
+from index_reloader import file_fingerprint, fingerprint_version
+from tax_details import resolve_tax_details_batch
+import wire_format
+
+# Bulk processing settings
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "5000"))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "0"))
+
+INPUT_FORMATS = ("csv", "ndjson", "msgpack")
+OUTPUT_FORMATS = ("ndjson", "msgpack")
+INTEGER_FIELDS = ("month", "year")
+NUMBER_FIELDS = ("projected_annual_income", "projected_annual_income_plus_bonus_leave")
+
+# Index loaded by each process pool worker, where it was loaded from and its data version
+_worker_index = None
+_worker_source = None
+_worker_version = None
+
+
+def text_lines(byte_lines):
+    """
+    Decode an iterable of byte lines as UTF-8, dropping a leading byte order mark.
+    """
+    encoding = "utf-8-sig"
+    for line in byte_lines:
+        yield line.decode(encoding)
+        encoding = "utf-8"
+
+
+def _convert_csv_value(field, value):
+    """Convert a CSV cell to the type the JSON API expects, leaving invalid values for validation."""
+    if value is None or value == "":
+        return None
+    try:
+        if field in INTEGER_FIELDS:
+            return int(value)
+        if field in NUMBER_FIELDS:
+            return float(value)
+    except ValueError:
+        pass
+    return value
+
+
+def parse_records(lines, input_format):
+    """
+    Parse records lazily from text lines.
+    Args:
+        lines (iterable): Lines of the input file.
+        input_format (str): "csv" or "ndjson".
+    Yields:
+        dict: One record per data row; unparseable NDJSON lines are yielded as strings
+        and reported as invalid records.
+    """
+    if input_format == "csv":
+        for row in csv.DictReader(lines):
+            yield {field.strip(): _convert_csv_value(field.strip(), value) for field, value in row.items() if field}
+        return
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def read_records(input_file, input_format):
+    """
+    Parse records lazily from a binary input file.
+    Args:
+        input_file (file): The binary input stream.
+        input_format (str): "csv", "ndjson" or "msgpack".
+    Returns:
+        iterable: The records.
+    """
+    if input_format == "msgpack":
+        return wire_format.unpack_stream(input_file)
+    return parse_records(text_lines(input_file), input_format)
+
+
+def chunked(records, chunk_size):
+    """
+    Group records into lists of at most chunk_size.
+    Yields:
+        tuple: The 1-based row number of the first record and the chunk.
+    """
+    chunk = []
+    first_row = 1
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield first_row, chunk
+            first_row += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_row, chunk
+
+
+def format_results(first_row, results, output_format="ndjson"):
+    """
+    Encode the results of a chunk with the row number of each record.
+    Args:
+        first_row (int): Row number of the first record.
+        results (list): Tax details or {"error": ...} for each record.
+        output_format (str): "ndjson" or "msgpack".
+    Returns:
+        str: NDJSON result lines, or bytes of the concatenated MessagePack results for msgpack.
+    """
+    if output_format == "msgpack":
+        return b"".join(wire_format.pack({"row": row, **result}) for row, result in enumerate(results, start=first_row))
+    return "".join(
+        json.dumps({"row": row, **result}) + "\n" for row, result in enumerate(results, start=first_row)
+    )
+
+
+def resolve_chunk(tax_index, first_row, records, output_format="ndjson"):
+    """
+    Resolve a chunk of records.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        first_row (int): Row number of the first record.
+        records (list): The records.
+        output_format (str): "ndjson" or "msgpack".
+    Returns:
+        tuple: The encoded results (see format_results) and the number of records that failed.
+    """
+    results = resolve_tax_details_batch(tax_index, records)
+    return format_results(first_row, results, output_format), sum(1 for result in results if "error" in result)
+
+
+def load_worker_index(snapshot_path, tax_db_uri, rebate_db_uri, source_paths):
+    """
+    Load the tax index in a worker process: from the snapshot while it is current, otherwise from the databases.
+    Returns:
+        TaxIndex: The loaded index.
+    """
+    from snapshot import SnapshotError, load_snapshot
+
+    if snapshot_path:
+        try:
+            return load_snapshot(snapshot_path, source_paths)
+        except SnapshotError as e:
+            logging.info(f"Loading tax and rebate tables from the databases: {e}")
+
+    from sqlalchemy import create_engine
+    from tax_index import load_tax_index
+
+    return load_tax_index(create_engine(tax_db_uri, future=True), create_engine(rebate_db_uri, future=True))
+
+
+def _init_worker(*index_source):
+    """Process pool initializer: load this worker's index."""
+    global _worker_source
+    _worker_source = index_source
+    _load_worker_index()
+
+
+def _source_version():
+    """Data version of the worker's database files, as TaxIndexHolder.data_version computes it."""
+    return fingerprint_version(file_fingerprint([path for path in _worker_source[3] if path]))
+
+
+def _load_worker_index():
+    """Load the worker's index and note the data version of the files it was loaded from."""
+    global _worker_index, _worker_version
+    _worker_version = _source_version()
+    _worker_index = load_worker_index(*_worker_source)
+
+
+def _resolve_in_worker(first_row, records, output_format, data_version):
+    """Resolve a chunk with the worker's index, reloading it first if the data has changed since it was loaded."""
+    if data_version != _worker_version and _source_version() != _worker_version:
+        _load_worker_index()
+    return resolve_chunk(_worker_index, first_row, records, output_format)
+
+
+class WorkerPool:
+    """
+    Process pool resolving bulk chunks, created on first use and shared by every bulk
+    stream of the process.
+
+    Workers are spawned rather than forked, so they never inherit the server's threads,
+    and load the index once. Each chunk carries the data version of the index its
+    stream started with; a worker reloads only when the database files have changed
+    since it loaded them.
+    """
+
+    def __init__(self, workers, index_source):
+        """
+        Args:
+            workers (int): Worker processes.
+            index_source (tuple): Arguments of load_worker_index.
+        """
+        self.workers = workers
+        self.index_source = index_source
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, first_row, records, output_format, data_version=None):
+        """
+        Queue a chunk for a worker.
+        Returns:
+            concurrent.futures.Future: Resolves to the result of resolve_chunk.
+        """
+        return self._get_executor().submit(_resolve_in_worker, first_row, records, output_format, data_version)
+
+    def _get_executor(self):
+        """Create the pool in this process on first use, e.g. in each pre-fork worker."""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=self.index_source
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def shutdown(self):
+        """Stop the worker processes of this process's pool."""
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+
+def _failed_chunk(first_row, count, output_format, error):
+    """
+    Returns:
+        tuple: An error row for each record of a chunk that could not be resolved, and the count.
+    """
+    logging.error("Error resolving bulk rows %d-%d: %s", first_row, first_row + count - 1, error)
+    return format_results(first_row, [{"error": "Could not resolve record"}] * count, output_format), count
+
+
+def stream_results(input_file, input_format, tax_index, chunk_size=BULK_CHUNK_SIZE, pool=None, data_version=None,
+                   output_format="ndjson"):
+    """
+    Resolve a binary input stream into a stream of result chunks.
+
+    A chunk that fails gets an error row for each of its records, and input that cannot
+    be read to the end gets a final error line without a row number.
+    Args:
+        input_file (file): The binary input stream.
+        input_format (str): "csv", "ndjson" or "msgpack".
+        tax_index (TaxIndex): Index used when resolving in-process.
+        chunk_size (int): Records per chunk.
+        pool (WorkerPool): Resolves chunks in worker processes; None resolves them in this process.
+        data_version (str): Data version of tax_index, so pool workers resolve against the same data.
+        output_format (str): "ndjson" or "msgpack".
+    Yields:
+        str: NDJSON result lines for one chunk, in input order (bytes for msgpack).
+    Returns:
+        str: The outcome once the stream is done: "ok", "partial" if records failed, or
+        "error" if the input could not be read.
+    """
+    read_errors = []
+
+    def readable(records):
+        # Malformed input, e.g. truncated MessagePack or invalid UTF-8, ends the records read so far
+        try:
+            yield from records
+        except (ValueError, csv.Error) as e:
+            read_errors.append(e)
+
+    chunks = chunked(readable(read_records(input_file, input_format)), chunk_size)
+    # Keep two chunks per worker in flight: enough to stay busy, little enough to bound memory
+    max_pending = pool.workers * 2 if pool else 0
+    pending = collections.deque()
+    failed = 0
+
+    def next_result():
+        first_row, count, future = pending.popleft()
+        try:
+            return future.result()
+        except Exception as e:
+            return _failed_chunk(first_row, count, output_format, e)
+
+    for first_row, records in chunks:
+        if pool:
+            pending.append((first_row, len(records), pool.submit(first_row, records, output_format, data_version)))
+            if len(pending) < max_pending:
+                continue
+            results, errors = next_result()
+        else:
+            try:
+                results, errors = resolve_chunk(tax_index, first_row, records, output_format)
+            except Exception as e:
+                results, errors = _failed_chunk(first_row, len(records), output_format, e)
+        failed += errors
+        yield results
+    while pending:
+        results, errors = next_result()
+        failed += errors
+        yield results
+
+    if read_errors:
+        logging.error("Error reading bulk input: %s", read_errors[0])
+        error = {"error": f"Could not read input: {read_errors[0]}"}
+        yield wire_format.pack(error) if output_format == "msgpack" else json.dumps(error) + "\n"
+        return "error"
+    return "partial" if failed else "ok"
+
+
+def detect_format(path, requested=None):
+    """Return the requested input format, or guess it from the file extension."""
+    if requested:
+        return requested
+    if path.lower().endswith(".csv"):
+        return "csv"
+    return "msgpack" if path.lower().endswith((".msgpack", ".mpk")) else "ndjson"
+
+
+def main():
+    """Command line entry point: resolve a payroll file locally or through the service."""
+    parser = argparse.ArgumentParser(description="Resolve tax details for a CSV, NDJSON or MessagePack payroll file.")
+    parser.add_argument("input", help="input file, or - for stdin")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=INPUT_FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS, help="worker processes (0 resolves in-process)")
+    parser.add_argument("--url", help="stream the file through a running service instead of resolving locally")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    input_format = detect_format(args.input, args.format)
+    input_file = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    # Results are written as bytes, whether NDJSON or MessagePack
+    output_file = open(args.output, "wb") if args.output else sys.stdout.buffer
+
+    with input_file, output_file:
+        if args.url:
+            import requests
+
+            accept = wire_format.MSGPACK_MIMETYPE if args.output_format == "msgpack" else "application/x-ndjson"
+            response = requests.post(
+                f"{args.url.rstrip('/')}/get-tax-details/bulk", params={"format": input_format},
+                data=input_file, headers={"Accept": accept}, stream=True
+            )
+            response.raise_for_status()
+            for block in response.iter_content(chunk_size=65536):
+                output_file.write(block)
+            return
+
+        from app_config import DATABASE_PATHS, REBATE_DB_URI, TAX_DB_URI, TAX_SNAPSHOT_PATH
+
+        index_source = (TAX_SNAPSHOT_PATH, TAX_DB_URI, REBATE_DB_URI, DATABASE_PATHS)
+        pool = WorkerPool(args.workers, index_source) if args.workers else None
+        tax_index = None if pool else load_worker_index(*index_source)
+        try:
+            for results in stream_results(input_file, input_format, tax_index, args.chunk_size, pool,
+                                          output_format=args.output_format):
+                output_file.write(results.encode("utf-8") if isinstance(results, str) else results)
+        finally:
+            if pool:
+                pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
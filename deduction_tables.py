@@ -0,0 +1,290 @@
+"""
+Materialized monthly PAYE deduction tables.
+
+Like the SARS monthly deduction tables, every financial year and age group gets a
+table of monthly deductions for monthly remuneration bands DEDUCTION_BAND_WIDTH rand
+wide, up to DEDUCTION_TABLE_MAX_INCOME. A band's deduction is the monthly tax on
+its midpoint, annualized, with the same formula and total (stacked) rebate as
+/calculate-tax. Deductions are kept in cents in one int32 array per table, so a
+lookup is a single array index.
+
+Build the table file from the configured tax and rebate data and check it with:
+    python deduction_tables.py build [--output deduction_tables.bin]
+    python deduction_tables.py verify
+
+Layout (little-endian):
+    header     magic, format version, band width, band and table counts, index digest
+    tables     fixed-width table directory, one entry per (financial year, age group)
+    deductions int32 deductions in cents, band_count per table, -1 where no bracket applies
+    strings    UTF-8 age group names referenced by offset and length
+
+The index digest is a SHA-256 of the brackets, rebates and band layout the tables were
+built from; a file whose digest does not match the loaded index is rebuilt in memory.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import struct
+from array import array
+
+from tax_details import annual_tax_arrays, calculate_annual_tax
+
+# Deduction table settings
+DEDUCTION_BAND_WIDTH = int(os.getenv("DEDUCTION_BAND_WIDTH", "100"))
+DEDUCTION_TABLE_MAX_INCOME = int(os.getenv("DEDUCTION_TABLE_MAX_INCOME", "150000"))
+DEDUCTION_TABLES_PATH = os.getenv("DEDUCTION_TABLES_PATH", "deduction_tables.bin")
+
+DEDUCTION_MAGIC = b"PAYETAB\x00"
+DEDUCTION_FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<8sIIII32s")
+TABLE = struct.Struct("<iII")
+
+# Deduction stored for bands outside every bracket
+NO_BRACKET = -1
+
+
+class DeductionTables:
+    """Monthly deduction tables of every financial year and age group, in cents."""
+
+    __slots__ = ("band_width", "band_count", "digest", "_tables")
+
+    def __init__(self, band_width, band_count, digest, tables):
+        """
+        Args:
+            band_width (int): Width of a monthly remuneration band in rand.
+            band_count (int): Bands per table.
+            digest (bytes): Digest of the index the tables were built from.
+            tables (dict): array('i') of band_count deductions in cents, keyed by (financial_year, age_group).
+        """
+        self.band_width = band_width
+        self.band_count = band_count
+        self.digest = digest
+        self._tables = tables
+
+    def __len__(self):
+        return len(self._tables)
+
+    def keys(self):
+        return self._tables.keys()
+
+    def band(self, monthly_income):
+        """
+        Returns:
+            int: The band containing a monthly income, or None if it is outside the tables.
+        """
+        if monthly_income < 0:
+            return None
+        band = int(monthly_income // self.band_width)
+        return band if band < self.band_count else None
+
+    def lookup(self, financial_year, age_group, band):
+        """
+        Read the monthly deduction of a band.
+        Args:
+            financial_year (int): The financial year.
+            age_group (str): The rebate age group.
+            band (int): Band returned by band().
+        Returns:
+            int: The deduction in cents, NO_BRACKET if no bracket covers the band, or None
+            if there is no table for the year and age group.
+        """
+        table = self._tables.get((financial_year, age_group))
+        if table is None:
+            return None
+        return table[band]
+
+
+def index_digest(tax_index, band_width, band_count):
+    """
+    Hash the brackets, rebates and band layout deduction tables are built from.
+    Returns:
+        bytes: SHA-256 digest.
+    """
+    digest = hashlib.sha256(f"{band_width}:{band_count}".encode())
+    for period in tax_index.periods:
+        digest.update(repr((period.financial_year, tuple(tuple(bracket) for bracket in period.brackets))).encode())
+    digest.update(repr(sorted(tax_index.rebates.items())).encode())
+    return digest.digest()
+
+
+def band_incomes(band_width, band_count):
+    """
+    Returns:
+        numpy.ndarray: Annualized midpoint income of every band.
+    """
+    import numpy as np
+
+    return (np.arange(band_count, dtype=np.float64) * band_width + band_width / 2) * 12
+
+
+def build_deduction_tables(tax_index, band_width=DEDUCTION_BAND_WIDTH, max_income=DEDUCTION_TABLE_MAX_INCOME):
+    """
+    Materialize the monthly deduction tables of every period and age group.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        band_width (int): Width of a monthly remuneration band in rand.
+        max_income (int): Monthly remuneration covered by the tables.
+    Returns:
+        DeductionTables: The tables.
+    """
+    import numpy as np
+
+    band_count = -(-max_income // band_width)
+    incomes = band_incomes(band_width, band_count)
+    tables = {}
+    for period in tax_index.periods:
+        rebates = tax_index.rebates_for_year(period.financial_year, cumulative=True)
+        if not rebates:
+            continue
+        matched, annual_tax, _ = annual_tax_arrays(tax_index, period, incomes)
+        for age_group, rebate_value in rebates.items():
+            cents = np.rint(np.maximum(annual_tax - rebate_value, 0.0) / 12 * 100)
+            tables[(period.financial_year, age_group)] = array("i", np.where(matched, cents, NO_BRACKET).astype(np.int32).tobytes())
+    return DeductionTables(band_width, band_count, index_digest(tax_index, band_width, band_count), tables)
+
+
+def verify_deduction_tables(deduction_tables, tax_index):
+    """
+    Recompute every band with the scalar formula and compare it with the tables.
+    Args:
+        deduction_tables (DeductionTables): The tables to check.
+        tax_index (TaxIndex): The index they must match.
+    Returns:
+        list: Descriptions of the mismatches found; empty if every band matches.
+    """
+    problems = []
+    incomes = band_incomes(deduction_tables.band_width, deduction_tables.band_count).tolist()
+    for financial_year, age_group in sorted(deduction_tables.keys()):
+        period = tax_index.period_for_year(financial_year)
+        rebate_value = tax_index.find_rebate(financial_year, age_group)
+        if period is None or rebate_value is None:
+            problems.append(f"Deduction table {financial_year} {age_group} has no tax table or rebate")
+            continue
+        for band, income in enumerate(incomes):
+            bracket = tax_index.find_bracket(period, income)
+            expected = NO_BRACKET if bracket is None else round(calculate_annual_tax(bracket, rebate_value, income) / 12 * 100)
+            stored = deduction_tables.lookup(financial_year, age_group, band)
+            if stored != expected:
+                problems.append(f"Deduction table {financial_year} {age_group} band {band}: {stored} cents, "
+                                f"formula gives {expected}")
+    for period in tax_index.periods:
+        for age_group in tax_index.rebates_for_year(period.financial_year):
+            if (period.financial_year, age_group) not in deduction_tables.keys():
+                problems.append(f"No deduction table for {period.financial_year} {age_group}")
+    return problems
+
+
+def write_deduction_tables(deduction_tables, output_path):
+    """
+    Write deduction tables to a file.
+    Returns:
+        int: Size of the file in bytes.
+    """
+    strings = bytearray()
+    directory = bytearray()
+    deductions = bytearray()
+    for (financial_year, age_group), table in sorted(deduction_tables._tables.items()):
+        encoded = age_group.encode("utf-8")
+        directory += TABLE.pack(financial_year, len(strings), len(encoded))
+        strings += encoded
+        deductions += table.tobytes()
+
+    header = HEADER.pack(DEDUCTION_MAGIC, DEDUCTION_FORMAT_VERSION, deduction_tables.band_width,
+                         deduction_tables.band_count, len(deduction_tables), deduction_tables.digest)
+
+    # Write to a temporary file and rename, so readers never see a partial file
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as tables_file:
+        tables_file.write(header + directory + deductions + strings)
+    os.replace(temp_path, output_path)
+    return len(header) + len(directory) + len(deductions) + len(strings)
+
+
+def read_deduction_tables(path):
+    """
+    Read deduction tables from a file.
+    Returns:
+        DeductionTables: The tables, or None if the file is missing, corrupt or of another format version.
+    """
+    try:
+        with open(path, "rb") as tables_file:
+            data = tables_file.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, band_width, band_count, table_count, digest = HEADER.unpack_from(data, 0)
+    if magic != DEDUCTION_MAGIC or version != DEDUCTION_FORMAT_VERSION:
+        return None
+
+    deductions_offset = HEADER.size + table_count * TABLE.size
+    strings_offset = deductions_offset + table_count * band_count * 4
+    if len(data) < strings_offset:
+        return None
+
+    tables = {}
+    entries = TABLE.iter_unpack(data[HEADER.size:deductions_offset])
+    for position, (financial_year, name_offset, name_length) in enumerate(entries):
+        start = strings_offset + name_offset
+        age_group = data[start:start + name_length].decode("utf-8")
+        table_start = deductions_offset + position * band_count * 4
+        tables[(financial_year, age_group)] = array("i", data[table_start:table_start + band_count * 4])
+    return DeductionTables(band_width, band_count, digest, tables)
+
+
+def load_deduction_tables(tax_index, path=DEDUCTION_TABLES_PATH):
+    """
+    Load the deduction tables of an index from the table file while it matches the
+    index, otherwise build them in memory.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        path (str): The table file; empty to always build in memory.
+    Returns:
+        DeductionTables: The tables.
+    """
+    band_count = -(-DEDUCTION_TABLE_MAX_INCOME // DEDUCTION_BAND_WIDTH)
+    if path:
+        deduction_tables = read_deduction_tables(path)
+        if deduction_tables and deduction_tables.digest == index_digest(tax_index, DEDUCTION_BAND_WIDTH, band_count):
+            logging.info(f"Loaded {len(deduction_tables)} deduction tables from {path}")
+            return deduction_tables
+        logging.info(f"Building deduction tables in memory: {path} is missing or does not match the tax tables")
+    return build_deduction_tables(tax_index)
+
+
+def main():
+    """Command line entry point: build or verify the deduction table file."""
+    from app_config import DATABASE_PATHS, REBATE_DB_URI, TAX_DB_URI, TAX_SNAPSHOT_PATH
+    from bulk import load_worker_index
+
+    parser = argparse.ArgumentParser(description="Build or verify the monthly PAYE deduction tables.")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("--output", default=DEDUCTION_TABLES_PATH, help="deduction table file path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    tax_index = load_worker_index(TAX_SNAPSHOT_PATH, TAX_DB_URI, REBATE_DB_URI, DATABASE_PATHS)
+
+    if args.command == "build":
+        deduction_tables = build_deduction_tables(tax_index)
+        problems = verify_deduction_tables(deduction_tables, tax_index)
+        if problems:
+            raise SystemExit("\n".join(problems))
+        size = write_deduction_tables(deduction_tables, args.output)
+        print(f"{len(deduction_tables)} deduction tables of {deduction_tables.band_count} bands "
+              f"written to {args.output} ({size} bytes)")
+    else:
+        deduction_tables = load_deduction_tables(tax_index, args.output)
+        problems = verify_deduction_tables(deduction_tables, tax_index)
+        for problem in problems:
+            print(problem)
+        print(f"Verified {len(deduction_tables)} deduction tables of {deduction_tables.band_count} bands: "
+              f"{len(problems)} mismatches")
+        if problems:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from downstream import DownstreamError
+from wire_format import request_arguments
+
+# Asynchronous delivery settings
+DELIVERY_QUEUE_SIZE = int(os.getenv("DELIVERY_QUEUE_SIZE", "10000"))
+# The Calculation Service takes one object per request, so payloads are posted individually by default
+DELIVERY_BATCH_SIZE = int(os.getenv("DELIVERY_BATCH_SIZE", "1"))
+DELIVERY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "0.5"))
+DELIVERY_ENQUEUE_TIMEOUT = float(os.getenv("DELIVERY_ENQUEUE_TIMEOUT", "0.1"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_RETRY_BACKOFF = float(os.getenv("DELIVERY_RETRY_BACKOFF", "0.5"))
+DELIVERY_DEAD_LETTER_PATH = os.getenv("DELIVERY_DEAD_LETTER_PATH", "dead_letter_deliveries.jsonl")
+
+# Client errors worth retrying: the server timed out waiting for the request, or asks the client to slow down
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+
+
+class QueueFullError(Exception):
+    """Raised when the delivery queue stays full for longer than the enqueue timeout."""
+
+
+class DeliveryQueue:
+    """
+    Bounded in-process queue that forwards payloads to a downstream service in the background.
+
+    A worker thread drains the queue in batches, retries failed batches with
+    exponential backoff and writes batches that still fail to a dead-letter file.
+    Batches the service rejects with a 4xx would fail the same way again, so they
+    are dead-lettered after the first attempt.
+    With the default batch size of 1 each payload is posted on its own, as a single JSON (or
+    MessagePack) object; larger batches are posted as an array, for endpoints that accept one.
+    """
+
+    def __init__(self, client, path, max_size=DELIVERY_QUEUE_SIZE, batch_size=DELIVERY_BATCH_SIZE,
+                 flush_interval=DELIVERY_FLUSH_INTERVAL, enqueue_timeout=DELIVERY_ENQUEUE_TIMEOUT,
+                 max_attempts=DELIVERY_MAX_ATTEMPTS, retry_backoff=DELIVERY_RETRY_BACKOFF,
+                 dead_letter_path=DELIVERY_DEAD_LETTER_PATH, wire_format="json"):
+        """
+        Args:
+            client (DownstreamClient): Client for the downstream service.
+            path (str): Path to post payloads to.
+            max_size (int): Maximum queued payloads before submit applies backpressure.
+            batch_size (int): Maximum payloads per delivery.
+            flush_interval (float): Seconds to wait for a batch to fill.
+            enqueue_timeout (float): Seconds submit waits for space in a full queue.
+            max_attempts (int): Delivery attempts per batch before it is dead-lettered; rejected (4xx) batches get one.
+            retry_backoff (float): Base delay in seconds between attempts.
+            dead_letter_path (str): JSON lines file for payloads that could not be delivered.
+            wire_format (str): Encoding of the posted payloads, "json" or "msgpack".
+        """
+        self.client = client
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.dead_letter_path = dead_letter_path
+        self.wire_format = wire_format
+        self.delivered = 0
+        self.dead_lettered = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stopping = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, payload):
+        """
+        Queue a payload for delivery.
+        Args:
+            payload (dict): The payload to deliver.
+        Returns:
+            str: The delivery id, also added to the delivered payload.
+        Raises:
+            QueueFullError: If the queue is still full after the enqueue timeout.
+        """
+        self._ensure_worker()
+        delivery_id = uuid.uuid4().hex
+        try:
+            self._queue.put({**payload, "delivery_id": delivery_id}, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise QueueFullError("Delivery queue is full")
+        return delivery_id
+
+    def pending(self):
+        """Return the number of payloads waiting for delivery."""
+        return self._queue.qsize()
+
+    def stop(self, timeout=10):
+        """
+        Stop the worker after it has flushed the queued payloads.
+        Args:
+            timeout (float): Seconds to wait for the worker to finish.
+        """
+        self._stopping.set()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def _ensure_worker(self):
+        """Start the worker thread, also in a forked child where the parent's thread does not exist."""
+        if self._worker and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive() and self._worker_pid == os.getpid():
+                return
+            self._worker = threading.Thread(target=self._run, name="delivery-queue", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        """Worker loop: drain the queue in batches until stopped and empty."""
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                # Keep the worker running for the rest of the queue; the batch goes to the dead-letter file
+                logging.exception("Unexpected error delivering %s payloads to %s", len(batch), self.client.name)
+                self._dead_letter(batch, f"{type(e).__name__}: {e}")
+
+    def _take_batch(self):
+        """
+        Wait for the first payload, then take whatever else is queued up to the batch size.
+        Returns:
+            list: The payloads of the batch, possibly empty.
+        """
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, batch):
+        """
+        Deliver a batch, retrying with backoff and dead-lettering it on final failure.
+        Args:
+            batch (list): The payloads to deliver.
+        """
+        body = batch[0] if self.batch_size == 1 else batch
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.client.post(self.path, **request_arguments(body, self.wire_format))
+                if response.status_code == 200:
+                    self.delivered += len(batch)
+                    logging.debug("Delivered %s payloads to %s", len(batch), self.client.name)
+                    return
+                error = f"HTTP {response.status_code}"
+                if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_CLIENT_ERRORS:
+                    logging.warning("Delivery to %s rejected: %s", self.client.name, error)
+                    break
+            except DownstreamError as e:
+                error = str(e)
+
+            logging.warning("Delivery to %s failed (attempt %s): %s", self.client.name, attempt + 1, error)
+            if attempt + 1 < self.max_attempts:
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+        self._dead_letter(batch, error)
+
+    def _dead_letter(self, batch, error):
+        """
+        Append undeliverable payloads to the dead-letter file.
+        Args:
+            batch (list): The payloads that could not be delivered.
+            error (str): The last delivery error.
+        """
+        failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letter_file:
+                for payload in batch:
+                    dead_letter_file.write(json.dumps({"failed_at": failed_at, "error": error, "payload": payload},
+                                                      default=str) + "\n")
+        except OSError as e:
+            logging.error("Failed to write dead-letter file %s: %s", self.dead_letter_path, e)
+        self.dead_lettered += len(batch)
+        logging.error("Dead-lettered %s payloads for %s: %s", len(batch), self.client.name, error)
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+# requests (and aiohttp for the async client) is imported when the first session is
+# created, keeping it off the startup path
+
+# Downstream client settings, shared by every downstream service
+DOWNSTREAM_CONNECT_TIMEOUT = float(os.getenv("DOWNSTREAM_CONNECT_TIMEOUT", "3.05"))
+DOWNSTREAM_READ_TIMEOUT = float(os.getenv("DOWNSTREAM_READ_TIMEOUT", "10"))
+DOWNSTREAM_RETRIES = int(os.getenv("DOWNSTREAM_RETRIES", "2"))
+DOWNSTREAM_BACKOFF_FACTOR = float(os.getenv("DOWNSTREAM_BACKOFF_FACTOR", "0.3"))
+DOWNSTREAM_POOL_SIZE = int(os.getenv("DOWNSTREAM_POOL_SIZE", "10"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+# Connections the async client may open to one service (0 for no limit)
+DOWNSTREAM_ASYNC_CONNECTIONS = int(os.getenv("DOWNSTREAM_ASYNC_CONNECTIONS", "1000"))
+
+# Methods retried after a failed read or a 502/503/504 response
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+
+class DownstreamError(Exception):
+    """Raised when a downstream service cannot be reached or the request fails in transport."""
+
+
+class CircuitOpenError(DownstreamError):
+    """Raised instead of calling a downstream service whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a downstream service.
+
+    After failure_threshold consecutive failures the circuit opens and calls fail
+    fast. Once reset_timeout has passed a single trial call is let through; its
+    outcome closes the circuit again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Check whether a call may go through.
+        Returns:
+            bool: False if the circuit is open and the call should fail fast.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release_trial(self):
+        """
+        Give up the half-open trial slot of a call that ended without an outcome, e.g.
+        because it was cancelled, so the next call can be the trial instead.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # opened_at is already more than reset_timeout ago
+                self.state = self.OPEN
+
+    def record_failure(self):
+        """Count a failed call and open the circuit when the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class DownstreamClient:
+    """
+    HTTP client for a downstream service.
+
+    Requests share a pooled keep-alive session, always carry connect and read
+    timeouts, retry idempotent calls with backoff and go through a circuit breaker.
+    """
+
+    def __init__(self, name, base_url, connect_timeout=DOWNSTREAM_CONNECT_TIMEOUT,
+                 read_timeout=DOWNSTREAM_READ_TIMEOUT, retries=DOWNSTREAM_RETRIES,
+                 backoff_factor=DOWNSTREAM_BACKOFF_FACTOR, pool_size=DOWNSTREAM_POOL_SIZE,
+                 circuit_breaker=None):
+        """
+        Args:
+            name (str): Service name used in logs and errors.
+            base_url (str): Base URL of the service.
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait for a response.
+            retries (int): Retries for idempotent calls and failed connections.
+            backoff_factor (float): Backoff factor between retries.
+            pool_size (int): Maximum pooled keep-alive connections.
+            circuit_breaker (CircuitBreaker): Breaker to use; a new one by default.
+        """
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # Failed calls by kind: circuit_open, timeout, connection, http_5xx or other
+        self.errors = {}
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The pooled keep-alive session, created on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        """
+        Create a session whose connection pool retries idempotent calls.
+        Returns:
+            requests.Session: The session.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Retry only idempotent methods on read errors and 5xx responses.
+        # Connection errors are retried for every method as nothing was sent.
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request to the downstream service.
+        Args:
+            method (str): HTTP method.
+            path (str): Path relative to the base URL.
+            **kwargs: Extra arguments for requests.Session.request.
+        Returns:
+            requests.Response: The response.
+        Raises:
+            CircuitOpenError: If the circuit is open.
+            DownstreamError: If the request failed.
+        """
+        import requests
+
+        if not self.circuit_breaker.allow_request():
+            self._count_error("circuit_open")
+            raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException as e:
+            if isinstance(e, requests.Timeout):
+                self._count_error("timeout")
+            elif isinstance(e, requests.ConnectionError):
+                self._count_error("connection")
+            else:
+                self._count_error("other")
+            self._record_failure()
+            raise DownstreamError(str(e)) from e
+
+        if response.status_code >= 500:
+            self._count_error("http_5xx")
+            self._record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
+
+    def _count_error(self, kind):
+        """Count a failed call by kind."""
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def _record_failure(self):
+        """Record a failed call on the circuit breaker and log when it opens."""
+        was_open = self.circuit_breaker.state == CircuitBreaker.OPEN
+        self.circuit_breaker.record_failure()
+        if not was_open and self.circuit_breaker.state == CircuitBreaker.OPEN:
+            logging.warning(f"{self.name} circuit opened after {self.circuit_breaker.failures} failures")
+
+    def check_health(self, path="/health"):
+        """
+        Call the service's health endpoint, which also opens a pooled connection to it.
+        Args:
+            path (str): Health check path.
+        Returns:
+            str: "healthy", or a short description of why the service is not.
+        """
+        try:
+            response = self.get(path)
+        except DownstreamError as e:
+            return f"unreachable: {e}"
+        if response.status_code != 200:
+            return f"unhealthy: HTTP {response.status_code}"
+        return "healthy"
+
+    def get(self, path, **kwargs):
+        """Send a GET request to the downstream service."""
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        """Send a POST request to the downstream service."""
+        return self.request("POST", path, **kwargs)
+
+
+class DownstreamResponse:
+    """Status code, headers and body of a completed async downstream call."""
+
+    __slots__ = ("status_code", "content", "headers")
+
+    def __init__(self, status_code, content, headers=None):
+        """
+        Args:
+            status_code (int): HTTP status code.
+            content (bytes): The raw body.
+            headers (Mapping): Response headers, looked up case-insensitively.
+        """
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+
+    @property
+    def text(self):
+        """The body decoded as UTF-8."""
+        return self.content.decode("utf-8")
+
+    def json(self):
+        """Decode the body as JSON."""
+        return json.loads(self.content)
+
+
+class AsyncDownstreamClient(DownstreamClient):
+    """
+    asyncio variant of DownstreamClient for the async service (async_app.py).
+
+    Calls are awaited on the event loop instead of holding a thread, over one pooled
+    aiohttp session per service. Timeouts, retries, the circuit breaker and error
+    counts work as in the threaded client.
+    """
+
+    def __init__(self, name, base_url, connections=DOWNSTREAM_ASYNC_CONNECTIONS, **kwargs):
+        """
+        Args:
+            name (str): Service name used in logs and errors.
+            base_url (str): Base URL of the service.
+            connections (int): Maximum open connections to the service, 0 for no limit.
+            **kwargs: Timeouts, retries, backoff and circuit breaker as for DownstreamClient.
+        """
+        super().__init__(name, base_url, **kwargs)
+        self.connections = connections
+
+    @property
+    def session(self):
+        """The pooled keep-alive session, created on first use inside the running event loop."""
+        if self._session is None:
+            self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        """
+        Returns:
+            aiohttp.ClientSession: The session.
+        """
+        import aiohttp
+
+        connect_timeout, read_timeout = self.timeout
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections, limit_per_host=0),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    async def close(self):
+        """Close the session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, path, **kwargs):
+        """
+        Send a request to the downstream service.
+        Args:
+            method (str): HTTP method.
+            path (str): Path relative to the base URL.
+            **kwargs: Extra arguments for aiohttp.ClientSession.request, e.g. json.
+        Returns:
+            DownstreamResponse: The response.
+        Raises:
+            CircuitOpenError: If the circuit is open.
+            DownstreamError: If the request failed.
+        """
+        if not self.circuit_breaker.allow_request():
+            self._count_error("circuit_open")
+            raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+
+        try:
+            return await self._send(method, path, **kwargs)
+        except BaseException:
+            # Cancellation skips both record_success and record_failure; without this a
+            # cancelled trial call would keep the circuit half-open for good
+            self.circuit_breaker.release_trial()
+            raise
+
+    async def _send(self, method, path, **kwargs):
+        """
+        Send a request, retrying as configured, and record its outcome on the circuit breaker.
+        Returns:
+            DownstreamResponse: The response.
+        Raises:
+            DownstreamError: If the request failed.
+        """
+        import aiohttp
+
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                    result = DownstreamResponse(response.status, await response.read(), response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Connection errors are retried for every method as nothing was sent
+                if attempt < self.retries and (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                    attempt += 1
+                    await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+                    continue
+                if isinstance(e, asyncio.TimeoutError):
+                    self._count_error("timeout")
+                elif isinstance(e, aiohttp.ClientConnectionError):
+                    self._count_error("connection")
+                else:
+                    self._count_error("other")
+                self._record_failure()
+                raise DownstreamError(str(e) or type(e).__name__) from e
+
+            if idempotent and result.status_code in (502, 503, 504) and attempt < self.retries:
+                attempt += 1
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+                continue
+            break
+
+        if result.status_code >= 500:
+            self._count_error("http_5xx")
+            self._record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return result
+
+    async def check_health(self, path="/health"):
+        """
+        Call the service's health endpoint, which also opens a pooled connection to it.
+        Returns:
+            str: "healthy", or a short description of why the service is not.
+        """
+        try:
+            response = await self.get(path)
+        except DownstreamError as e:
+            return f"unreachable: {e}"
+        if response.status_code != 200:
+            return f"unhealthy: HTTP {response.status_code}"
+        return "healthy"
+
+    async def get(self, path, **kwargs):
+        """Send a GET request to the downstream service."""
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        """Send a POST request to the downstream service."""
+        return await self.request("POST", path, **kwargs)
@@ -0,0 +1,131 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+
+
+def file_fingerprint(paths):
+    """
+    Fingerprint database files by size and modification time, including any SQLite WAL file.
+    Args:
+        paths (list): Database file paths.
+    Returns:
+        tuple: A value that changes whenever one of the files is written.
+    """
+    fingerprint = []
+    for path in paths:
+        for file_path in (path, f"{path}-wal"):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                fingerprint.append((file_path, None))
+            else:
+                fingerprint.append((file_path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def fingerprint_version(fingerprint):
+    """
+    Args:
+        fingerprint (tuple): Returned by file_fingerprint.
+    Returns:
+        str: Short hash identifying the data version of the fingerprinted files.
+    """
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:12]
+
+
+class TaxIndexHolder:
+    """
+    Holds the active TaxIndex and rebuilds it when the databases change.
+
+    A background thread polls the database files and, when they change, builds a
+    complete new index before swapping it in with a single assignment. Requests
+    read holder.current once and keep using that snapshot, so they never see a
+    half-built index.
+    """
+
+    def __init__(self, loader, watched_paths, poll_interval=30, on_reload=None):
+        """
+        Args:
+            loader (callable): Builds a new TaxIndex from the databases.
+            watched_paths (list): Database files to watch for changes.
+            poll_interval (float): Seconds between checks; 0 disables polling.
+            on_reload (callable): Called with each index swapped in by a reload, e.g. to verify it again.
+        """
+        self.loader = loader
+        self.watched_paths = [path for path in watched_paths if path]
+        self.poll_interval = poll_interval
+        self.on_reload = on_reload
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._poller = None
+        self._poller_pid = None
+        self._fingerprint = file_fingerprint(self.watched_paths)
+        self.current = loader()
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+
+    @property
+    def data_version(self):
+        """Short hash of the database files the active index was loaded from."""
+        return fingerprint_version(self._fingerprint)
+
+    def reload(self, force=True):
+        """
+        Rebuild the index and swap it in.
+        Args:
+            force (bool): Reload even if the database files have not changed.
+        Returns:
+            bool: True if a new index was swapped in.
+        """
+        with self._reload_lock:
+            fingerprint = file_fingerprint(self.watched_paths)
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            index = self.loader()
+            self.current = index
+            self._fingerprint = fingerprint
+            self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+            self.reloads += 1
+            logging.info(f"Reloaded tax and rebate tables (data version {self.data_version})")
+            if self.on_reload is not None:
+                self.on_reload(index)
+            return True
+
+    def status(self):
+        """
+        Returns:
+            dict: The active data version, load time, reload count and index size.
+        """
+        return {
+            "data_version": self.data_version,
+            "loaded_at": self.loaded_at.isoformat(),
+            "reloads": self.reloads,
+            "tax_periods": len(self.current.periods),
+            "rebate_rows": len(self.current.rebates)
+        }
+
+    def ensure_polling(self):
+        """Start the polling thread in this process, e.g. after a pre-fork worker has started."""
+        if not self.poll_interval or not self.watched_paths:
+            return
+        if self._poller_pid == os.getpid() and self._poller.is_alive():
+            return
+        with self._reload_lock:
+            if self._poller_pid == os.getpid() and self._poller.is_alive():
+                return
+            self._poller = threading.Thread(target=self._poll, name="tax-index-reloader", daemon=True)
+            self._poller_pid = os.getpid()
+            self._poller.start()
+
+    def _poll(self):
+        """Polling loop: reload whenever the database files change."""
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload(force=False)
+            except Exception as e:
+                # Keep serving the previous index, e.g. while a database is half written
+                logging.error(f"Error reloading tax and rebate tables: {e}")
@@ -0,0 +1,207 @@
+"""
+Minimal Prometheus metrics: counters, histograms and scrape-time gauges rendered
+in the Prometheus text exposition format (version 0.0.4).
+
+Updates take a lock and touch a dictionary and a list, so they are cheap enough
+to leave on for every request. Metrics are kept per process.
+"""
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from in-memory lookups up to slow downstream calls
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    """Format label names and values as {name="value",...}, or an empty string without labels."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    """Format a sample value; whole numbers are written without a decimal point."""
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        """
+        Increase the count for a label set.
+        Args:
+            *labelvalues: One value per label name, in order.
+            amount (float): Amount to add.
+        """
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        """
+        Returns:
+            list: Exposition lines for this counter.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class StageTimer:
+    """Context manager that observes the time spent in its block on a histogram."""
+
+    __slots__ = ("histogram", "labelvalues", "started")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class Histogram:
+    """Bucketed observations, with their count and sum, per label set."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """
+        Record an observation.
+        Args:
+            value (float): The observed value, e.g. seconds.
+            *labelvalues: One value per label name, in order.
+        """
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # Per-bucket counts (plus +Inf), then the sum of observations
+                state = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[position] += 1
+            state[-1] += value
+
+    def time(self, *labelvalues):
+        """
+        Time a block of code.
+        Returns:
+            StageTimer: Context manager observing the block's duration in seconds.
+        """
+        return StageTimer(self, labelvalues)
+
+    def render(self):
+        """
+        Returns:
+            list: Exposition lines for this histogram, with cumulative buckets.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labelvalues, list(state)) for labelvalues, state in self._values.items())
+        for labelvalues, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, labelvalues, extra=(("le", le),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {repr(state[-1])}")
+        return lines
+
+
+class CallbackMetric:
+    """A gauge or counter read from the application when the metrics are scraped."""
+
+    def __init__(self, name, documentation, labelnames, collect, metric_type="gauge"):
+        """
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text.
+            labelnames (tuple): Label names.
+            collect (callable): Returns a dictionary of label value tuples to values.
+            metric_type (str): "gauge", or "counter" for counts the application keeps itself.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.metric_type = metric_type
+
+    def render(self):
+        """
+        Returns:
+            list: Exposition lines for this metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labelvalues, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of a process, rendered together for /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a Counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create and register a Histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames, collect):
+        """Create and register a gauge read by collect at scrape time."""
+        return self._register(CallbackMetric(name, documentation, labelnames, collect))
+
+    def collected_counter(self, name, documentation, labelnames, collect):
+        """Create and register a counter read by collect at scrape time."""
+        return self._register(CallbackMetric(name, documentation, labelnames, collect, metric_type="counter"))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns:
+            str: Every registered metric in the Prometheus text format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,242 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it sends the X-Profile header with the admin token (with
+PROFILING_ENABLED=true and ADMIN_TOKEN configured) or is picked by PROFILE_SAMPLE_RATE. A profiled request gets a Server-Timing header
+with the duration of each hooked stage and, depending on the mode, a capture file
+in PROFILE_OUTPUT_DIR, which keeps the newest PROFILE_MAX_FILES captures:
+    timing      Server-Timing header only
+    cprofile    cProfile stats, readable with pstats or snakeviz
+    collapsed   sampled stacks in the collapsed format used by flamegraph.pl and speedscope
+
+With profiling disabled and no sample rate the decorators return the functions
+unchanged, so there is no overhead at all.
+"""
+import contextvars
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from app_config import ADMIN_TOKEN
+
+# Profiling settings
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_MODE = os.getenv("PROFILE_SAMPLE_MODE", "timing")
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.001"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_MODES = ("timing", "cprofile", "collapsed")
+CAPTURE_EXTENSIONS = (".pstats", ".collapsed")
+
+# The hooks are only installed when profiling can be switched on
+PROFILING_HOOKS = PROFILING_ENABLED or PROFILE_SAMPLE_RATE > 0
+
+# Profile of the request being handled by the current thread, if any
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+# cProfile can only profile one request at a time
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval and counts collapsed stacks."""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        """
+        Args:
+            thread_id (int): Identifier of the thread to sample.
+            interval (float): Seconds between samples.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        """Sampling loop."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def write(self, path):
+        """Write the counted stacks, one "frame;frame;frame count" line each."""
+        with open(path, "w", encoding="utf-8") as collapsed_file:
+            for stack, count in sorted(self.counts.items()):
+                collapsed_file.write(f"{stack} {count}\n")
+
+
+class RequestProfile:
+    """Stage durations and the optional capture of one profiled request."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.stages = []
+        self.capture_path = None
+
+    def server_timing(self):
+        """
+        Returns:
+            str: Server-Timing header value with durations in milliseconds.
+        """
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages)
+
+
+def requested_mode(headers):
+    """
+    Decide whether and how to profile a request.
+    Args:
+        headers: The request headers.
+    Returns:
+        str: The profiling mode, or None to leave the request alone.
+    """
+    mode = headers.get(PROFILE_HEADER) if PROFILING_ENABLED else None
+    if mode is not None:
+        # Only operators may trigger profiling, so the header is ignored unless an admin token is configured
+        if not ADMIN_TOKEN or not hmac.compare_digest(headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode()):
+            return None
+        return mode if mode in PROFILE_MODES else "timing"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_SAMPLE_MODE
+    return None
+
+
+def prune_captures(keep):
+    """
+    Delete the oldest capture files in the profile output directory.
+    Args:
+        keep (int): Number of the newest captures to keep.
+    """
+    captures = []
+    for entry in os.scandir(PROFILE_OUTPUT_DIR):
+        if entry.name.endswith(CAPTURE_EXTENSIONS) and entry.is_file():
+            try:
+                captures.append((entry.stat().st_mtime_ns, entry.name, entry.path))
+            except FileNotFoundError:
+                pass
+    captures.sort()
+    for _, _, path in captures[:max(len(captures) - keep, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by another worker pruning at the same time
+            pass
+
+
+def capture_path(extension):
+    """Return a new file path in the profile output directory, making room for it first."""
+    os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+    prune_captures(max(PROFILE_MAX_FILES - 1, 0))
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.{extension}"
+    return os.path.join(PROFILE_OUTPUT_DIR, name)
+
+
+def timed_stage(name):
+    """
+    Decorator recording a function's duration as a stage of the profiled request.
+    Args:
+        name (str): Stage name in the Server-Timing header.
+    """
+    def decorator(function):
+        if not PROFILING_HOOKS:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.stages.append((name, time.perf_counter() - started))
+        return wrapper
+    return decorator
+
+
+def profiled_view(view):
+    """
+    Decorator for a Flask view: profiles the requests selected by requested_mode and
+    adds the Server-Timing header (and X-Profile-File for captures) to their responses.
+    """
+    if not PROFILING_HOOKS:
+        return view
+
+    from flask import make_response, request
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = requested_mode(request.headers)
+        if mode is None:
+            return view(*args, **kwargs)
+
+        profile = RequestProfile(mode)
+        token = _active_profile.set(profile)
+        profiler = sampler = None
+        if mode == "cprofile":
+            if _cprofile_lock.acquire(blocking=False):
+                profiler = cProfile.Profile()
+            else:
+                logging.info("cProfile busy with another request, recording timings only")
+        elif mode == "collapsed":
+            sampler = StackSampler(threading.get_ident())
+
+        started = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            if sampler:
+                sampler.start()
+            response = make_response(view(*args, **kwargs))
+        finally:
+            if profiler:
+                profiler.disable()
+                _cprofile_lock.release()
+            if sampler:
+                sampler.stop()
+            profile.stages.append(("total", time.perf_counter() - started))
+            _active_profile.reset(token)
+
+        try:
+            if profiler:
+                path = capture_path("pstats")
+                profiler.dump_stats(path)
+                profile.capture_path = path
+            elif sampler:
+                path = capture_path("collapsed")
+                sampler.write(path)
+                profile.capture_path = path
+        except OSError as e:
+            logging.error(f"Failed to write profile: {e}")
+
+        response.headers["Server-Timing"] = profile.server_timing()
+        if profile.capture_path:
+            response.headers["X-Profile-File"] = os.path.basename(profile.capture_path)
+            logging.info(f"Profiled {request.path} ({mode}): {profile.capture_path}")
+        return response
+    return wrapper
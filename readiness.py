@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+import time
+
+
+class Readiness:
+    """
+    Tracks startup timings and the warm-up that /ready waits for.
+
+    The warm-up runs once per process in a background thread, so a pre-fork
+    worker warms its own connection pools after it has been forked.
+    """
+
+    def __init__(self, process_started, require_healthy_downstream=False):
+        """
+        Args:
+            process_started (float): time.perf_counter() when the app module started importing.
+            require_healthy_downstream (bool): Only report ready once every downstream service is healthy.
+        """
+        self.process_started = process_started
+        self.require_healthy_downstream = require_healthy_downstream
+        self.timings = {}
+        self.table_problems = None
+        self.downstream = {}
+        self.ready_after = None
+        self._warm_up_pid = None
+        self._lock = threading.Lock()
+
+    def record(self, name, started):
+        """
+        Record how long a startup step took.
+        Args:
+            name (str): Name of the step.
+            started (float): time.perf_counter() when the step started.
+        """
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def is_ready(self):
+        """
+        Returns:
+            bool: True once the tables are verified and downstream health is known (and good, if required).
+        """
+        if self.ready_after is None or self.table_problems:
+            return False
+        if self.require_healthy_downstream:
+            return all(status == "healthy" for status in self.downstream.values())
+        return True
+
+    def report(self):
+        """
+        Returns:
+            dict: Readiness, the warm-up results and startup timings in milliseconds.
+        """
+        return {
+            "status": "ready" if self.is_ready() else "not_ready",
+            "tables": "verified" if self.table_problems == [] else (self.table_problems or "pending"),
+            "downstream": self.downstream or "pending",
+            "timings_ms": {**self.timings, "ready": self.ready_after}
+        }
+
+    def ensure_warm_up(self, warm_up):
+        """
+        Start the warm-up in this process unless it already ran or is running.
+        Args:
+            warm_up (callable): Runs the warm-up steps; receives this Readiness.
+        """
+        if self._warm_up_pid == os.getpid():
+            return
+        with self._lock:
+            if self._warm_up_pid == os.getpid():
+                return
+            self._warm_up_pid = os.getpid()
+            threading.Thread(target=self._run_warm_up, args=(warm_up,), name="warm-up", daemon=True).start()
+
+    def _run_warm_up(self, warm_up):
+        """Run the warm-up and log the time-to-ready report."""
+        started = time.perf_counter()
+        try:
+            warm_up(self)
+        except Exception as e:
+            logging.error(f"Warm-up failed: {e}")
+            self.table_problems = self.table_problems or [f"Warm-up failed: {e}"]
+        self.record("warm_up", started)
+        self.ready_after = round((time.perf_counter() - self.process_started) * 1000, 1)
+        logging.info(f"Startup report (pid {os.getpid()}): {self.report()}")
@@ -0,0 +1,315 @@
+"""
+Request logging: sampled one-line request summaries and an optional JSON log mode.
+
+LOG_FORMAT=text keeps the plain logging.basicConfig output. LOG_FORMAT=json writes
+one JSON object per line from a background thread: request threads only put the
+unformatted record on a bounded queue, and the writer thread does the message
+formatting, JSON encoding and I/O. Records that arrive while the queue is full are
+dropped and counted rather than blocking the request.
+
+Every sampled request logs one summary line with its method, path, status, duration,
+outcome and the duration of each timed stage. The sample rate is LOG_SAMPLE_RATE,
+overridden per Flask endpoint (or aiohttp handler) name by LOG_ROUTE_SAMPLE_RATES:
+    LOG_ROUTE_SAMPLE_RATES="get_tax_details=0.01,calculate_tax=0.01,health=0"
+
+Messages logged on the request path use %-style arguments, so nothing is formatted
+for records below LOG_LEVEL.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+# Logging settings
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "65536"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_ROUTE_SAMPLE_RATES = os.getenv("LOG_ROUTE_SAMPLE_RATES", "health=0,ready=0,metrics_endpoint=0")
+
+LOG_FORMATS = ("text", "json")
+
+# Summary of the request being handled by the current thread or task, if it is sampled
+_active_summary = contextvars.ContextVar("active_summary", default=None)
+
+request_logger = logging.getLogger("request")
+
+
+def parse_sample_rates(value):
+    """
+    Parse per-route sample rates.
+    Args:
+        value (str): Comma-separated endpoint=rate pairs, e.g. "get_tax_details=0.01,health=0".
+    Returns:
+        dict: Sample rate by endpoint name.
+    Raises:
+        ValueError: If a pair is malformed or a rate is outside 0-1.
+    """
+    rates = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, separator, rate = pair.partition("=")
+        if not separator or not endpoint.strip():
+            raise ValueError(f"Invalid LOG_ROUTE_SAMPLE_RATES entry: {pair}")
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate must be between 0 and 1: {pair}")
+        rates[endpoint.strip()] = rate
+    return rates
+
+
+ROUTE_SAMPLE_RATES = parse_sample_rates(LOG_ROUTE_SAMPLE_RATES)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, including the fields passed with extra={"fields": ...}."""
+
+    def __init__(self):
+        super().__init__()
+        self._encoder = json.JSONEncoder(default=str)
+        self._second = None
+        self._second_text = ""
+
+    def timestamp(self, created):
+        """
+        Returns:
+            str: UTC ISO 8601 time with milliseconds; the seconds part is formatted once per second.
+        """
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._second_text}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record):
+        entry = {
+            "time": self.timestamp(record.created),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return self._encoder.encode(entry)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the writer thread and drops records,
+    counting them, when the queue is full.
+    """
+
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens in the writer thread; arguments are logged by reference
+        return record
+
+    def enqueue(self, record):
+        # A SimpleQueue put is much cheaper than a Queue one; the size bound is approximate
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+class LineWriter(logging.StreamHandler):
+    """Stream handler that leaves flushing to the listener, so a burst of records is written at once."""
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class WriterListener(logging.handlers.QueueListener):
+    """Queue listener that flushes its handlers whenever it has caught up with the queue."""
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+
+class QueuedLogging:
+    """Root queue handler and the background listener writing its records."""
+
+    def __init__(self, handler, queue_size=LOG_QUEUE_SIZE):
+        """
+        Args:
+            handler (logging.Handler): Writes the records, on the listener thread.
+            queue_size (int): Records buffered before new ones are dropped.
+        """
+        self.handler = handler
+        self.queue_size = queue_size
+        self.queue_handler = DroppingQueueHandler(queue.SimpleQueue(), queue_size)
+        self.listener = None
+
+    def start(self):
+        """Start the writer thread."""
+        self.listener = WriterListener(self.queue_handler.queue, self.handler)
+        self.listener.start()
+
+    def restart_after_fork(self):
+        """Threads do not survive a fork: give a forked worker its own queue and writer thread."""
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+    def stop(self):
+        """Write the queued records and stop the writer thread."""
+        if self.listener and self.listener._thread:
+            self.listener.stop()
+        self.handler.flush()
+
+    @property
+    def dropped(self):
+        return self.queue_handler.dropped
+
+
+# Queue and writer thread of the JSON log mode, once configured
+queued_logging = None
+
+
+def configure_logging():
+    """
+    Configure the root logger for LOG_FORMAT and LOG_LEVEL.
+    Returns:
+        QueuedLogging: The queue and writer thread in JSON mode, None in text mode.
+    """
+    global queued_logging
+    if LOG_FORMAT not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT must be one of: {', '.join(LOG_FORMATS)}")
+    if LOG_FORMAT == "text":
+        logging.basicConfig(level=LOG_LEVEL)
+        return None
+    if queued_logging:
+        return queued_logging
+
+    # Block-buffered, unlike sys.stderr, which writes every line
+    stream = open(sys.stderr.fileno(), "w", buffering=LOG_BUFFER_SIZE, encoding="utf-8", closefd=False)
+    line_writer = LineWriter(stream)
+    line_writer.setFormatter(JsonFormatter())
+    queued_logging = QueuedLogging(line_writer)
+    root = logging.getLogger()
+    root.handlers[:] = [queued_logging.queue_handler]
+    root.setLevel(LOG_LEVEL)
+    queued_logging.start()
+    atexit.register(queued_logging.stop)
+    if hasattr(os, "register_at_fork"):
+        # Flush first, or a forked worker would write the parent's buffered lines again
+        os.register_at_fork(before=line_writer.flush, after_in_child=queued_logging.restart_after_fork)
+    return queued_logging
+
+
+def dropped_records():
+    """
+    Returns:
+        int: Log records dropped because the queue was full.
+    """
+    return queued_logging.dropped if queued_logging else 0
+
+
+class RequestSummary:
+    """Timings and fields of one sampled request."""
+
+    __slots__ = ("started", "stages", "fields")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+
+
+def start_request(endpoint):
+    """
+    Decide whether to log a request and start its summary.
+    Args:
+        endpoint (str): Endpoint name, used to look up its sample rate.
+    Returns:
+        RequestSummary: The summary, or None if the request is not sampled.
+    """
+    rate = ROUTE_SAMPLE_RATES.get(endpoint, LOG_SAMPLE_RATE)
+    summary = None
+    if (rate >= 1 or (rate > 0 and random.random() < rate)) and request_logger.isEnabledFor(logging.INFO):
+        summary = RequestSummary()
+    _active_summary.set(summary)
+    return summary
+
+
+def annotate(**fields):
+    """Add fields, e.g. the outcome, to the summary of the current request if it is sampled."""
+    summary = _active_summary.get()
+    if summary is not None:
+        summary.fields.update(fields)
+
+
+def finish_request(summary, method, path, status):
+    """
+    Log the summary line of a sampled request.
+    Args:
+        summary (RequestSummary): Returned by start_request, or None.
+        method (str): HTTP method.
+        path (str): Request path.
+        status (int): Response status code.
+    """
+    _active_summary.set(None)
+    if summary is None or not request_logger.isEnabledFor(logging.INFO):
+        return
+    duration_ms = (time.perf_counter() - summary.started) * 1000
+    fields = {"method": method, "path": path, "status": status, "duration_ms": round(duration_ms, 3),
+              "stages_ms": summary.stages, **summary.fields}
+    # Built directly rather than through info(), which would walk the stack for the caller
+    record = request_logger.makeRecord(request_logger.name, logging.INFO, __file__, 0, "%s %s %s %.1f ms",
+                                       (method, path, status, duration_ms), None, extra={"fields": fields})
+    request_logger.handle(record)
+
+
+class StageRecorder:
+    """
+    Context manager timing a stage once, for the latency histogram and for the
+    summary of the current request.
+    """
+
+    __slots__ = ("histogram", "name", "started")
+
+    def __init__(self, histogram, name):
+        self.histogram = histogram
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.started
+        if self.histogram is not None:
+            self.histogram.observe(elapsed, self.name)
+        summary = _active_summary.get()
+        if summary is not None:
+            summary.stages[self.name] = round(elapsed * 1000, 3)
+
+
+def stage_timer(histogram=None):
+    """
+    Args:
+        histogram (Histogram): Optional stage latency histogram labelled by stage name.
+    Returns:
+        callable: Context manager factory timing a stage by name.
+    """
+    return lambda name: StageRecorder(histogram, name)
@@ -0,0 +1,248 @@
+"""
+Production entry point for the Tax Table Service.
+
+Modes (SERVER_MODE):
+    threaded: a single waitress process with WEB_THREADS worker threads.
+    prefork:  the app and its tax and rebate tables are loaded once in the parent,
+              which then forks WEB_WORKERS waitress processes sharing the listening
+              socket and the loaded tables copy-on-write. Workers that keep failing
+              soon after starting are restarted with backoff, and after
+              WORKER_MAX_RESTARTS such failures in a row the server exits.
+    async:    a single asyncio event loop serving the request path (async_app.py),
+              with non-blocking downstream calls.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from waitress import create_server
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "5001"))
+SERVER_MODE = os.getenv("SERVER_MODE", "threaded")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+# A pre-fork worker that exits within WORKER_MIN_UPTIME seconds of starting has failed to start.
+# Each such failure in a row doubles the restart delay, and the server exits after WORKER_MAX_RESTARTS of them.
+WORKER_MIN_UPTIME = float(os.getenv("WORKER_MIN_UPTIME", "10"))
+WORKER_RESTART_BACKOFF = float(os.getenv("WORKER_RESTART_BACKOFF", "0.5"))
+WORKER_MAX_RESTART_DELAY = float(os.getenv("WORKER_MAX_RESTART_DELAY", "30"))
+WORKER_MAX_RESTARTS = int(os.getenv("WORKER_MAX_RESTARTS", "5"))
+
+
+def _raise_system_exit(signum, frame):
+    """Signal handler that lets waitress drain its in-flight requests and return."""
+    raise SystemExit(0)
+
+
+def serve_threaded(app, on_start):
+    """
+    Serve the app from this process with a pool of worker threads.
+    Args:
+        app: The WSGI application.
+        on_start (callable): Starts the app's background tasks once the server is listening.
+    """
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    server = create_server(app, host=HOST, port=PORT, threads=WEB_THREADS)
+    logging.info(f"Serving on http://{HOST}:{PORT} with {WEB_THREADS} threads")
+    on_start()
+    server.run()
+
+
+def _run_worker(app, on_start, on_stop, listen_socket):
+    """
+    Serve the app from a forked worker process and exit it.
+    Args:
+        app: The WSGI application.
+        on_start (callable): Starts the app's background tasks in the worker.
+        on_stop (callable): Flushes the app's background work before the worker exits.
+        listen_socket (socket.socket): The listening socket shared with the parent.
+    """
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    exit_code = 0
+    try:
+        server = create_server(app, sockets=[listen_socket], threads=WEB_THREADS)
+        on_start()
+        server.run()
+    except Exception as e:
+        logging.error(f"Worker {os.getpid()} failed: {e}")
+        exit_code = 1
+    finally:
+        # Clean up explicitly: os._exit skips the exit handlers, so the worker never unwinds into the parent's code
+        try:
+            on_stop()
+        except Exception as e:
+            logging.error(f"Worker {os.getpid()} failed to stop cleanly: {e}")
+            exit_code = 1
+        os._exit(exit_code)
+
+
+def _spawn_worker(app, on_start, on_stop, listen_socket):
+    """
+    Fork a worker process.
+    Returns:
+        int: The worker's pid.
+    """
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(app, on_start, on_stop, listen_socket)
+    return pid
+
+
+def restart_delay(failures):
+    """
+    Args:
+        failures (int): Workers in a row that failed soon after starting, including this one.
+    Returns:
+        float: Seconds to wait before starting a replacement worker.
+    """
+    return min(WORKER_RESTART_BACKOFF * 2 ** (failures - 1), WORKER_MAX_RESTART_DELAY)
+
+
+def serve_prefork(app, on_start, on_stop):
+    """
+    Fork worker processes that share the listening socket and the tables loaded in this process.
+    Crashed workers are replaced, with backoff while they keep failing soon after starting; after
+    WORKER_MAX_RESTARTS such failures in a row every worker is stopped and the server exits with status 1.
+    SIGTERM or SIGINT stops every worker gracefully.
+    Background tasks only start in the workers, as threads do not survive a fork.
+    Args:
+        app: The WSGI application, already loaded.
+        on_start (callable): Starts the app's background tasks in each worker.
+        on_stop (callable): Flushes the app's background work in each worker as it exits.
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((HOST, PORT))
+    listen_socket.listen(1024)
+    listen_socket.setblocking(False)
+
+    # Move everything loaded so far out of the garbage collector's reach, so the
+    # collector does not write to (and un-share) the pages holding the tables
+    gc.collect()
+    gc.freeze()
+
+    # Start time of each worker by pid, and the start times of scheduled replacements
+    workers = {}
+    pending_restarts = []
+    failures = 0
+    gave_up = False
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logging.info(f"Serving on http://{HOST}:{PORT} with {WEB_WORKERS} workers x {WEB_THREADS} threads")
+    for _ in range(WEB_WORKERS):
+        workers[_spawn_worker(app, on_start, on_stop, listen_socket)] = time.monotonic()
+
+    # Supervise the workers, polling so the stop flag is seen promptly
+    while not stopping:
+        now = time.monotonic()
+        if failures and not pending_restarts and all(now - started >= WORKER_MIN_UPTIME for started in workers.values()):
+            # Every replacement came up and kept running, so earlier failures no longer count
+            failures = 0
+        for restart_at in [restart_at for restart_at in pending_restarts if restart_at <= now]:
+            pending_restarts.remove(restart_at)
+            workers[_spawn_worker(app, on_start, on_stop, listen_socket)] = time.monotonic()
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            if not pending_restarts:
+                break
+            pid = 0
+        if not pid:
+            time.sleep(0.1 if pending_restarts else 0.5)
+            continue
+        if pid not in workers or stopping:
+            workers.pop(pid, None)
+            continue
+
+        uptime = time.monotonic() - workers.pop(pid)
+        if uptime >= WORKER_MIN_UPTIME:
+            # The worker had been serving, so it is replaced at once
+            failures = 0
+            delay = 0
+        else:
+            failures += 1
+            if failures > WORKER_MAX_RESTARTS:
+                logging.error(f"Worker {pid} exited with status {status} after {uptime:.1f}s; "
+                              f"{failures} workers in a row failed to start, shutting down")
+                gave_up = True
+                break
+            delay = restart_delay(failures)
+        logging.warning(f"Worker {pid} exited with status {status} after {uptime:.1f}s, "
+                        f"starting a replacement in {delay:.1f}s")
+        pending_restarts.append(time.monotonic() + delay)
+
+    # Graceful shutdown: ask the workers to finish in-flight requests, then force them
+    logging.info("Stopping workers")
+    for pid in list(workers):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    while workers and time.monotonic() < deadline:
+        for pid in list(workers):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                workers.pop(pid)
+        time.sleep(0.1)
+    for pid in list(workers):
+        logging.warning(f"Worker {pid} did not stop in time, killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    listen_socket.close()
+    if gave_up:
+        sys.exit(1)
+
+
+def serve_async():
+    """
+    Serve the asyncio variant of the app from one event loop in this process.
+    SIGTERM stops accepting connections and waits up to SHUTDOWN_TIMEOUT seconds for in-flight requests.
+    """
+    from aiohttp import web
+    from async_app import create_app
+
+    logging.info(f"Serving on http://{HOST}:{PORT} with an asyncio event loop")
+    web.run_app(create_app(), host=HOST, port=PORT, backlog=1024, shutdown_timeout=SHUTDOWN_TIMEOUT,
+                access_log=None, print=None)
+
+
+def main():
+    """Load the app and serve it in the configured mode."""
+    if SERVER_MODE == "async":
+        serve_async()
+        return
+
+    # Importing app loads the tax and rebate tables, before any worker is forked
+    from app import app, shutdown, start_background_tasks
+
+    if SERVER_MODE == "prefork":
+        if not hasattr(os, "fork"):
+            logging.error("prefork mode needs os.fork, falling back to threaded mode")
+            serve_threaded(app, start_background_tasks)
+        else:
+            serve_prefork(app, start_background_tasks, shutdown)
+    elif SERVER_MODE == "threaded":
+        serve_threaded(app, start_background_tasks)
+    else:
+        logging.error(f"Unknown SERVER_MODE: {SERVER_MODE}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Request headers identifying the caller a load is made for
+IDENTITY_HEADERS = ("Authorization", "Cookie")
+
+
+def caller_key(name, headers):
+    """
+    Key a load by the caller it is made for, so results are only shared between requests with the same credentials.
+    Args:
+        name (str): What is loaded, e.g. "user-input".
+        headers (Mapping): Headers of the caller's request.
+    Returns:
+        tuple: The name and the caller's identity headers.
+    """
+    return (name,) + tuple(headers.get(header) for header in IDENTITY_HEADERS)
+
+
+class _Call:
+    """An in-flight load whose result is shared with every waiter."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """
+    Collapses concurrent loads of the same key into one call, with an optional TTL cache.
+
+    While a load for a key is in flight, other callers for that key wait for it and
+    share its result instead of starting their own. With a positive ttl, results
+    are also kept for ttl seconds, up to max_size keys (least recently used first out).
+    """
+
+    def __init__(self, ttl=0, max_size=128):
+        """
+        Args:
+            ttl (float): Seconds to keep results; 0 disables caching and only coalesces.
+            max_size (int): Maximum number of cached keys.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, cacheable=None):
+        """
+        Return the value for a key, loading it at most once across concurrent callers.
+        Args:
+            key: The cache key.
+            loader (callable): Loads the value when it is neither cached nor in flight.
+            cacheable (callable): Optional check deciding whether a loaded value may be cached.
+        Returns:
+            The cached, shared or freshly loaded value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and self.ttl > 0 and (cacheable is None or cacheable(call.result)):
+                    self._entries[key] = (time.monotonic() + self.ttl, call.result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit, miss and coalesced counters and the number of cached keys.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries)
+        }
+
+
+class AsyncSingleFlightCache(SingleFlightCache):
+    """
+    SingleFlightCache for coroutines on one event loop.
+
+    Waiters await the leader's task instead of blocking a thread; counters, TTL and
+    eviction behave as in SingleFlightCache.
+    """
+
+    async def get(self, key, loader, cacheable=None):
+        """
+        Return the value for a key, loading it at most once across concurrent callers.
+        Args:
+            key: The cache key.
+            loader (callable): Returns a coroutine loading the value.
+            cacheable (callable): Optional check deciding whether a loaded value may be cached.
+        Returns:
+            The cached, shared or freshly loaded value.
+        """
+        import asyncio
+
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # Shield the shared load so a cancelled waiter does not cancel it for everyone
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = self._in_flight[key] = asyncio.ensure_future(loader())
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        if self.ttl > 0 and (cacheable is None or cacheable(result)):
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
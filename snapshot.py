@@ -0,0 +1,298 @@
+"""
+Compiled, memory-mappable snapshot of the tax and rebate tables.
+
+Build it from the databases with:
+    python snapshot.py build [--output tax_rules.snapshot]
+and compare cold-start time of the snapshot and database paths with:
+    python snapshot.py benchmark
+
+Layout (little-endian):
+    header     magic, format version, source digest, payload checksum and section sizes
+    periods    fixed-width period directory, one entry per tax period
+    brackets   four float64 columns (min_income, max_income, tax_on_previous_bracket,
+               tax_percentage) of every bracket, grouped by period within each column
+    rebates    fixed-width rebate directory
+    strings    UTF-8 table and age group names referenced by offset and length
+
+The source digest identifies the SQLite files the snapshot was built from by the
+size and modification time of each, the fingerprint the hot reloader polls, so the
+staleness check costs a few stat calls; a snapshot whose digest no longer matches
+the databases is stale. The payload checksum is a SHA-256 of everything after the
+header. The loaded index keeps the file mapped: vectorized lookups search the
+bracket columns in place.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import mmap
+import os
+import statistics
+import struct
+import subprocess
+import sys
+
+from index_reloader import file_fingerprint
+from tax_index import TaxBracket, TaxIndex, make_period
+
+SNAPSHOT_MAGIC = b"TAXSNAP\x00"
+SNAPSHOT_FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<8sII32s32sIIII")
+PERIOD = struct.Struct("<iiiIIII")
+REBATE = struct.Struct("<idII")
+# Bracket fields, stored as one float64 column each
+BRACKET_COLUMNS = TaxBracket._fields
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt, of another format version or stale."""
+
+
+def source_digest(paths):
+    """
+    Identify the database files a snapshot is built from.
+    Args:
+        paths (list): SQLite database file paths.
+    Returns:
+        bytes: SHA-256 digest of the files' fingerprint (size and modification time, and those of any WAL files).
+    """
+    return hashlib.sha256(repr(file_fingerprint(paths)).encode()).digest()
+
+
+def build_snapshot(tax_index, output_path, source_paths):
+    """
+    Compile a TaxIndex into a snapshot file.
+    Args:
+        tax_index (TaxIndex): The index loaded from the databases.
+        output_path (str): Where to write the snapshot.
+        source_paths (list): The SQLite database files the index was loaded from.
+    Returns:
+        int: Size of the snapshot in bytes.
+    """
+    strings = bytearray()
+
+    def add_string(value):
+        encoded = value.encode("utf-8")
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    periods = bytearray()
+    columns = [[] for _ in BRACKET_COLUMNS]
+    bracket_count = 0
+    for period in tax_index.periods:
+        name_offset, name_length = add_string(period.table_name)
+        periods += PERIOD.pack(
+            period.financial_year, period.effective_date.toordinal(), period.end_date.toordinal(),
+            bracket_count, len(period.brackets), name_offset, name_length
+        )
+        for bracket in period.brackets:
+            # Stored as doubles, so fractional bounds survive exactly as loaded from the databases
+            for column, value in zip(columns, bracket):
+                column.append(float(value))
+        bracket_count += len(period.brackets)
+    brackets = b"".join(struct.pack(f"<{bracket_count}d", *column) for column in columns)
+
+    rebates = bytearray()
+    for (financial_year, age_group), rebate_value in tax_index.rebates.items():
+        name_offset, name_length = add_string(age_group)
+        rebates += REBATE.pack(financial_year, float(rebate_value), name_offset, name_length)
+
+    payload = bytes(periods + brackets + rebates + strings)
+    header = HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, 0,
+        source_digest([path for path in source_paths if path]),
+        hashlib.sha256(payload).digest(),
+        len(tax_index.periods), bracket_count, len(tax_index.rebates), len(strings)
+    )
+
+    # Write to a temporary file and rename, so readers never map a partial snapshot
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(header)
+        snapshot_file.write(payload)
+    os.replace(temp_path, output_path)
+    return len(header) + len(payload)
+
+
+def load_snapshot(snapshot_path, source_paths=()):
+    """
+    Memory-map a snapshot and build a TaxIndex from it.
+    Args:
+        snapshot_path (str): The snapshot file.
+        source_paths (list): SQLite database files to check the snapshot against; the check
+            is skipped when none are given (e.g. for non-SQLite databases).
+    Returns:
+        TaxIndex: The index stored in the snapshot, which keeps the file mapped.
+    Raises:
+        SnapshotError: If the snapshot is missing, corrupt, of another format version or stale.
+    """
+    try:
+        snapshot_file = open(snapshot_path, "rb")
+    except OSError as e:
+        raise SnapshotError(f"Snapshot not available: {e}")
+
+    with snapshot_file:
+        if os.fstat(snapshot_file.fileno()).st_size < HEADER.size:
+            raise SnapshotError("Snapshot is truncated")
+        # The mapping outlives the file descriptor and is released with the index
+        data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read_snapshot(snapshot_path, data, source_paths)
+    except SnapshotError:
+        data.close()
+        raise
+
+
+def _whole(value):
+    """Return a bound that is a whole number as an int, as the databases store it."""
+    return int(value) if value.is_integer() else value
+
+
+def _read_snapshot(snapshot_path, data, source_paths):
+    """
+    Verify a memory-mapped snapshot and build a TaxIndex from it.
+    Args:
+        snapshot_path (str): The snapshot file, for logging.
+        data (mmap.mmap): The mapped snapshot.
+        source_paths (list): SQLite database files to check the snapshot against.
+    Returns:
+        TaxIndex: The index stored in the snapshot.
+    Raises:
+        SnapshotError: If the snapshot is corrupt, of another format version or stale.
+    """
+    (magic, version, _, digest, checksum,
+     period_count, bracket_count, rebate_count, strings_size) = HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a tax snapshot file")
+    if version != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {version}")
+
+    periods_offset = HEADER.size
+    brackets_offset = periods_offset + period_count * PERIOD.size
+    rebates_offset = brackets_offset + bracket_count * len(BRACKET_COLUMNS) * 8
+    strings_offset = rebates_offset + rebate_count * REBATE.size
+    if len(data) != strings_offset + strings_size:
+        raise SnapshotError("Snapshot size does not match its header")
+    if hashlib.sha256(memoryview(data)[HEADER.size:]).digest() != checksum:
+        raise SnapshotError("Snapshot checksum mismatch")
+
+    source_paths = [path for path in source_paths if path]
+    if source_paths and source_digest(source_paths) != digest:
+        raise SnapshotError("Snapshot is stale: the databases have changed since it was built")
+
+    def read_string(offset, length):
+        start = strings_offset + offset
+        return data[start:start + length].decode("utf-8")
+
+    def read_column(position, first_bracket, count):
+        return struct.unpack_from(f"<{count}d", data, brackets_offset + (position * bracket_count + first_bracket) * 8)
+
+    periods = []
+    bracket_ranges = {}
+    for (financial_year, effective_ordinal, end_ordinal, first_bracket, count,
+         name_offset, name_length) in PERIOD.iter_unpack(data[periods_offset:brackets_offset]):
+        min_incomes, max_incomes, taxes_on_previous_brackets, tax_percentages = (
+            read_column(position, first_bracket, count) for position in range(len(BRACKET_COLUMNS))
+        )
+        brackets = [TaxBracket(_whole(min_income), _whole(max_income), *rates) for min_income, max_income, *rates
+                    in zip(min_incomes, max_incomes, taxes_on_previous_brackets, tax_percentages)]
+        table_name = read_string(name_offset, name_length)
+        bracket_ranges[table_name] = (first_bracket, count)
+        periods.append(make_period(
+            table_name, financial_year,
+            datetime.date.fromordinal(effective_ordinal), datetime.date.fromordinal(end_ordinal), brackets
+        ))
+
+    rebates = {}
+    for financial_year, rebate_value, name_offset, name_length in REBATE.iter_unpack(data[rebates_offset:strings_offset]):
+        rebates[(financial_year, read_string(name_offset, name_length))] = rebate_value
+
+    def bracket_source(period):
+        # Read-only views of the mapped min_income and max_income columns, without copying them
+        import numpy as np
+
+        first_bracket, count = bracket_ranges[period.table_name]
+        columns = np.frombuffer(data, dtype="<f8", count=len(BRACKET_COLUMNS) * bracket_count,
+                                offset=brackets_offset).reshape(len(BRACKET_COLUMNS), bracket_count)
+        return columns[0, first_bracket:first_bracket + count], columns[1, first_bracket:first_bracket + count]
+
+    logging.info(f"Loaded {len(periods)} tax periods and {len(rebates)} rebate rows from snapshot {snapshot_path}")
+    return TaxIndex(periods, rebates, bracket_source=bracket_source)
+
+
+# Timed in a fresh interpreter so each path pays its own import cost
+_BENCHMARK_SNAPSHOT = """
+import time
+started = time.perf_counter()
+from snapshot import load_snapshot
+load_snapshot({snapshot_path!r}, {source_paths!r})
+print(time.perf_counter() - started)
+"""
+
+_BENCHMARK_DATABASE = """
+import time
+started = time.perf_counter()
+from sqlalchemy import create_engine
+from tax_index import load_tax_index
+load_tax_index(create_engine({tax_db_uri!r}, future=True), create_engine({rebate_db_uri!r}, future=True))
+print(time.perf_counter() - started)
+"""
+
+
+def benchmark_startup(snapshot_path, tax_db_uri, rebate_db_uri, source_paths, runs=5):
+    """
+    Compare the cold-start time of loading the tables from the snapshot and from the databases.
+    Args:
+        snapshot_path (str): The snapshot file.
+        tax_db_uri (str): Tax database URI.
+        rebate_db_uri (str): Rebate database URI.
+        source_paths (list): SQLite database files the snapshot is checked against.
+        runs (int): Fresh interpreters started per path.
+    Returns:
+        dict: Median seconds per path and the speed-up of the snapshot path.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    scripts = {
+        "snapshot": _BENCHMARK_SNAPSHOT.format(snapshot_path=snapshot_path, source_paths=source_paths),
+        "database": _BENCHMARK_DATABASE.format(tax_db_uri=tax_db_uri, rebate_db_uri=rebate_db_uri)
+    }
+    results = {}
+    for name, script in scripts.items():
+        timings = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", script], cwd=here, check=True,
+                                    capture_output=True, text=True).stdout
+            timings.append(float(output.strip().splitlines()[-1]))
+        results[f"{name}_seconds"] = statistics.median(timings)
+    results["speedup"] = results["database_seconds"] / results["snapshot_seconds"]
+    return results
+
+
+def main():
+    """Command line entry point: build a snapshot or benchmark startup."""
+    from app_config import DATABASE_PATHS, REBATE_DB_URI, TAX_DB_URI, TAX_SNAPSHOT_PATH
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the tax ruleset snapshot.")
+    parser.add_argument("command", choices=["build", "benchmark"])
+    parser.add_argument("--output", default=TAX_SNAPSHOT_PATH or "tax_rules.snapshot", help="snapshot file path")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per path when benchmarking")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        from sqlalchemy import create_engine
+        from tax_index import load_tax_index
+
+        tax_index = load_tax_index(create_engine(TAX_DB_URI, future=True), create_engine(REBATE_DB_URI, future=True))
+        size = build_snapshot(tax_index, args.output, DATABASE_PATHS)
+        print(f"Snapshot written to {args.output} ({size} bytes)")
+    else:
+        print(json.dumps(benchmark_startup(args.output, TAX_DB_URI, REBATE_DB_URI, DATABASE_PATHS, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
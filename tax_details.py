@@ -0,0 +1,451 @@
+import contextlib
+import datetime
+import logging
+import math
+import numbers
+
+# Fields every tax details record must provide
+REQUIRED_FIELDS = ("month", "year", "age_group", "projected_annual_income")
+
+
+def build_tax_details(year, bracket, rebate_value):
+    """
+    Compile the tax details payload for a resolved bracket and rebate.
+    Args:
+        year (int): The financial year requested.
+        bracket (TaxBracket): The matching tax bracket.
+        rebate_value (float): The matching rebate value.
+    Returns:
+        dict: Tax details in the format expected by the Calculation Service.
+    """
+    return {
+        "financial_year": year,
+        "projected_annual_income_min_income": bracket.min_income,
+        "projected_annual_income_tax_on_previous_brackets": bracket.tax_on_previous_bracket,
+        "projected_annual_income_tax_percentage": bracket.tax_percentage,
+        "rebate_value": rebate_value
+    }
+
+
+def calculate_annual_tax(bracket, rebate_value, income):
+    """
+    Calculate annual PAYE for an income from its tax bracket and rebate.
+    Uses the same formula as the Calculation Service:
+    tax_on_previous_bracket + (income - min_income) * tax_percentage / 100 - rebate.
+    Args:
+        bracket (TaxBracket): The bracket containing the income.
+        rebate_value (float): The rebate for the age group.
+        income (float): The annual income.
+    Returns:
+        float: Annual tax, never below zero.
+    """
+    tax = bracket.tax_on_previous_bracket + (income - bracket.min_income) * bracket.tax_percentage / 100
+    return max(tax - rebate_value, 0.0)
+
+
+def build_tax_calculation(tax_details, bracket, bonus_bracket, rebate_value, income, income_plus_bonus_leave):
+    """
+    Extend tax details with annual and monthly tax computed in-process.
+    Args:
+        tax_details (dict): Tax details compiled by build_tax_details.
+        bracket (TaxBracket): Bracket of projected_annual_income.
+        bonus_bracket (TaxBracket): Bracket of projected_annual_income_plus_bonus_leave.
+        rebate_value (float): The rebate for the age group.
+        income (float): projected_annual_income.
+        income_plus_bonus_leave (float): projected_annual_income_plus_bonus_leave.
+    Returns:
+        dict: Tax details with the computed tax figures.
+    """
+    annual_tax = calculate_annual_tax(bracket, rebate_value, income)
+    annual_tax_plus_bonus_leave = calculate_annual_tax(bonus_bracket, rebate_value, income_plus_bonus_leave)
+    return {
+        **tax_details,
+        "projected_annual_income_plus_bonus_leave_min_income": bonus_bracket.min_income,
+        "projected_annual_income_plus_bonus_leave_tax_on_previous_brackets": bonus_bracket.tax_on_previous_bracket,
+        "projected_annual_income_plus_bonus_leave_tax_percentage": bonus_bracket.tax_percentage,
+        "annual_tax": round(annual_tax, 2),
+        "monthly_tax": round(annual_tax / 12, 2),
+        "annual_tax_plus_bonus_leave": round(annual_tax_plus_bonus_leave, 2),
+        "monthly_tax_plus_bonus_leave": round(annual_tax_plus_bonus_leave / 12, 2),
+        "tax_on_bonus_leave": round(annual_tax_plus_bonus_leave - annual_tax, 2)
+    }
+
+
+def build_tax_free_details(year, rebate_value, tax_free_threshold):
+    """
+    Compile the response for incomes below the tax-free threshold, with every tax figure zero.
+    Args:
+        year (int): The financial year requested.
+        rebate_value (float): The total rebate of the age group.
+        tax_free_threshold (float): Annual income below which no tax is due.
+    Returns:
+        dict: The tax-free details.
+    """
+    return {
+        "financial_year": year,
+        "rebate_value": rebate_value,
+        "tax_free": True,
+        "tax_free_threshold": round(tax_free_threshold, 2),
+        "annual_tax": 0.0,
+        "monthly_tax": 0.0,
+        "annual_tax_plus_bonus_leave": 0.0,
+        "monthly_tax_plus_bonus_leave": 0.0,
+        "tax_on_bonus_leave": 0.0
+    }
+
+
+def lookup_tax_details(tax_index, data, compute_locally=False, stage_timer=None, short_circuit=False):
+    """
+    Resolve the tax period, bracket and rebate for a /get-tax-details request body.
+    Shared by the threaded (app.py) and asyncio (async_app.py) services.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        data (dict): The request body, merged with the user input.
+        compute_locally (bool): Also compute the tax in-process.
+        stage_timer (callable): Optional context manager factory timing each stage by name.
+        short_circuit (bool): Answer incomes below the tax-free threshold with build_tax_free_details.
+    Returns:
+        tuple: (body, status_code, outcome). status_code is None when the tax details
+        in body still have to be delivered to the Calculation Service.
+    Raises:
+        KeyError, TypeError, ValueError: If the body is missing fields or has invalid values.
+    """
+    stage_timer = stage_timer or (lambda stage: contextlib.nullcontext())
+
+    year = data["year"]
+    age_group = data["age_group"]
+    projected_annual_income = data["projected_annual_income"]
+    projected_annual_income_plus_bonus_leave = data["projected_annual_income_plus_bonus_leave"]
+
+    input_date = datetime.date(year, data["month"], 1)
+
+    # Find the relevant tax period
+    with stage_timer("resolve_period"):
+        period = tax_index.resolve_period(input_date)
+    if not period:
+        logging.debug("No applicable tax period table found")
+        return {"error": "No applicable tax period table found"}, 404, "no_tax_period"
+
+    logging.debug("Relevant tax period table: %s", period.table_name)
+
+    # Find the total rebate for the age group
+    with stage_timer("find_rebate"):
+        rebate_value = tax_index.find_rebate(year, age_group)
+
+    # Incomes below the tax-free threshold owe nothing: answer without bracket lookups or the Calculation Service
+    if (short_circuit and rebate_value is not None
+            and tax_index.is_tax_free(period, rebate_value, projected_annual_income)
+            and tax_index.is_tax_free(period, rebate_value, projected_annual_income_plus_bonus_leave)):
+        return build_tax_free_details(
+            year, rebate_value, tax_index.tax_free_threshold(period, rebate_value)
+        ), 200, "tax_free"
+
+    # Find the tax bracket for the projected income
+    with stage_timer("find_bracket"):
+        bracket = tax_index.find_bracket(period, projected_annual_income)
+    if not bracket:
+        logging.debug("No matching tax row found for projected_annual_income")
+        return {"error": "No matching tax row for projected_annual_income"}, 404, "no_tax_bracket"
+
+    if rebate_value is None:
+        logging.debug("No matching rebate row found")
+        return {"error": "No matching rebate row found"}, 404, "no_rebate"
+
+    # Compile tax details
+    tax_details = build_tax_details(year, bracket, rebate_value)
+    if not compute_locally:
+        return tax_details, None, None
+
+    # Compute the tax in-process, including the bonus and leave figure
+    bonus_bracket = tax_index.find_bracket(period, projected_annual_income_plus_bonus_leave)
+    if not bonus_bracket:
+        logging.debug("No matching tax row found for projected_annual_income_plus_bonus_leave")
+        return {"error": "No matching tax row for projected_annual_income_plus_bonus_leave"}, 404, "no_tax_bracket"
+
+    return build_tax_calculation(
+        tax_details, bracket, bonus_bracket, rebate_value,
+        projected_annual_income, projected_annual_income_plus_bonus_leave
+    ), 200, "ok"
+
+
+def build_tax_table(period):
+    """
+    Compile the full bracket set of a tax period, for clients that resolve brackets themselves.
+    Args:
+        period (TaxPeriod): The tax period.
+    Returns:
+        dict: Period dates and every bracket in min_income order.
+    """
+    return {
+        "financial_year": period.financial_year,
+        "table_name": period.table_name,
+        "effective_date": period.effective_date.isoformat(),
+        "end_date": period.end_date.isoformat(),
+        "brackets": [
+            {
+                "min_income": bracket.min_income,
+                "max_income": bracket.max_income,
+                "tax_on_previous_bracket": bracket.tax_on_previous_bracket,
+                "tax_percentage": bracket.tax_percentage
+            }
+            for bracket in period.brackets
+        ]
+    }
+
+
+def build_rebate_table(financial_year, rebates, rebate_tiers):
+    """
+    Compile the rebates of a financial year.
+    Args:
+        financial_year (int): The financial year.
+        rebates (dict): Total (stacked) rebate keyed by age group, as used for rebate_value.
+        rebate_tiers (dict): Stored rebate row of each age group, before stacking.
+    Returns:
+        dict: The total rebates and the per-tier rebates by age group.
+    """
+    return {
+        "financial_year": financial_year,
+        "rebates": dict(sorted(rebates.items())),
+        "rebate_tiers": dict(sorted(rebate_tiers.items()))
+    }
+
+
+def build_threshold_table(financial_year, thresholds):
+    """
+    Compile the total rebates and tax-free thresholds of a financial year.
+    Args:
+        financial_year (int): The financial year.
+        thresholds (dict): (total rebate, annual threshold) keyed by age group.
+    Returns:
+        dict: The rebate and annual and monthly thresholds by age group.
+    """
+    return {
+        "financial_year": financial_year,
+        "thresholds": {
+            age_group: {
+                "rebate_value": rebate_value,
+                "annual_threshold": None if threshold is None else round(threshold, 2),
+                "monthly_threshold": None if threshold is None else round(threshold / 12, 2)
+            }
+            for age_group, (rebate_value, threshold) in sorted(thresholds.items())
+        }
+    }
+
+
+def _validate_record(record):
+    """
+    Validate a single batch record.
+    Args:
+        record: The record from the request body.
+    Returns:
+        str: An error message, or None if the record is valid.
+    """
+    if not isinstance(record, dict):
+        return "Record must be a JSON object"
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) is None]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    # month, year and age_group are used as lookup keys, so lists and objects must not get through
+    if any(isinstance(record[field], bool) or not isinstance(record[field], int) for field in ("month", "year")):
+        return "Invalid month or year"
+    if not isinstance(record["age_group"], str):
+        return "age_group must be a string"
+    income = record["projected_annual_income"]
+    if isinstance(income, bool) or not isinstance(income, numbers.Real):
+        return "projected_annual_income must be a number"
+    return None
+
+
+def resolve_tax_details_batch(tax_index, records):
+    """
+    Resolve tax details for many records at once.
+
+    Records are grouped by tax period and the brackets of each group are found
+    in a single vectorized pass over the period's bracket boundaries.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        records (list): Records with month, year, age_group and projected_annual_income.
+    Returns:
+        list: Tax details or {"error": ...} for each record, in input order.
+    """
+    results = [None] * len(records)
+    periods_by_month = {}
+    groups = {}
+
+    # Resolve each distinct month once and group the records by period
+    for position, record in enumerate(records):
+        error = _validate_record(record)
+        if error:
+            results[position] = {"error": error}
+            continue
+
+        month_key = (record["year"], record["month"])
+        if month_key not in periods_by_month:
+            try:
+                input_date = datetime.date(record["year"], record["month"], 1)
+            except (TypeError, ValueError):
+                periods_by_month[month_key] = "Invalid month or year"
+            else:
+                periods_by_month[month_key] = tax_index.resolve_period(input_date)
+
+        period = periods_by_month[month_key]
+        if isinstance(period, str):
+            results[position] = {"error": period}
+        elif period is None:
+            results[position] = {"error": "No applicable tax period table found"}
+        else:
+            groups.setdefault(period.table_name, (period, []))[1].append(position)
+
+    # Find the brackets of each period group in one pass
+    for period, positions in groups.values():
+        incomes = [records[position]["projected_annual_income"] for position in positions]
+        bracket_positions = tax_index.find_brackets(period, incomes)
+
+        for position, bracket_position in zip(positions, bracket_positions.tolist()):
+            record = records[position]
+            if bracket_position < 0:
+                results[position] = {"error": "No matching tax row for projected_annual_income"}
+                continue
+
+            rebate_value = tax_index.find_rebate(record["year"], record["age_group"])
+            if rebate_value is None:
+                results[position] = {"error": "No matching rebate row found"}
+                continue
+
+            results[position] = build_tax_details(record["year"], period.brackets[bracket_position], rebate_value)
+
+    return results
+
+
+def annual_tax_arrays(tax_index, period, incomes):
+    """
+    Vectorized annual tax before rebates for many incomes in one period.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        period (TaxPeriod): The period.
+        incomes (numpy.ndarray): Annual incomes (float64).
+    Returns:
+        tuple: Boolean mask of incomes inside a bracket, tax before rebates and the
+        bracket's tax_percentage for every income (numpy arrays; meaningless where unmatched).
+    """
+    import numpy as np
+
+    positions = tax_index.find_brackets(period, incomes)
+    matched = positions >= 0
+    columns = np.array(
+        [(bracket.min_income, bracket.tax_on_previous_bracket, bracket.tax_percentage) for bracket in period.brackets],
+        dtype=np.float64
+    )
+    min_incomes, tax_on_previous, percentages = columns[np.where(matched, positions, 0)].T
+    # Same operations in the same order as calculate_annual_tax, so the results are identical
+    tax = tax_on_previous + (incomes - min_incomes) * percentages / 100
+    return matched, tax, percentages
+
+
+def parse_income_points(body, max_points):
+    """
+    Read the incomes of a tax curve request: an explicit "incomes" array, or an
+    "income_range" with start, stop (inclusive) and step.
+    Args:
+        body (dict): The request body.
+        max_points (int): Largest number of incomes allowed.
+    Returns:
+        numpy.ndarray: The incomes (float64).
+    Raises:
+        ValueError: If the incomes are missing or invalid.
+    """
+    import numpy as np
+
+    def is_number(value):
+        return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+    if body.get("incomes") is not None:
+        incomes = body["incomes"]
+        if not isinstance(incomes, list) or not all(is_number(income) for income in incomes):
+            raise ValueError("incomes must be an array of numbers")
+        if len(incomes) > max_points:
+            raise ValueError(f"At most {max_points} incomes are allowed")
+        incomes = np.array(incomes, dtype=np.float64)
+    else:
+        income_range = body.get("income_range")
+        if not isinstance(income_range, dict) or not all(is_number(income_range.get(field))
+                                                         for field in ("start", "stop", "step")):
+            raise ValueError("Provide incomes or an income_range with numeric start, stop and step")
+        start, stop, step = income_range["start"], income_range["stop"], income_range["step"]
+        if not all(math.isfinite(value) for value in (start, stop, step)):
+            raise ValueError("income_range start, stop and step must be finite")
+        if step <= 0 or stop < start:
+            raise ValueError("income_range needs a positive step and stop >= start")
+        # Check the size before converting, so a tiny step is rejected rather than overflowing
+        steps = (stop - start) / step
+        if not math.isfinite(steps) or steps + 1 > max_points:
+            raise ValueError(f"At most {max_points} incomes are allowed")
+        # Keep stop when rounding leaves it a hair beyond a whole number of steps, e.g. 0 to 0.3 by 0.1
+        whole_steps = round(steps)
+        count = (whole_steps if math.isclose(steps, whole_steps, rel_tol=1e-9) else math.floor(steps)) + 1
+        incomes = np.minimum(start + np.arange(count, dtype=np.float64) * step, stop)
+
+    if not len(incomes):
+        raise ValueError("At least one income is required")
+    if not np.isfinite(incomes).all() or (incomes < 0).any():
+        raise ValueError("Incomes must be finite and non-negative")
+    return incomes
+
+
+def _column(values, matched):
+    """Convert a numpy column to a list, with null where no bracket matched."""
+    column = values.tolist()
+    if matched.all():
+        return column
+    for position, is_matched in enumerate(matched.tolist()):
+        if not is_matched:
+            column[position] = None
+    return column
+
+
+def build_tax_curves(tax_index, incomes, financial_years, age_groups):
+    """
+    Compute tax, effective rate and marginal rate at every income for each financial
+    year and age group, in one vectorized pass per year.
+    Args:
+        tax_index (TaxIndex): The loaded tax and rebate index.
+        incomes (numpy.ndarray): Annual incomes.
+        financial_years (list): Financial years to compute.
+        age_groups (list): Rebate age groups to compute.
+    Returns:
+        dict: The incomes and one curve per (financial year, age group) with columnar
+        tax, effective_rate and marginal_rate arrays (percentages, like tax_percentage),
+        null where an income falls outside every bracket.
+    """
+    import numpy as np
+
+    curves = []
+    for financial_year in financial_years:
+        period = tax_index.period_for_year(financial_year)
+        if period is None:
+            curves.extend({"financial_year": financial_year, "age_group": age_group,
+                           "error": "No tax table found for financial year"} for age_group in age_groups)
+            continue
+
+        matched, tax_before_rebate, percentages = annual_tax_arrays(tax_index, period, incomes)
+        for age_group in age_groups:
+            rebate_value = tax_index.find_rebate(financial_year, age_group)
+            if rebate_value is None:
+                curves.append({"financial_year": financial_year, "age_group": age_group,
+                               "error": "No matching rebate row found"})
+                continue
+
+            tax = np.maximum(tax_before_rebate - rebate_value, 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                effective_rate = np.where(incomes > 0, tax / incomes * 100, 0.0)
+            # Below the tax threshold the rebate absorbs every extra rand
+            marginal_rate = np.where(tax > 0, percentages, 0.0)
+            curves.append({
+                "financial_year": financial_year,
+                "age_group": age_group,
+                "tax": _column(np.round(tax, 2), matched),
+                "effective_rate": _column(np.round(effective_rate, 4), matched),
+                "marginal_rate": _column(marginal_rate, matched)
+            })
+
+    return {"incomes": incomes.tolist(), "curves": curves}
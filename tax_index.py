@@ -0,0 +1,456 @@
+import bisect
+import datetime
+import logging
+from collections import namedtuple
+from types import MappingProxyType
+
+# NumPy is imported on first vectorized lookup and SQLAlchemy inside the loaders,
+# so neither is on the startup path of a process that loads a snapshot (see snapshot.py)
+
+# A single tax bracket row from a tax period table
+TaxBracket = namedtuple(
+    "TaxBracket",
+    ["min_income", "max_income", "tax_on_previous_bracket", "tax_percentage"]
+)
+
+# A tax period with its brackets sorted by min_income
+TaxPeriod = namedtuple(
+    "TaxPeriod",
+    ["table_name", "financial_year", "effective_date", "end_date", "brackets", "min_incomes"]
+)
+
+
+# Rebate age groups in stacking order: each group also receives the rebates of the groups before it
+REBATE_TIERS = ("Primary", "Secondary (65 and older)", "Tertiary (75 and older)")
+
+
+def to_date(value):
+    """
+    Convert a date value read from the database into a datetime.date.
+    Args:
+        value: A date, datetime or ISO formatted string.
+    Returns:
+        datetime.date: The converted date.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def make_period(table_name, financial_year, effective_date, end_date, brackets):
+    """
+    Build a TaxPeriod with its brackets sorted for bisecting on min_income.
+    Args:
+        table_name (str): Name of the tax period table.
+        financial_year (int): Financial year the period belongs to.
+        effective_date: First day of the period.
+        end_date: Last day of the period.
+        brackets (iterable): TaxBracket rows of the period.
+    Returns:
+        TaxPeriod: The immutable period.
+    """
+    brackets = tuple(sorted(brackets, key=lambda bracket: bracket.min_income))
+    return TaxPeriod(
+        table_name=table_name,
+        financial_year=financial_year,
+        effective_date=to_date(effective_date),
+        end_date=to_date(end_date),
+        brackets=brackets,
+        min_incomes=tuple(bracket.min_income for bracket in brackets)
+    )
+
+
+def cumulative_rebates(rebates):
+    """
+    Add up the stacked rebates of every age group: secondary includes primary, and
+    tertiary includes both. Age groups outside REBATE_TIERS keep their own value.
+    Args:
+        rebates (dict): Rebate values keyed by (financial_year, age_group).
+    Returns:
+        dict: Total rebate keyed by (financial_year, age_group).
+    """
+    totals = {}
+    for (financial_year, age_group), rebate_value in rebates.items():
+        if age_group in REBATE_TIERS:
+            tiers = REBATE_TIERS[:REBATE_TIERS.index(age_group) + 1]
+            rebate_value = sum(rebates.get((financial_year, tier), 0.0) for tier in tiers)
+        totals[(financial_year, age_group)] = rebate_value
+    return totals
+
+
+def tax_free_threshold(period, rebate_value):
+    """
+    Find the annual income at which the tax before rebates reaches a rebate; below it no tax is due.
+    Args:
+        period (TaxPeriod): The period.
+        rebate_value (float): The total rebate.
+    Returns:
+        float: The threshold, or None if the rebate covers the tax at every income in the brackets.
+    """
+    for bracket in period.brackets:
+        if not bracket.tax_percentage:
+            continue
+        threshold = bracket.min_income + (rebate_value - bracket.tax_on_previous_bracket) * 100 / bracket.tax_percentage
+        if threshold <= bracket.max_income:
+            return max(threshold, bracket.min_income)
+    return None
+
+
+class TaxIndex:
+    """
+    Immutable in-memory index of tax periods, brackets and rebates.
+
+    Periods are resolved with a bisect on their effective dates and brackets
+    with a bisect on min_income, so lookups never touch the database.
+    """
+
+    __slots__ = ("periods", "rebates", "cumulative_rebates", "_period_starts", "_periods_by_year",
+                 "_bracket_arrays", "_bracket_source", "_documents", "_thresholds")
+
+    def __init__(self, periods, rebates, bracket_source=None):
+        """
+        Args:
+            periods (iterable): TaxPeriod entries.
+            rebates (dict): Rebate values keyed by (financial_year, age_group).
+            bracket_source (callable): Returns the bracket boundary arrays of a period, e.g. as
+                views of a memory-mapped snapshot; by default they are built from period.brackets.
+        """
+        self.periods = tuple(sorted(periods, key=lambda period: period.effective_date))
+        self.rebates = MappingProxyType(dict(rebates))
+        self.cumulative_rebates = MappingProxyType(cumulative_rebates(self.rebates))
+        self._period_starts = tuple(period.effective_date for period in self.periods)
+        self._periods_by_year = {period.financial_year: period for period in self.periods}
+        self._bracket_arrays = {}
+        self._bracket_source = bracket_source
+        self._documents = {}
+
+        # Tax-free thresholds by (financial_year, total rebate), precomputed for each year's own rebates
+        self._thresholds = {}
+        for (financial_year, _), rebate_value in self.cumulative_rebates.items():
+            period = self._periods_by_year.get(financial_year)
+            if period:
+                self.tax_free_threshold(period, rebate_value)
+
+    def resolve_period(self, input_date):
+        """
+        Find the tax period covering a date.
+        Args:
+            input_date (datetime.date): The date to resolve.
+        Returns:
+            TaxPeriod: The covering period, or None if no period applies.
+        """
+        position = bisect.bisect_right(self._period_starts, input_date) - 1
+        if position < 0:
+            return None
+        period = self.periods[position]
+        if period.end_date < input_date:
+            return None
+        return period
+
+    def period_for_year(self, financial_year):
+        """
+        Find the tax period of a financial year.
+        Args:
+            financial_year (int): The financial year.
+        Returns:
+            TaxPeriod: The period, or None if the year has no tax table.
+        """
+        return self._periods_by_year.get(financial_year)
+
+    @staticmethod
+    def find_bracket(period, income):
+        """
+        Find the bracket of a period whose bounds (inclusive) contain an income.
+        Args:
+            period (TaxPeriod): The period to search.
+            income (float): The income to look up.
+        Returns:
+            TaxBracket: The matching bracket, or None if the income falls outside every bracket.
+        """
+        position = bisect.bisect_right(period.min_incomes, income) - 1
+        if position < 0:
+            return None
+        bracket = period.brackets[position]
+        if bracket.max_income < income:
+            return None
+        return bracket
+
+    def bracket_arrays(self, period):
+        """
+        Read-only bracket boundary arrays of a period, built on first use.
+        Args:
+            period (TaxPeriod): The period.
+        Returns:
+            tuple: min_income and max_income arrays (numpy.ndarray of float64).
+        """
+        arrays = self._bracket_arrays.get(period.table_name)
+        if arrays is None and self._bracket_source is not None:
+            arrays = self._bracket_arrays[period.table_name] = self._bracket_source(period)
+        if arrays is None:
+            import numpy as np
+
+            min_income_array = np.array([bracket.min_income for bracket in period.brackets], dtype=np.float64)
+            max_income_array = np.array([bracket.max_income for bracket in period.brackets], dtype=np.float64)
+            min_income_array.flags.writeable = False
+            max_income_array.flags.writeable = False
+            arrays = self._bracket_arrays[period.table_name] = (min_income_array, max_income_array)
+        return arrays
+
+    def find_brackets(self, period, incomes):
+        """
+        Vectorized find_bracket over many incomes in the same period.
+        Args:
+            period (TaxPeriod): The period to search.
+            incomes (array-like): The incomes to look up.
+        Returns:
+            numpy.ndarray: Index into period.brackets for each income, or -1 where no bracket matches.
+        """
+        import numpy as np
+
+        min_income_array, max_income_array = self.bracket_arrays(period)
+        incomes = np.asarray(incomes, dtype=np.float64)
+        positions = np.searchsorted(min_income_array, incomes, side="right") - 1
+        matched = positions >= 0
+        matched[matched] = max_income_array[positions[matched]] >= incomes[matched]
+        return np.where(matched, positions, -1)
+
+    def find_rebate(self, financial_year, age_group):
+        """
+        Find the total rebate for an age group and financial year, including the
+        rebates of the age groups it stacks on.
+        Args:
+            financial_year (int): The financial year.
+            age_group (str): The rebate age group.
+        Returns:
+            float: The total rebate, or None if no rebate row exists.
+        """
+        return self.cumulative_rebates.get((financial_year, age_group))
+
+    def tax_free_threshold(self, period, rebate_value):
+        """
+        Annual income below which no tax is due in a period with a total rebate, computed once.
+        Args:
+            period (TaxPeriod): The period.
+            rebate_value (float): The total rebate.
+        Returns:
+            float: The threshold, or None if there is none.
+        """
+        key = (period.financial_year, rebate_value)
+        if key not in self._thresholds:
+            self._thresholds[key] = tax_free_threshold(period, rebate_value)
+        return self._thresholds[key]
+
+    def is_tax_free(self, period, rebate_value, income):
+        """
+        Check, without a bracket lookup, whether an income owes no tax: it lies between
+        the bottom of the period's brackets and the tax-free threshold.
+        Args:
+            period (TaxPeriod): The period.
+            rebate_value (float): The total rebate.
+            income (float): The annual income.
+        Returns:
+            bool: True if the income is certainly tax-free.
+        """
+        threshold = self.tax_free_threshold(period, rebate_value)
+        if threshold is None or not period.brackets:
+            return False
+        return period.brackets[0].min_income <= income < threshold
+
+    def rebates_for_year(self, financial_year, cumulative=False):
+        """
+        Args:
+            financial_year (int): The financial year.
+            cumulative (bool): Return total rebates instead of the stored rebate rows.
+        Returns:
+            dict: Rebate values of the year keyed by age group.
+        """
+        rebates = self.cumulative_rebates if cumulative else self.rebates
+        return {age_group: value for (year, age_group), value in rebates.items() if year == financial_year}
+
+    def tax_free_thresholds(self, financial_year):
+        """
+        Args:
+            financial_year (int): The financial year.
+        Returns:
+            dict: Total rebate and tax-free threshold of each age group, or None if the year has no tax table.
+        """
+        period = self.period_for_year(financial_year)
+        if period is None:
+            return None
+        return {
+            age_group: (rebate_value, self.tax_free_threshold(period, rebate_value))
+            for age_group, rebate_value in self.rebates_for_year(financial_year, cumulative=True).items()
+        }
+
+    def cached_document(self, key, build):
+        """
+        Return a document derived from this index, building it on first use.
+        Documents live as long as the index, so a reload starts with an empty cache.
+        Args:
+            key (tuple): Identifies the document.
+            build (callable): Builds the document.
+        Returns:
+            The cached document.
+        """
+        document = self._documents.get(key)
+        if document is None:
+            document = self._documents[key] = build()
+        return document
+
+
+def verify_tax_index(tax_index):
+    """
+    Check a loaded index for problems that would make lookups wrong.
+    Args:
+        tax_index (TaxIndex): The index to check.
+    Returns:
+        list: Descriptions of the problems found; empty if the index is sound.
+    """
+    problems = []
+    if not tax_index.periods:
+        problems.append("No tax periods loaded")
+    if not tax_index.rebates:
+        problems.append("No rebate rows loaded")
+
+    previous = None
+    for period in tax_index.periods:
+        if period.effective_date > period.end_date:
+            problems.append(f"{period.table_name} ends before it starts")
+        if previous and previous.end_date >= period.effective_date:
+            problems.append(f"{period.table_name} overlaps {previous.table_name}")
+        if not period.brackets:
+            problems.append(f"{period.table_name} has no brackets")
+        for lower, upper in zip(period.brackets, period.brackets[1:]):
+            if lower.max_income >= upper.min_income:
+                problems.append(f"{period.table_name} brackets starting at {lower.min_income} and {upper.min_income} overlap")
+        for bracket in period.brackets:
+            if bracket.min_income > bracket.max_income:
+                problems.append(f"{period.table_name} bracket starting at {bracket.min_income} ends before it starts")
+        previous = period
+    return problems
+
+
+def _load_consolidated_periods(connection):
+    """
+    Load every period and its brackets from the consolidated tax_brackets table in one query.
+    Args:
+        connection: An open connection to the tax database.
+    Returns:
+        list: TaxPeriod entries.
+    """
+    from sqlalchemy import text
+
+    rows = connection.execute(text("""
+        SELECT t.table_name, t.financial_year, t.effective_date, t.end_date,
+               b.min_income, b.max_income, b.tax_on_previous_bracket, b.tax_percentage
+        FROM tax_table t
+        JOIN tax_brackets b ON b.financial_year = t.financial_year
+        ORDER BY t.financial_year, b.min_income;
+    """)).fetchall()
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.financial_year, (row, []))[1].append(TaxBracket(*row[4:]))
+    return [
+        make_period(first.table_name, first.financial_year, first.effective_date, first.end_date, brackets)
+        for first, brackets in grouped.values()
+    ]
+
+
+def _load_periods(connection):
+    """
+    Load every tax period and its brackets.
+    Periods in the consolidated tax_brackets table are loaded in one query; tax
+    period tables that have not been migrated into it are read one by one.
+    Args:
+        connection: An open connection to the tax database.
+    Returns:
+        list: TaxPeriod entries.
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(connection)
+    table_names = inspector.get_table_names()
+
+    periods = []
+    if "tax_brackets" in table_names:
+        periods = _load_consolidated_periods(connection)
+    migrated_years = {period.financial_year for period in periods}
+
+    # Period metadata from tax_table, used when a period table has no date columns
+    metadata = {}
+    if "tax_table" in table_names:
+        metadata_query = text("SELECT table_name, financial_year, effective_date, end_date FROM tax_table;")
+        for row in connection.execute(metadata_query).fetchall():
+            metadata.setdefault(row.table_name, row)
+
+    for table_name in table_names:
+        if not table_name.startswith("tax_period_"):
+            continue
+
+        if table_name in metadata:
+            financial_year = metadata[table_name].financial_year
+        else:
+            financial_year = int(table_name.rsplit("_", 1)[-1])
+        if financial_year in migrated_years:
+            continue
+
+        columns = {column["name"] for column in inspector.get_columns(table_name)}
+        has_dates = {"effective_date", "end_date"} <= columns
+        select_dates = ", effective_date, end_date" if has_dates else ""
+        rows = connection.execute(text(f"""
+            SELECT min_income, max_income, tax_on_previous_bracket, tax_percentage{select_dates}
+            FROM {table_name};
+        """)).fetchall()
+
+        if has_dates and rows:
+            effective_date = min(to_date(row.effective_date) for row in rows)
+            end_date = max(to_date(row.end_date) for row in rows)
+        elif table_name in metadata:
+            effective_date = metadata[table_name].effective_date
+            end_date = metadata[table_name].end_date
+        else:
+            logging.warning(f"Skipping tax period table without dates: {table_name}")
+            continue
+
+        brackets = [TaxBracket(*row[:4]) for row in rows]
+        periods.append(make_period(table_name, financial_year, effective_date, end_date, brackets))
+
+    return periods
+
+
+def _load_rebates(connection):
+    """
+    Load every rebate row.
+    Args:
+        connection: An open connection to the rebate database.
+    Returns:
+        dict: Rebate values keyed by (financial_year, age_group).
+    """
+    from sqlalchemy import text
+
+    rebate_query = text("SELECT age_group, financial_year, rebate_value FROM rebate_table;")
+    rebates = {}
+    for row in connection.execute(rebate_query).fetchall():
+        rebates.setdefault((row.financial_year, row.age_group), row.rebate_value)
+    return rebates
+
+
+def load_tax_index(tax_engine, rebate_engine):
+    """
+    Load all tax periods, brackets and rebates into a TaxIndex.
+    Args:
+        tax_engine: SQLAlchemy engine for the tax database.
+        rebate_engine: SQLAlchemy engine for the rebate database.
+    Returns:
+        TaxIndex: The loaded index.
+    """
+    with tax_engine.connect() as connection:
+        periods = _load_periods(connection)
+    with rebate_engine.connect() as connection:
+        rebates = _load_rebates(connection)
+
+    logging.info(f"Loaded {len(periods)} tax periods and {len(rebates)} rebate rows into memory")
+    return TaxIndex(periods, rebates)
@@ -0,0 +1,165 @@
+"""
+Client for the cacheable tax table and rebate endpoints.
+
+Downstream services can resolve brackets and rebates in-process:
+
+    client = TaxTablesClient("https://salary-calculator-tax-tables.onrender.com", cache_dir=".tax-cache")
+    bracket = client.find_bracket(2025, 450000)
+    rebate = client.find_rebate(2025, "Primary")
+
+Tables are cached in memory (and optionally on disk) and reused for the max-age the
+service sends. After that they are revalidated with If-None-Match, so an unchanged
+table costs one 304 response. If the service cannot be reached, the cached copy is used.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+
+class TaxTablesClient:
+    """Caching client for GET /tax-tables/<financial_year> and GET /rebates/<financial_year>."""
+
+    def __init__(self, base_url, cache_dir=None, timeout=(3.05, 10), session=None):
+        """
+        Args:
+            base_url (str): Base URL of the Tax Tables Service.
+            cache_dir (str): Directory to persist cached tables in, so a restart can revalidate instead of refetch.
+            timeout (tuple): Connect and read timeouts in seconds.
+            session (requests.Session): Session to use; a new one by default.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.requests_sent = 0
+        self.not_modified = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_tax_table(self, financial_year):
+        """
+        Returns:
+            dict: The tax table of a financial year, or None if the service has none.
+        """
+        return self._get(f"/tax-tables/{financial_year}")
+
+    def get_rebates(self, financial_year):
+        """
+        Returns:
+            dict: Total (stacked) rebate of each age group of a financial year, or None if the service has none.
+        """
+        table = self._get(f"/rebates/{financial_year}")
+        return table["rebates"] if table else None
+
+    def find_bracket(self, financial_year, income):
+        """
+        Find the bracket containing an income, with the service's inclusive bounds.
+        Args:
+            financial_year (int): The financial year.
+            income (float): The income to look up.
+        Returns:
+            dict: min_income, max_income, tax_on_previous_bracket and tax_percentage, or None.
+        """
+        table = self.get_tax_table(financial_year)
+        if not table:
+            return None
+        brackets = table["brackets"]
+        position = bisect.bisect_right([bracket["min_income"] for bracket in brackets], income) - 1
+        if position < 0 or brackets[position]["max_income"] < income:
+            return None
+        return brackets[position]
+
+    def find_rebate(self, financial_year, age_group):
+        """
+        Returns:
+            float: The total rebate for an age group, including the rebates it stacks on
+            (the rebate_value of /get-tax-details), or None.
+        """
+        rebates = self.get_rebates(financial_year)
+        return rebates.get(age_group) if rebates else None
+
+    def _get(self, path):
+        """
+        Return a table from the cache, revalidating or fetching it when it has expired.
+        Args:
+            path (str): Table path.
+        Returns:
+            dict: The table, or None on 404.
+        Raises:
+            requests.RequestException: If the service cannot be reached and nothing is cached.
+        """
+        with self._lock:
+            entry = self._entries.get(path) or self._read_disk(path)
+            if entry and entry["expires_at"] > time.time():
+                return entry["table"]
+
+            headers = {"If-None-Match": f'"{entry["etag"]}"'} if entry else {}
+            try:
+                response = self.session.get(f"{self.base_url}{path}", headers=headers, timeout=self.timeout)
+                self.requests_sent += 1
+            except requests.RequestException as e:
+                if entry:
+                    logging.warning(f"Using cached {path}, revalidation failed: {e}")
+                    return entry["table"]
+                raise
+
+            if response.status_code == 304 and entry:
+                self.not_modified += 1
+                entry["expires_at"] = time.time() + self._max_age(response)
+            elif response.status_code == 200:
+                entry = {
+                    "etag": response.headers.get("ETag", "").strip('"'),
+                    "expires_at": time.time() + self._max_age(response),
+                    "table": response.json()
+                }
+            elif response.status_code == 404:
+                self._entries.pop(path, None)
+                return None
+            else:
+                response.raise_for_status()
+
+            self._entries[path] = entry
+            self._write_disk(path, entry)
+            return entry["table"]
+
+    @staticmethod
+    def _max_age(response):
+        """Read max-age from the Cache-Control header, 0 if absent."""
+        for directive in response.headers.get("Cache-Control", "").split(","):
+            name, _, value = directive.strip().partition("=")
+            if name == "max-age" and value.isdigit():
+                return int(value)
+        return 0
+
+    def _disk_path(self, path):
+        return os.path.join(self.cache_dir, path.strip("/").replace("/", "-") + ".json")
+
+    def _read_disk(self, path):
+        """Load a cached table from the cache directory, if there is one."""
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(path), encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        self._entries[path] = entry
+        return entry
+
+    def _write_disk(self, path, entry):
+        """Persist a cached table atomically."""
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self._disk_path(path)}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(temp_path, self._disk_path(path))
+        except OSError as e:
+            logging.warning(f"Failed to write table cache for {path}: {e}")
@@ -0,0 +1,66 @@
+"""
+Shared fixtures: a small in-memory tax index with the 2026 SARS brackets and rebates,
+and the Flask app serving generated fixture databases.
+"""
+import os
+import sys
+
+import pytest
+
+# The service modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tax_index import TaxBracket, TaxIndex, make_period  # noqa: E402
+
+BRACKETS_2026 = [
+    TaxBracket(1, 237100, 0, 18),
+    TaxBracket(237101, 370500, 42678, 26),
+    TaxBracket(370501, 512800, 77362, 31),
+    TaxBracket(512801, 673000, 121475, 36),
+    TaxBracket(673001, 857900, 179147, 39),
+    TaxBracket(857901, 1817000, 251258, 41),
+    TaxBracket(1817001, 9999999999, 644489, 45)
+]
+
+REBATES_2026 = {
+    (2026, "Primary"): 17235.0,
+    (2026, "Secondary (65 and older)"): 9444.0,
+    (2026, "Tertiary (75 and older)"): 3145.0
+}
+
+
+@pytest.fixture
+def tax_index():
+    period = make_period("tax_period_2026", 2026, "2025-03-01", "2026-02-28", BRACKETS_2026)
+    return TaxIndex([period], REBATES_2026)
+
+
+# Admin token the app under test is configured with
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The app module, imported once against fixture databases with the 2026 tables."""
+    from benchmarks.fixtures import build_fixtures
+
+    tax_path, rebate_path = build_fixtures(str(tmp_path_factory.mktemp("databases")), years=1, last_year=2026)
+    os.environ.update({
+        "TAX_DB_URI": f"sqlite:///{tax_path}",
+        "REBATE_DB_URI": f"sqlite:///{rebate_path}",
+        "TAX_SNAPSHOT_PATH": "",
+        "DATA_RELOAD_INTERVAL": "0",
+        "ADMIN_TOKEN": ADMIN_TOKEN,
+        "DOWNSTREAM_RETRIES": "0",
+        # Nothing listens there; tests point the clients at stub servers when they need one
+        "USER_INPUT_SERVICE_BASE_URL": "http://127.0.0.1:9",
+        "CALCULATION_SERVICE_BASE_URL": "http://127.0.0.1:9"
+    })
+    import app
+
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from conftest import ADMIN_TOKEN, REBATES_2026
+from tax_index import TaxIndex
+
+HEADERS = {"X-Admin-Token": ADMIN_TOKEN}
+
+
+def test_admin_endpoints_are_disabled_without_a_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    response = client.post("/admin/reload")
+    assert response.status_code == 403
+    assert "ADMIN_TOKEN" in response.get_json()["error"]
+    assert client.get("/admin/data-version").status_code == 403
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}, {"X-Admin-Token": "tökén"}])
+def test_admin_endpoints_require_the_token(client, headers):
+    assert client.post("/admin/reload", headers=headers).status_code == 401
+    assert client.get("/admin/data-version", headers=headers).status_code == 401
+
+
+def test_reload_verifies_the_new_tables(app_module, client, monkeypatch):
+    holder = app_module.tax_index_holder
+    good_loader = holder.loader
+    client.get("/health")
+    deadline = time.monotonic() + 10
+    while client.get("/ready").get_json()["tables"] == "pending" and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    monkeypatch.setattr(holder, "loader", lambda: TaxIndex([], REBATES_2026))
+    assert client.post("/admin/reload", headers=HEADERS).status_code == 200
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.get_json()["tables"] == ["No tax periods loaded"]
+
+    monkeypatch.setattr(holder, "loader", good_loader)
+    assert client.post("/admin/reload", headers=HEADERS).status_code == 200
+    assert client.get("/ready").get_json()["tables"] == "verified"
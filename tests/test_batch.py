@@ -0,0 +1,31 @@
+import pytest
+
+from tax_details import resolve_tax_details_batch
+
+VALID = {"month": 1, "year": 2026, "age_group": "Primary", "projected_annual_income": 300000}
+
+
+def test_valid_record_resolves(tax_index):
+    (result,) = resolve_tax_details_batch(tax_index, [VALID])
+    assert result["projected_annual_income_min_income"] == 237101
+    assert result["rebate_value"] == 17235
+
+
+@pytest.mark.parametrize("field, value, error", [
+    ("month", [1], "Invalid month or year"),
+    ("year", {"y": 2026}, "Invalid month or year"),
+    ("month", True, "Invalid month or year"),
+    ("month", "1", "Invalid month or year"),
+    ("month", 13, "Invalid month or year"),
+    ("age_group", ["x"], "age_group must be a string"),
+    ("projected_annual_income", "lots", "projected_annual_income must be a number"),
+    ("projected_annual_income", None, "Missing required fields: projected_annual_income")
+])
+def test_invalid_fields_are_per_record_errors(tax_index, field, value, error):
+    results = resolve_tax_details_batch(tax_index, [VALID, {**VALID, field: value}, VALID])
+    assert results[1] == {"error": error}
+    assert "error" not in results[0] and "error" not in results[2]
+
+
+def test_non_object_record_is_an_error(tax_index):
+    assert resolve_tax_details_batch(tax_index, ["not a record"]) == [{"error": "Record must be a JSON object"}]
@@ -0,0 +1,66 @@
+import io
+import json
+
+import bulk
+from bulk import stream_results
+
+VALID = {"month": 1, "year": 2026, "age_group": "Primary", "projected_annual_income": 300000}
+
+
+def run(body, tax_index, input_format="ndjson", chunk_size=2):
+    """Stream a body and return the result lines and the outcome."""
+    stream = stream_results(io.BytesIO(body), input_format, tax_index, chunk_size=chunk_size)
+    lines = []
+    while True:
+        try:
+            lines.extend(json.loads(line) for line in next(stream).splitlines())
+        except StopIteration as stop:
+            return lines, stop.value
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+def test_results_keep_input_order(tax_index):
+    lines, outcome = run(ndjson(VALID, VALID, VALID), tax_index)
+    assert [line["row"] for line in lines] == [1, 2, 3]
+    assert outcome == "ok"
+
+
+def test_invalid_records_get_error_rows(tax_index):
+    lines, outcome = run(ndjson(VALID, {**VALID, "month": [1]}, {**VALID, "age_group": {}}) + b"not json\n", tax_index)
+    assert [line.get("error") for line in lines] == [
+        None, "Invalid month or year", "age_group must be a string", "Record must be a JSON object"
+    ]
+    assert outcome == "partial"
+
+
+def test_csv_values_are_validated(tax_index):
+    body = b"month,year,age_group,projected_annual_income\n1,2026,Primary,300000\nJan,2026,Primary,300000\n"
+    lines, outcome = run(body, tax_index, "csv")
+    assert "error" not in lines[0]
+    assert lines[1] == {"row": 2, "error": "Invalid month or year"}
+
+
+def test_failed_chunk_gets_error_rows(tax_index, monkeypatch):
+    resolve_chunk = bulk.resolve_chunk
+
+    def failing(tax_index, first_row, records, output_format="ndjson"):
+        if first_row == 3:
+            raise RuntimeError("boom")
+        return resolve_chunk(tax_index, first_row, records, output_format)
+
+    monkeypatch.setattr(bulk, "resolve_chunk", failing)
+    lines, outcome = run(ndjson(*[VALID] * 5), tax_index)
+    assert [line["row"] for line in lines] == [1, 2, 3, 4, 5]
+    assert [line.get("error") for line in lines] == [None, None, "Could not resolve record",
+                                                       "Could not resolve record", None]
+    assert outcome == "partial"
+
+
+def test_unreadable_input_ends_with_an_error_line(tax_index):
+    lines, outcome = run(ndjson(VALID, VALID, VALID) + b"\xff\n", tax_index)
+    assert [line.get("row") for line in lines] == [1, 2, 3, None]
+    assert lines[-1]["error"].startswith("Could not read input")
+    assert outcome == "error"
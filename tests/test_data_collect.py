@@ -0,0 +1,70 @@
+import importlib.util
+import os
+
+import pytest
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tax_Table_Project")
+FIXTURE = os.path.join(PROJECT_DIR, "fixtures", "rates-of-tax-for-individuals.html")
+
+
+@pytest.fixture(scope="module")
+def data_collect():
+    # data-collect.py is a script whose name is not importable
+    spec = importlib.util.spec_from_file_location("data_collect", os.path.join(PROJECT_DIR, "data-collect.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_tax_table_is_parsed_from_the_saved_page(data_collect):
+    page = data_collect.load_fixture(FIXTURE)
+    tax_table = data_collect.scrape_tax_table_2024(page.url, page=page)
+    assert len(tax_table) == 7
+    assert tax_table[0] == {"min_income": 1, "max_income": 237100, "tax_on_previous_bracket": 0, "tax_percentage": 18}
+    assert tax_table[-1] == {"min_income": 1817001, "max_income": 9999999999, "tax_on_previous_bracket": 644489,
+                             "tax_percentage": 45}
+    for previous, entry in zip(tax_table, tax_table[1:]):
+        assert entry["min_income"] == previous["max_income"] + 1
+
+
+def test_rebate_table_is_parsed_from_the_saved_page(data_collect):
+    page = data_collect.load_fixture(FIXTURE)
+    rebates = data_collect.scrape_rebate_table(page.url, page=page)
+    assert [(entry["age_group"], entry["2026"]) for entry in rebates] == [
+        ("Primary", 17235), ("Secondary (65 and older)", 9444), ("Tertiary (75 and older)", 3145)
+    ]
+
+
+def test_missing_table_is_reported(data_collect):
+    page = data_collect.Page("file://empty", "<html><body><p>No tables</p></body></html>", changed=True)
+    assert data_collect.scrape_tax_table_2024(page.url, page=page) is None
+
+
+class FakeResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent_headers.append(headers)
+        return self.responses.pop(0)
+
+
+def test_only_the_servers_validators_are_sent_back(data_collect, tmp_path):
+    cache = data_collect.HttpCache(str(tmp_path))
+    session = FakeSession(FakeResponse(200, "<html></html>", {"ETag": '"v1"'}), FakeResponse(304))
+    assert data_collect.fetch_page("https://example.test/", cache, session).changed
+    assert cache.load("https://example.test/")[0]["last_modified"] is None
+
+    assert not data_collect.fetch_page("https://example.test/", cache, session).changed
+    assert session.sent_headers[1] == {"If-None-Match": '"v1"'}
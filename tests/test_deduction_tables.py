@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import REBATES_2026
+from deduction_tables import (
+    NO_BRACKET, build_deduction_tables, load_deduction_tables, read_deduction_tables, verify_deduction_tables,
+    write_deduction_tables
+)
+from tax_index import TaxBracket, TaxIndex, make_period
+
+
+def monthly_deduction_cents(monthly_income, rebate_value):
+    """The /calculate-tax formula on the annualized income, in cents."""
+    annual_tax = max(42678 + 0.26 * (monthly_income * 12 - 237101) - rebate_value, 0)
+    return round(annual_tax / 12 * 100)
+
+
+@pytest.fixture
+def deduction_tables(tax_index):
+    return build_deduction_tables(tax_index, band_width=100, max_income=50000)
+
+
+def test_tables_match_the_formula(deduction_tables, tax_index):
+    assert verify_deduction_tables(deduction_tables, tax_index) == []
+    assert len(deduction_tables) == len(REBATES_2026)
+    band = deduction_tables.band(25000)
+    assert band == 250
+    # Each band holds the deduction on its midpoint
+    assert deduction_tables.lookup(2026, "Primary", band) == monthly_deduction_cents(25050, 17235)
+    assert deduction_tables.lookup(2026, "Secondary (65 and older)", band) == monthly_deduction_cents(25050, 26679)
+    assert deduction_tables.lookup(2026, "Primary", 0) == 0
+
+
+def test_bands_outside_the_tables(deduction_tables):
+    assert deduction_tables.band(-1) is None
+    assert deduction_tables.band(49999.99) == 499
+    assert deduction_tables.band(50000) is None
+    assert deduction_tables.lookup(2025, "Primary", 0) is None
+
+
+def test_bands_below_every_bracket_are_marked():
+    period = make_period("tax_period_2026", 2026, "2025-03-01", "2026-02-28",
+                         [TaxBracket(12001, 9999999999, 0, 18)])
+    tables = build_deduction_tables(TaxIndex([period], REBATES_2026), band_width=1000, max_income=5000)
+    assert tables.lookup(2026, "Primary", 0) == NO_BRACKET
+    assert tables.lookup(2026, "Primary", 1) != NO_BRACKET
+
+
+def test_verification_reports_wrong_deductions(deduction_tables, tax_index):
+    deduction_tables._tables[(2026, "Primary")][300] += 1
+    problems = verify_deduction_tables(deduction_tables, tax_index)
+    assert len(problems) == 1 and problems[0].startswith("Deduction table 2026 Primary band 300")
+
+
+def test_table_file_round_trip(deduction_tables, tmp_path):
+    path = str(tmp_path / "deduction_tables.bin")
+    write_deduction_tables(deduction_tables, path)
+    loaded = read_deduction_tables(path)
+    assert (loaded.band_width, loaded.band_count, loaded.digest) == (
+        deduction_tables.band_width, deduction_tables.band_count, deduction_tables.digest
+    )
+    assert {key: list(loaded._tables[key]) for key in loaded.keys()} == {
+        key: list(deduction_tables._tables[key]) for key in deduction_tables.keys()
+    }
+
+    with open(path, "r+b") as tables_file:
+        tables_file.write(b"NOTATAB\x00")
+    assert read_deduction_tables(path) is None
+
+
+def test_file_of_other_tables_is_rebuilt(tax_index, tmp_path):
+    path = str(tmp_path / "deduction_tables.bin")
+    write_deduction_tables(build_deduction_tables(tax_index, band_width=500, max_income=1000), path)
+    loaded = load_deduction_tables(tax_index, path)
+    assert verify_deduction_tables(loaded, tax_index) == []
+    assert loaded.band_width != 500
+
+
+def test_deduction_endpoint(client):
+    response = client.get("/deductions/2026?age_group=Primary&monthly_income=25000")
+    assert response.status_code == 200
+    assert response.get_json()["source"] == "table"
+    assert response.get_json()["monthly_deduction"] == monthly_deduction_cents(25050, 17235) / 100
+
+    above = client.get("/deductions/2026?age_group=Primary&monthly_income=200000").get_json()
+    assert above["source"] == "formula"
+
+    assert client.get("/deductions/1999?age_group=Primary&monthly_income=25000").status_code == 404
+    assert client.get("/deductions/2026?age_group=Primary&monthly_income=-1").status_code == 400
+    assert client.get("/deductions/2026?monthly_income=25000").status_code == 400
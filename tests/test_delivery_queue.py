@@ -0,0 +1,96 @@
+import json
+
+from delivery_queue import DeliveryQueue
+
+
+class FakeResponse:
+    status_code = 200
+
+
+class RecordingClient:
+    name = "Calculation Service"
+
+    def __init__(self):
+        self.bodies = []
+
+    def post(self, path, json=None, **kwargs):
+        self.bodies.append(json)
+        return FakeResponse()
+
+
+def deliver_all(delivery_queue, count):
+    for income in range(count):
+        delivery_queue.submit({"projected_annual_income": income})
+    delivery_queue.stop()
+
+
+def test_payloads_are_posted_one_object_at_a_time(tmp_path):
+    client = RecordingClient()
+    delivery_queue = DeliveryQueue(client, "/receive-tax-rebate-details", flush_interval=0.01,
+                                   dead_letter_path=str(tmp_path / "dead.jsonl"))
+    deliver_all(delivery_queue, 3)
+    assert [body["projected_annual_income"] for body in client.bodies] == [0, 1, 2]
+    assert delivery_queue.delivered == 3
+
+
+def test_larger_batches_are_posted_as_arrays(tmp_path):
+    client = RecordingClient()
+    delivery_queue = DeliveryQueue(client, "/receive-tax-rebate-details", batch_size=10, flush_interval=0.01,
+                                   dead_letter_path=str(tmp_path / "dead.jsonl"))
+    deliver_all(delivery_queue, 3)
+    assert all(isinstance(body, list) for body in client.bodies)
+    assert sum(len(body) for body in client.bodies) == 3
+
+
+class StatusClient:
+    name = "Calculation Service"
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.attempts = 0
+
+    def post(self, path, json=None, **kwargs):
+        self.attempts += 1
+        response = FakeResponse()
+        response.status_code = self.statuses.pop(0) if self.statuses else 200
+        return response
+
+
+def read_dead_letters(path):
+    with open(path, encoding="utf-8") as dead_letter_file:
+        return [json.loads(line) for line in dead_letter_file]
+
+
+def test_rejected_payloads_are_not_retried(tmp_path):
+    client = StatusClient(422)
+    dead_letter_path = str(tmp_path / "dead.jsonl")
+    delivery_queue = DeliveryQueue(client, "/receive-tax-rebate-details", flush_interval=0.01, retry_backoff=0,
+                                   dead_letter_path=dead_letter_path)
+    deliver_all(delivery_queue, 1)
+    assert client.attempts == 1
+    assert [entry["error"] for entry in read_dead_letters(dead_letter_path)] == ["HTTP 422"]
+
+
+def test_throttled_and_server_errors_are_retried(tmp_path):
+    client = StatusClient(429, 503)
+    delivery_queue = DeliveryQueue(client, "/receive-tax-rebate-details", flush_interval=0.01, retry_backoff=0,
+                                   dead_letter_path=str(tmp_path / "dead.jsonl"))
+    deliver_all(delivery_queue, 1)
+    assert client.attempts == 3
+    assert delivery_queue.delivered == 1
+
+
+def test_unexpected_errors_dead_letter_the_batch_and_keep_the_worker(tmp_path):
+    class FailingOnceClient(RecordingClient):
+        def post(self, path, json=None, **kwargs):
+            if json["projected_annual_income"] == 0:
+                raise RuntimeError("boom")
+            return super().post(path, json=json, **kwargs)
+
+    client = FailingOnceClient()
+    dead_letter_path = str(tmp_path / "dead.jsonl")
+    delivery_queue = DeliveryQueue(client, "/receive-tax-rebate-details", flush_interval=0.01,
+                                   dead_letter_path=dead_letter_path)
+    deliver_all(delivery_queue, 3)
+    assert [body["projected_annual_income"] for body in client.bodies] == [1, 2]
+    assert [entry["error"] for entry in read_dead_letters(dead_letter_path)] == ["RuntimeError: boom"]
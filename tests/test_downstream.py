@@ -0,0 +1,163 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downstream import AsyncDownstreamClient, CircuitBreaker, CircuitOpenError, DownstreamClient, DownstreamError
+
+
+class ScriptedServer(ThreadingHTTPServer):
+    """Stub service answering with the scripted status codes in turn, then 200."""
+
+    daemon_threads = True
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+        super().__init__(("127.0.0.1", 0), ScriptedHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        self.server.requests.append((self.command, self.path))
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = b'{"status": "OK"}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(*statuses):
+        server = ScriptedServer(statuses)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_client(server, client_class=DownstreamClient, retries=2, failure_threshold=5, reset_timeout=30):
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+    return client_class("Stub", server.url, retries=retries, backoff_factor=0, circuit_breaker=breaker)
+
+
+def test_idempotent_calls_are_retried_on_503(stub_server):
+    server = stub_server(503, 503)
+    client = make_client(server)
+    assert client.get("/get-user-input").status_code == 200
+    assert len(server.requests) == 3
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_posts_are_not_retried(stub_server):
+    server = stub_server(503)
+    client = make_client(server)
+    assert client.post("/receive-tax-rebate-details", json={}).status_code == 503
+    assert len(server.requests) == 1
+    assert client.errors == {"http_5xx": 1}
+
+
+def test_circuit_opens_and_fails_fast(stub_server):
+    server = stub_server(500, 500, 500)
+    client = make_client(server, retries=0, failure_threshold=2)
+    for _ in range(2):
+        assert client.get("/health").status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.get("/health")
+    assert len(server.requests) == 2
+    assert client.errors == {"http_5xx": 2, "circuit_open": 1}
+
+
+def test_successful_trial_call_closes_the_circuit(stub_server):
+    server = stub_server(500)
+    client = make_client(server, retries=0, failure_threshold=1, reset_timeout=0)
+    client.get("/health")
+    assert client.circuit_breaker.state == CircuitBreaker.OPEN
+    assert client.get("/health").status_code == 200
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_call_reopens_the_circuit(stub_server):
+    server = stub_server(500, 500)
+    client = make_client(server, retries=0, failure_threshold=1, reset_timeout=0)
+    client.get("/health")
+    client.get("/health")
+    assert client.circuit_breaker.state == CircuitBreaker.OPEN
+    assert len(server.requests) == 2
+
+
+def test_unreachable_service_is_a_downstream_error(stub_server):
+    server = stub_server()
+    url = server.url
+    server.shutdown()
+    server.server_close()
+    client = DownstreamClient("Stub", url, retries=0, circuit_breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(DownstreamError):
+        client.get("/health")
+    assert client.errors == {"connection": 1}
+    assert client.circuit_breaker.state == CircuitBreaker.OPEN
+
+
+def test_async_client_retries_and_opens_the_circuit(stub_server):
+    async def scenario():
+        retried = make_client(stub_server(503, 503), AsyncDownstreamClient)
+        assert (await retried.get("/get-user-input")).status_code == 200
+        await retried.close()
+
+        failing = make_client(stub_server(500, 500), AsyncDownstreamClient, retries=0, failure_threshold=2)
+        for _ in range(2):
+            assert (await failing.get("/health")).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await failing.get("/health")
+        await failing.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_trial_call_releases_the_half_open_slot():
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client = AsyncDownstreamClient("Stub", "http://127.0.0.1:9", circuit_breaker=breaker)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        async def never_answers(method, path, **kwargs):
+            await asyncio.sleep(3600)
+
+        client._send = never_answers
+        trial = asyncio.ensure_future(client.get("/health"))
+        await asyncio.sleep(0)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await client.get("/health")
+
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # The next call is let through as the trial instead
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downstream import AsyncDownstreamClient, DownstreamClient
+
+REQUEST = {"month": 6, "year": 2025, "age_group": "Primary", "projected_annual_income": 300000,
+           "projected_annual_income_plus_bonus_leave": 325000}
+
+
+class ProxyErrorHandler(BaseHTTPRequestHandler):
+    """Answers every request with an HTML 502, as a proxy in front of a sleeping service does."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b"<html><body><h1>502 Bad Gateway</h1></body></html>"
+        self.send_response(502)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def proxy_error_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProxyErrorHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_html_error_from_user_input_service(app_module, client, proxy_error_url, monkeypatch):
+    monkeypatch.setattr(app_module, "user_input_client", DownstreamClient("User Input Service", proxy_error_url,
+                                                                         retries=0))
+    response = client.post("/get-tax-details", json={"projected_annual_income": 300000})
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Invalid response from User Input Service"}
+
+
+def test_html_error_from_calculation_service(app_module, client, proxy_error_url, monkeypatch):
+    monkeypatch.setattr(app_module, "calculation_client", DownstreamClient("Calculation Service", proxy_error_url,
+                                                                          retries=0))
+    response = client.post("/get-tax-details", json={**REQUEST, "compute_locally": False})
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Invalid response from Calculation Service"}
+
+
+def test_async_app_handles_html_errors(app_module, proxy_error_url, monkeypatch):
+    import async_app
+
+    async def scenario():
+        user_input_client = AsyncDownstreamClient("User Input Service", proxy_error_url, retries=0)
+        calculation_client = AsyncDownstreamClient("Calculation Service", proxy_error_url, retries=0)
+        monkeypatch.setattr(async_app, "user_input_client", user_input_client)
+        monkeypatch.setattr(async_app, "calculation_client", calculation_client)
+        try:
+            assert await async_app.request_user_input() == {"error": "Invalid response from User Input Service"}
+            assert await async_app.post_to_calculation_service(REQUEST) == {
+                "error": "Invalid response from Calculation Service"
+            }
+        finally:
+            await user_input_client.close()
+            await calculation_client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+import pytest
+
+from tax_details import parse_income_points
+
+
+def income_range(start, stop, step):
+    return {"income_range": {"start": start, "stop": stop, "step": step}}
+
+
+def test_range_includes_stop():
+    assert parse_income_points(income_range(0, 0.3, 0.1), 100).tolist() == [0, 0.1, 0.2, 0.3]
+    assert parse_income_points(income_range(100000, 400000, 100000), 100).tolist() == [
+        100000, 200000, 300000, 400000
+    ]
+
+
+def test_range_stops_before_a_partial_step():
+    assert parse_income_points(income_range(0, 250, 100), 100).tolist() == [0, 100, 200]
+
+
+def test_single_point_range():
+    assert parse_income_points(income_range(5000, 5000, 1), 100).tolist() == [5000]
+
+
+def test_tiny_step_is_rejected_before_allocating():
+    with pytest.raises(ValueError, match="At most 100 incomes"):
+        parse_income_points(income_range(0, 1e6, 1e-320), 100)
+
+
+@pytest.mark.parametrize("field", ["start", "stop", "step"])
+@pytest.mark.parametrize("value", [float("nan"), float("inf")])
+def test_non_finite_range_is_rejected(field, value):
+    body = income_range(0, 1000, 100)
+    body["income_range"][field] = value
+    with pytest.raises(ValueError, match="must be finite"):
+        parse_income_points(body, 100)
+
+
+def test_non_finite_incomes_are_rejected():
+    with pytest.raises(ValueError, match="finite"):
+        parse_income_points({"incomes": [1000, float("nan")]}, 100)
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tax_Table_Project")
+
+spec = importlib.util.spec_from_file_location("ingest", os.path.join(PROJECT_DIR, "ingest.py"))
+ingest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ingest)
+
+BRACKETS = [
+    {"min_income": 1, "max_income": 237100, "tax_on_previous_bracket": 0, "tax_percentage": 18},
+    {"min_income": 237101, "max_income": 370500, "tax_on_previous_bracket": 42678, "tax_percentage": 26},
+    {"min_income": 370501, "max_income": 9999999999, "tax_on_previous_bracket": 77362, "tax_percentage": 31}
+]
+
+
+def test_ingest_creates_the_period_table_it_names(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tax.db'}")
+    report = ingest.ingest_tax_table(engine, 2026, BRACKETS)
+    assert len(report["tax_period_2026"]["added"]) == len(BRACKETS)
+
+    with engine.connect() as conn:
+        (table_name,) = conn.execute(text("SELECT table_name FROM tax_table WHERE financial_year = 2026")).one()
+        rows = conn.execute(text(f"SELECT min_income, tax_percentage FROM {table_name} ORDER BY min_income")).all()
+    assert [tuple(row) for row in rows] == [(bracket["min_income"], bracket["tax_percentage"]) for bracket in BRACKETS]
+
+    # Re-running with the same brackets changes nothing
+    report = ingest.ingest_tax_table(engine, 2026, BRACKETS)
+    assert not any(any(diff.values()) for diff in report.values())
+
+
+def test_changed_brackets_replace_the_period_table_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tax.db'}")
+    ingest.ingest_tax_table(engine, 2026, BRACKETS)
+    changed = [dict(bracket, tax_percentage=bracket["tax_percentage"] + 1) for bracket in BRACKETS]
+    report = ingest.ingest_tax_table(engine, 2026, changed)
+    assert len(report["tax_period_2026"]["updated"]) == len(BRACKETS)
+    with engine.connect() as conn:
+        percentages = conn.execute(text("SELECT tax_percentage FROM tax_period_2026 ORDER BY min_income")).scalars()
+        assert list(percentages) == [bracket["tax_percentage"] for bracket in changed]
+
+
+def load_project_script(name, file_name):
+    script_spec = importlib.util.spec_from_file_location(name, os.path.join(PROJECT_DIR, "tax", file_name))
+    module = importlib.util.module_from_spec(script_spec)
+    script_spec.loader.exec_module(module)
+    return module
+
+
+def test_duplicate_financial_years_are_reported(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tax.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tax_table (id INTEGER PRIMARY KEY, table_name TEXT, financial_year INTEGER, "
+                          "effective_date DATE, end_date DATE)"))
+        conn.execute(text("INSERT INTO tax_table (table_name, financial_year, effective_date, end_date) VALUES "
+                          "('tax_period_2026', 2026, '2025-03-01', '2026-02-28'), "
+                          "('tax_period_2026_old', 2026, '2025-03-01', '2026-02-28')"))
+    with pytest.raises(ValueError, match="2026: tax_period_2026, tax_period_2026_old"):
+        ingest.ingest_tax_table(engine, 2026, BRACKETS)
+
+
+def test_future_adjustments_update_migrated_brackets(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tax.db'}")
+    future_adjustments = load_project_script("future_adjustments", "future-adjustments.py")
+    monkeypatch.setattr(future_adjustments, "engine", engine)
+    future_adjustments.create_and_populate_future_table(2027, [dict(bracket) for bracket in BRACKETS])
+
+    corrected = [dict(bracket, tax_percentage=bracket["tax_percentage"] + 1) for bracket in BRACKETS]
+    future_adjustments.create_and_populate_future_table(2027, corrected)
+    with engine.connect() as conn:
+        for table_name in ("tax_brackets", "tax_period_2027"):
+            percentages = conn.execute(text(f"SELECT tax_percentage FROM {table_name} ORDER BY min_income")).scalars()
+            assert list(percentages) == [bracket["tax_percentage"] for bracket in corrected]
@@ -0,0 +1,29 @@
+import pytest
+
+REQUEST = {"month": 6, "year": 2025, "age_group": "Primary", "projected_annual_income": 300000,
+           "projected_annual_income_plus_bonus_leave": 325000}
+
+# SARS 2026: 42678 + 26% of the income above 237101, less the 17235 primary rebate
+ANNUAL_TAX = round(42678 + 0.26 * (300000 - 237101) - 17235, 2)
+ANNUAL_TAX_PLUS_BONUS_LEAVE = round(42678 + 0.26 * (325000 - 237101) - 17235, 2)
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/calculate-tax", REQUEST),
+    ("/get-tax-details", {**REQUEST, "compute_locally": True})
+])
+def test_local_paye_matches_the_tax_tables(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["annual_tax"] == ANNUAL_TAX == 41796.74
+    assert result["monthly_tax"] == round(ANNUAL_TAX / 12, 2)
+    assert result["annual_tax_plus_bonus_leave"] == ANNUAL_TAX_PLUS_BONUS_LEAVE
+    assert result["tax_on_bonus_leave"] == round(ANNUAL_TAX_PLUS_BONUS_LEAVE - ANNUAL_TAX, 2)
+
+
+@pytest.mark.parametrize("value", ["false", "true", 0, 1, None])
+def test_compute_locally_must_be_a_boolean(client, value):
+    response = client.post("/get-tax-details", json={**REQUEST, "compute_locally": value})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "compute_locally must be true or false"}
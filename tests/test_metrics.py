@@ -0,0 +1,7 @@
+def test_unmatched_requests_do_not_break_metrics(client):
+    assert client.get("/no-such-route").status_code == 404
+    assert client.get("/health").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'endpoint="unmatched",status="404"' in response.get_data(as_text=True)
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def profiling(app_module):
+    # Imported after the app, whose fixture configures the environment app_config reads
+    import profiling
+
+    return profiling
+
+
+@pytest.fixture
+def enabled(profiling, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0)
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "secret")
+
+
+def test_profile_header_needs_the_admin_token(profiling, enabled):
+    assert profiling.requested_mode({"X-Profile": "cprofile", "X-Admin-Token": "secret"}) == "cprofile"
+    assert profiling.requested_mode({"X-Profile": "unknown", "X-Admin-Token": "secret"}) == "timing"
+    assert profiling.requested_mode({"X-Profile": "cprofile", "X-Admin-Token": "wrong"}) is None
+    assert profiling.requested_mode({"X-Profile": "cprofile"}) is None
+
+
+def test_profile_header_is_ignored_without_a_configured_token(profiling, enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", None)
+    assert profiling.requested_mode({"X-Profile": "cprofile", "X-Admin-Token": ""}) is None
+
+
+def test_only_the_newest_captures_are_kept(profiling, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 3)
+    (tmp_path / "notes.txt").write_text("kept")
+    written = []
+    for number in range(5):
+        path = profiling.capture_path("pstats")
+        with open(path, "w") as capture:
+            capture.write("stats")
+        os.utime(path, ns=(number * 10**9, number * 10**9))
+        written.append(os.path.basename(path))
+    assert sorted(os.listdir(tmp_path)) == sorted(written[-3:] + ["notes.txt"])
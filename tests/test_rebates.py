@@ -0,0 +1,47 @@
+import pytest
+
+from tax_details import build_rebate_table, lookup_tax_details
+from tax_index import TaxBracket, TaxIndex, make_period
+
+
+def test_rebates_stack_by_tier(tax_index):
+    assert tax_index.find_rebate(2026, "Primary") == 17235
+    assert tax_index.find_rebate(2026, "Secondary (65 and older)") == 17235 + 9444
+    assert tax_index.find_rebate(2026, "Tertiary (75 and older)") == 17235 + 9444 + 3145
+    assert tax_index.find_rebate(2025, "Primary") is None
+
+
+def test_rebate_table_reports_totals_and_tiers(tax_index):
+    table = build_rebate_table(2026, tax_index.rebates_for_year(2026, cumulative=True), tax_index.rebates_for_year(2026))
+    assert table["rebates"]["Secondary (65 and older)"] == 26679
+    assert table["rebate_tiers"]["Secondary (65 and older)"] == 9444
+
+
+def test_tax_free_thresholds(tax_index):
+    thresholds = tax_index.tax_free_thresholds(2026)
+    assert thresholds["Primary"][1] == pytest.approx(95751)
+    assert thresholds["Secondary (65 and older)"][1] == pytest.approx(148217.67, abs=0.01)
+    assert thresholds["Tertiary (75 and older)"][1] == pytest.approx(165689.89, abs=0.01)
+
+
+def test_is_tax_free_uses_the_threshold_beyond_the_first_bracket():
+    brackets = [TaxBracket(0, 10000, 0, 10), TaxBracket(10001, 50000, 1000, 20)]
+    tax_index = TaxIndex([make_period("tax_period_2026", 2026, "2025-03-01", "2026-02-28", brackets)],
+                         {(2026, "Primary"): 3000.0})
+    period = tax_index.periods[0]
+    assert tax_index.tax_free_threshold(period, 3000.0) == 20001
+    assert tax_index.is_tax_free(period, 3000.0, 15000)
+    assert not tax_index.is_tax_free(period, 3000.0, 20001)
+    assert not tax_index.is_tax_free(period, 3000.0, -1)
+
+
+def test_short_circuit_is_opt_in(tax_index):
+    body = {"month": 1, "year": 2026, "age_group": "Primary",
+            "projected_annual_income": 50000, "projected_annual_income_plus_bonus_leave": 50000}
+    details, status_code, _ = lookup_tax_details(tax_index, body)
+    assert status_code is None
+    assert details["rebate_value"] == 17235
+
+    details, status_code, outcome = lookup_tax_details(tax_index, body, short_circuit=True)
+    assert (status_code, outcome) == (200, "tax_free")
+    assert details["tax_free"] is True
@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+import request_log
+
+
+def test_route_sample_rates_are_parsed():
+    assert request_log.parse_sample_rates(" get_tax_details=0.01, health=0 ,") == {
+        "get_tax_details": 0.01, "health": 0.0
+    }
+
+
+@pytest.mark.parametrize("value", ["health", "=0.5", "health=2", "health=fast"])
+def test_invalid_route_sample_rates_are_rejected(value):
+    with pytest.raises(ValueError):
+        request_log.parse_sample_rates(value)
+
+
+def test_sampled_request_logs_one_summary_line(monkeypatch, caplog):
+    monkeypatch.setattr(request_log, "ROUTE_SAMPLE_RATES", {"health": 0})
+    monkeypatch.setattr(request_log, "LOG_SAMPLE_RATE", 1)
+    caplog.set_level(logging.INFO, logger="request")
+
+    assert request_log.start_request("health") is None
+    request_log.annotate(outcome="ignored")
+
+    summary = request_log.start_request("get_tax_details")
+    with request_log.stage_timer()("find_bracket"):
+        pass
+    request_log.annotate(outcome="ok")
+    request_log.finish_request(summary, "POST", "/get-tax-details", 200)
+
+    (record,) = caplog.records
+    assert record.getMessage().startswith("POST /get-tax-details 200 ")
+    assert record.fields["outcome"] == "ok"
+    assert set(record.fields["stages_ms"]) == {"find_bracket"}
+
+
+def test_json_lines_are_written_by_the_listener():
+    stream = io.StringIO()
+    writer = request_log.LineWriter(stream)
+    writer.setFormatter(request_log.JsonFormatter())
+    queued = request_log.QueuedLogging(writer)
+    queued.start()
+    logger = logging.getLogger("test_request_log")
+    logger.propagate = False
+    logger.addHandler(queued.queue_handler)
+    try:
+        logger.warning("%s of %s", 1, 2, extra={"fields": {"outcome": "ok"}})
+    finally:
+        logger.removeHandler(queued.queue_handler)
+        queued.stop()
+
+    entry = json.loads(stream.getvalue())
+    assert (entry["level"], entry["message"], entry["outcome"]) == ("WARNING", "1 of 2", "ok")
+    assert entry["time"].endswith("Z")
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = request_log.DroppingQueueHandler(queue.SimpleQueue(), max_size=2)
+    for number in range(5):
+        handler.handle(logging.makeLogRecord({"msg": "record %s", "args": (number,)}))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_app_requests_are_summarized(client, caplog):
+    caplog.set_level(logging.INFO, logger="request")
+    response = client.post("/calculate-tax", json={"month": 6, "year": 2025, "age_group": "Primary",
+                                                   "projected_annual_income": 300000,
+                                                   "projected_annual_income_plus_bonus_leave": 300000})
+    assert response.status_code == 200
+    (record,) = [record for record in caplog.records if record.name == "request"]
+    assert record.fields["path"] == "/calculate-tax"
+    assert record.fields["status"] == 200
+    assert record.fields["outcome"] == "ok"
+    assert {"resolve_period", "find_bracket"} <= set(record.fields["stages_ms"])
@@ -0,0 +1,49 @@
+import gc
+import signal
+
+import pytest
+
+import serve
+
+
+def wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def test_restart_delay_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(serve, "WORKER_RESTART_BACKOFF", 0.5)
+    monkeypatch.setattr(serve, "WORKER_MAX_RESTART_DELAY", 3)
+    assert [serve.restart_delay(failures) for failures in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+@pytest.mark.skipif(not hasattr(serve.os, "fork"), reason="prefork mode needs os.fork")
+def test_server_exits_when_workers_keep_failing_to_start(monkeypatch):
+    monkeypatch.setattr(serve, "HOST", "127.0.0.1")
+    monkeypatch.setattr(serve, "PORT", 0)
+    monkeypatch.setattr(serve, "WEB_WORKERS", 1)
+    monkeypatch.setattr(serve, "WORKER_RESTART_BACKOFF", 0.01)
+    monkeypatch.setattr(serve, "WORKER_MAX_RESTARTS", 2)
+    spawned = []
+    spawn_worker = serve._spawn_worker
+
+    def counting_spawn(*args):
+        pid = spawn_worker(*args)
+        spawned.append(pid)
+        return pid
+
+    def failing_start():
+        raise RuntimeError("cannot start")
+
+    monkeypatch.setattr(serve, "_spawn_worker", counting_spawn)
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        with pytest.raises(SystemExit) as exit_info:
+            serve.serve_prefork(wsgi_app, failing_start, lambda: None)
+    finally:
+        gc.unfreeze()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    assert exit_info.value.code == 1
+    # The first worker and WORKER_MAX_RESTARTS replacements
+    assert len(spawned) == 3
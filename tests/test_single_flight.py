@@ -0,0 +1,14 @@
+from single_flight import SingleFlightCache, caller_key
+
+
+def test_cached_results_are_not_shared_between_callers():
+    cache = SingleFlightCache(ttl=60)
+    alice = caller_key("user-input", {"Authorization": "Bearer alice"})
+    bob = caller_key("user-input", {"Authorization": "Bearer bob"})
+    assert cache.get(alice, lambda: {"age_group": "Primary"}) == {"age_group": "Primary"}
+    assert cache.get(bob, lambda: {"age_group": "Secondary"}) == {"age_group": "Secondary"}
+    assert cache.get(alice, lambda: {"age_group": "Tertiary"}) == {"age_group": "Primary"}
+
+
+def test_anonymous_callers_share_a_key():
+    assert caller_key("user-input", {}) == caller_key("user-input", {"Accept": "application/json"})
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from conftest import BRACKETS_2026, REBATES_2026
+from snapshot import HEADER, SnapshotError, build_snapshot, load_snapshot
+from tax_index import TaxBracket, TaxIndex, make_period
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = [str(tmp_path / "tax_database.db"), str(tmp_path / "rebate_database.db")]
+    for path in paths:
+        with open(path, "wb") as database:
+            database.write(b"tables")
+    return paths
+
+
+def test_round_trip_keeps_brackets_and_rebates(tax_index, sources, tmp_path):
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, sources)
+    loaded = load_snapshot(snapshot_path, sources)
+    assert loaded.periods == tax_index.periods
+    assert dict(loaded.rebates) == REBATES_2026
+    period = loaded.period_for_year(2026)
+    for income in (1, 237100, 237100.5, 237101, 9999999999):
+        assert loaded.find_bracket(period, income) == tax_index.find_bracket(tax_index.periods[0], income)
+
+
+def test_vectorized_lookups_read_the_mapped_brackets(tax_index, sources, tmp_path):
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, sources)
+    loaded = load_snapshot(snapshot_path, sources)
+    min_incomes, max_incomes = loaded.bracket_arrays(loaded.periods[0])
+    assert not min_incomes.flags.owndata and not min_incomes.flags.writeable
+    assert min_incomes.tolist() == [bracket.min_income for bracket in BRACKETS_2026]
+    assert max_incomes.tolist() == [bracket.max_income for bracket in BRACKETS_2026]
+
+
+def test_fractional_bounds_are_kept(sources, tmp_path):
+    brackets = [TaxBracket(0.5, 1000.25, 0, 18), TaxBracket(1000.26, 9999999999, 180, 26)]
+    period = make_period("tax_period_2026", 2026, "2025-03-01", "2026-02-28", brackets)
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(TaxIndex([period], REBATES_2026), snapshot_path, sources)
+    assert list(load_snapshot(snapshot_path, sources).periods[0].brackets) == brackets
+
+
+def test_corrupt_payload_is_rejected(tax_index, sources, tmp_path):
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, sources)
+    with open(snapshot_path, "r+b") as snapshot_file:
+        snapshot_file.seek(HEADER.size + 1)
+        byte = snapshot_file.read(1)
+        snapshot_file.seek(HEADER.size + 1)
+        snapshot_file.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(SnapshotError, match="checksum"):
+        load_snapshot(snapshot_path, sources)
+
+
+def test_snapshot_of_changed_databases_is_stale(tax_index, sources, tmp_path):
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, sources)
+    stat = os.stat(sources[0])
+    os.utime(sources[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(SnapshotError, match="stale"):
+        load_snapshot(snapshot_path, sources)
+    # Without SQLite sources there is nothing to check against
+    assert load_snapshot(snapshot_path).periods == tax_index.periods
+
+
+def test_other_format_versions_are_rejected(tax_index, sources, tmp_path):
+    snapshot_path = str(tmp_path / "tax_rules.snapshot")
+    build_snapshot(tax_index, snapshot_path, sources)
+    with open(snapshot_path, "r+b") as snapshot_file:
+        snapshot_file.seek(8)
+        snapshot_file.write((1).to_bytes(4, "little"))
+    with pytest.raises(SnapshotError, match="format version 1"):
+        load_snapshot(snapshot_path, sources)
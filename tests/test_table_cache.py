@@ -0,0 +1,85 @@
+import pytest
+
+from conftest import ADMIN_TOKEN
+from tax_tables_client import TaxTablesClient
+
+
+class FlaskResponse:
+    """A test client response in the shape of a requests.Response."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+
+    def json(self):
+        return self._response.get_json()
+
+    def raise_for_status(self):
+        raise AssertionError(f"Unexpected status {self.status_code}")
+
+
+class FlaskSession:
+    """Sends the client's requests to the Flask test client, in the shape of a requests.Session."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, headers=None, timeout=None):
+        return FlaskResponse(self.client.get(url.removeprefix("http://tax-tables"), headers=headers))
+
+
+@pytest.mark.parametrize("path", ["/tax-tables/2026", "/rebates/2026"])
+def test_unchanged_tables_are_not_modified(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith('W/')
+    assert response.cache_control.public and response.cache_control.max_age is not None
+
+    revalidated = client.get(path, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers["ETag"] == etag
+
+    assert client.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/tax-tables/1999", "/rebates/1999"])
+def test_missing_tables_are_not_found(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_etag_changes_with_the_data(app_module, client, tax_index, monkeypatch):
+    holder = app_module.tax_index_holder
+    etag = client.get("/tax-tables/2026").headers["ETag"]
+
+    monkeypatch.setattr(holder, "loader", lambda: tax_index)
+    monkeypatch.setattr(holder, "on_reload", None)
+    good_index = holder.current
+    try:
+        assert client.post("/admin/reload", headers={"X-Admin-Token": ADMIN_TOKEN}).status_code == 200
+        changed = client.get("/tax-tables/2026", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+    finally:
+        holder.current = good_index
+
+
+def test_client_revalidates_its_cached_tables(app_module, client, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, "TABLE_CACHE_MAX_AGE", 0)
+    tables = TaxTablesClient("http://tax-tables", cache_dir=str(tmp_path), session=FlaskSession(client))
+
+    assert tables.find_bracket(2026, 300000)["min_income"] == 237101
+    assert tables.find_rebate(2026, "Secondary (65 and older)") == 17235 + 9444
+    assert (tables.requests_sent, tables.not_modified) == (2, 0)
+
+    # With max-age 0 every lookup revalidates, and an unchanged table costs a 304
+    assert tables.find_bracket(2026, 237100.5) is None
+    assert (tables.requests_sent, tables.not_modified) == (3, 1)
+
+    # A new client revalidates the tables persisted in the cache directory instead of fetching them
+    restarted = TaxTablesClient("http://tax-tables", cache_dir=str(tmp_path), session=FlaskSession(client))
+    assert restarted.get_tax_table(2026) == tables.get_tax_table(2026)
+    assert restarted.not_modified == 1
+    assert restarted.get_tax_table(1999) is None
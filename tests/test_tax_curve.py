@@ -0,0 +1,30 @@
+def curve_request(**overrides):
+    return {"financial_years": [2026], "age_groups": ["Primary"],
+            "income_range": {"start": 0, "stop": 400000, "step": 100000}, **overrides}
+
+
+def test_curve_matches_the_paye_formula(client):
+    response = client.post("/tax-curve", json=curve_request())
+    assert response.status_code == 200
+    (curve,) = response.get_json()["curves"]
+    # 300000: 42678 + 26% above the bracket's min_income (the Calculation Service formula) less the rebate
+    assert curve["tax"][3] == round(42678 + 0.26 * (300000 - 237101) - 17235, 2)
+    # 0 is below the first bracket
+    assert curve["tax"][0] is None
+    assert curve["tax"][1] == round(0.18 * (100000 - 1) - 17235, 2)
+
+
+def test_repeated_years_and_age_groups_are_one_curve_each(client):
+    response = client.post("/tax-curve", json=curve_request(financial_years=[2026] * 50,
+                                                            age_groups=["Primary"] * 10000))
+    assert response.status_code == 200
+    assert len(response.get_json()["curves"]) == 1
+
+
+def test_oversized_curve_requests_are_rejected(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "TAX_CURVE_MAX_VALUES", 10)
+    response = client.post("/tax-curve", json=curve_request(
+        age_groups=["Primary", "Secondary (65 and older)", "Tertiary (75 and older)"]
+    ))
+    assert response.status_code == 400
+    assert "At most 10 values" in response.get_json()["error"]
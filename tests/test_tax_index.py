@@ -0,0 +1,57 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks import differential
+from benchmarks.fixtures import build_fixtures
+from conftest import BRACKETS_2026
+from tax_index import load_tax_index
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    tax_path, rebate_path = build_fixtures(str(tmp_path_factory.mktemp("databases")), years=3, last_year=2027)
+    return create_engine(f"sqlite:///{tax_path}"), create_engine(f"sqlite:///{rebate_path}")
+
+
+def test_period_bounds_are_inclusive(tax_index):
+    assert tax_index.resolve_period(datetime.date(2025, 2, 28)) is None
+    assert tax_index.resolve_period(datetime.date(2025, 3, 1)).table_name == "tax_period_2026"
+    assert tax_index.resolve_period(datetime.date(2026, 2, 28)).table_name == "tax_period_2026"
+    assert tax_index.resolve_period(datetime.date(2026, 3, 1)) is None
+
+
+def test_bracket_bounds_are_inclusive(tax_index):
+    period = tax_index.periods[0]
+    assert tax_index.find_bracket(period, 0) is None
+    assert tax_index.find_bracket(period, 1) == BRACKETS_2026[0]
+    assert tax_index.find_bracket(period, 237100) == BRACKETS_2026[0]
+    # Incomes between one bracket's max_income and the next min_income match neither
+    assert tax_index.find_bracket(period, 237100.5) is None
+    assert tax_index.find_bracket(period, 237101) == BRACKETS_2026[1]
+    assert tax_index.find_bracket(period, 9999999999) == BRACKETS_2026[-1]
+    assert tax_index.find_bracket(period, 10000000000) is None
+
+
+def test_rebates_stack_on_the_younger_age_groups(tax_index):
+    assert tax_index.find_rebate(2026, "Primary") == 17235
+    assert tax_index.find_rebate(2026, "Secondary (65 and older)") == 17235 + 9444
+    assert tax_index.find_rebate(2026, "Tertiary (75 and older)") == 17235 + 9444 + 3145
+    assert tax_index.find_rebate(2025, "Primary") is None
+
+
+def test_index_matches_the_reference_queries(databases):
+    tax_engine, rebate_engine = databases
+    tax_index = load_tax_index(tax_engine, rebate_engine)
+    dates, incomes, age_groups = differential.generate_cases(tax_index, 2025, 2027, 3000)
+    actual = differential.resolve_scalar(tax_index, dates, incomes, age_groups)
+
+    with tax_engine.connect() as tax_connection, rebate_engine.connect() as rebate_connection:
+        expected = differential.resolve_reference(tax_connection, rebate_connection, dates, incomes, age_groups)
+        sample = slice(0, len(dates), 25)
+        expected_per_row = differential.resolve_reference_per_row(
+            tax_connection, rebate_connection, dates[sample], incomes[sample], age_groups[sample]
+        )
+    assert actual == expected
+    assert actual[sample] == expected_per_row
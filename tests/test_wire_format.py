@@ -0,0 +1,102 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import wire_format
+from downstream import DownstreamClient
+
+# MessagePack is an optional dependency
+pytest.importorskip("msgpack")
+
+MSGPACK = "application/msgpack"
+REQUEST = {"month": 6, "year": 2025, "age_group": "Primary", "projected_annual_income": 300000,
+           "projected_annual_income_plus_bonus_leave": 325000}
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "json"),
+    ("*/*", "json"),
+    ("application/json", "json"),
+    (MSGPACK, "msgpack"),
+    ("application/x-msgpack", "msgpack"),
+    ("application/msgpack, application/json;q=0.5", "msgpack"),
+    ("application/json, application/msgpack;q=0.5", "json"),
+    ("application/msgpack;q=0", "json")
+])
+def test_negotiation_keeps_json_as_the_default(accept, expected):
+    assert wire_format.negotiate(accept) == expected
+
+
+def test_negotiation_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire_format, "msgpack_available", lambda: False)
+    assert wire_format.negotiate(MSGPACK) == "json"
+
+
+def test_bodies_round_trip():
+    body = {"financial_year": 2026, "rebate_value": 17235.0, "age_group": "Primary", "brackets": [1, None]}
+    assert wire_format.unpack(wire_format.pack(body)) == body
+    assert wire_format.decode(wire_format.pack(body), "application/msgpack; charset=binary") == body
+    assert wire_format.decode(b'{"a": 1}', None) == {"a": 1}
+    with pytest.raises(ValueError):
+        wire_format.unpack(b"\xc1")
+
+
+def test_responses_are_negotiated(client):
+    as_json = client.post("/calculate-tax", json=REQUEST)
+    as_msgpack = client.post("/calculate-tax", data=wire_format.pack(REQUEST),
+                             headers={"Content-Type": MSGPACK, "Accept": MSGPACK})
+    assert as_json.mimetype == "application/json"
+    assert as_msgpack.mimetype == MSGPACK
+    assert "Accept" in as_msgpack.headers["Vary"]
+    assert wire_format.unpack(as_msgpack.data) == as_json.get_json()
+    assert len(as_msgpack.data) < len(as_json.data)
+
+
+def test_batch_takes_msgpack(client):
+    response = client.post("/get-tax-details/batch", data=wire_format.pack([REQUEST, {**REQUEST, "month": 13}]),
+                           headers={"Content-Type": MSGPACK, "Accept": MSGPACK})
+    results = wire_format.unpack(response.data)["results"]
+    assert results[0]["projected_annual_income_min_income"] == 237101
+    assert results[1] == {"error": "Invalid month or year"}
+
+
+def test_invalid_msgpack_body_is_rejected(client):
+    response = client.post("/calculate-tax", data=b"\xc1", headers={"Content-Type": MSGPACK})
+    assert response.status_code == 400
+
+
+class MsgpackCalculationHandler(BaseHTTPRequestHandler):
+    """A Calculation Service that only speaks MessagePack, recording what it receives."""
+
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.received.append((self.headers.get("Content-Type"), wire_format.unpack(body)))
+        reply = wire_format.pack({"annual_tax": 41796.74})
+        self.send_response(200)
+        self.send_header("Content-Type", MSGPACK)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_tax_details_are_posted_as_msgpack(app_module, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MsgpackCalculationHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        monkeypatch.setattr(app_module, "CALCULATION_SERVICE_FORMAT", "msgpack")
+        monkeypatch.setattr(app_module, "calculation_client", DownstreamClient(
+            "Calculation Service", f"http://127.0.0.1:{server.server_address[1]}", retries=0
+        ))
+        assert app_module.post_to_calculation_service(REQUEST) == {"annual_tax": 41796.74}
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert MsgpackCalculationHandler.received == [(MSGPACK, REQUEST)]
@@ -0,0 +1,145 @@
+"""
+Wire formats for service-to-service traffic: JSON, and MessagePack as a compact binary alternative.
+
+Clients ask for MessagePack responses with "Accept: application/msgpack" and send
+MessagePack bodies with "Content-Type: application/msgpack" (application/x-msgpack is
+accepted too). JSON stays the default: a request without a MessagePack Accept header,
+or one that prefers JSON, gets the same JSON response as before.
+
+msgpack is imported on first use, so JSON-only deployments never load it.
+"""
+import json
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack")
+WIRE_FORMATS = ("json", "msgpack")
+
+# Listed first, so JSON wins whenever the client rates both formats the same, e.g. */*
+_OFFERED_MIMETYPES = (JSON_MIMETYPE,) + MSGPACK_MIMETYPES
+
+
+def msgpack_available():
+    """
+    Returns:
+        bool: True if the msgpack package can be imported.
+    """
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def is_msgpack(mimetype):
+    """
+    Args:
+        mimetype (str): A mimetype or Content-Type header, possibly with parameters.
+    Returns:
+        bool: True if it names MessagePack.
+    """
+    return bool(mimetype) and mimetype.split(";", 1)[0].strip().lower() in MSGPACK_MIMETYPES
+
+
+def negotiate(accept):
+    """
+    Choose the response format for an Accept header.
+    Args:
+        accept (str): The Accept header, or None.
+    Returns:
+        str: "msgpack" if the client prefers MessagePack and msgpack is installed, otherwise "json".
+    """
+    # Most clients never mention MessagePack, so skip parsing their Accept header
+    if not accept or "msgpack" not in accept:
+        return "json"
+    best = parse_accept_header(accept, MIMEAccept).best_match(_OFFERED_MIMETYPES, default=JSON_MIMETYPE)
+    return "msgpack" if best in MSGPACK_MIMETYPES and msgpack_available() else "json"
+
+
+def pack(body):
+    """
+    Encode a value as MessagePack.
+    Args:
+        body: Any JSON-compatible value.
+    Returns:
+        bytes: The encoded value.
+    """
+    import msgpack
+
+    return msgpack.packb(body, use_bin_type=True)
+
+
+def unpack(data):
+    """
+    Decode a MessagePack value.
+    Args:
+        data (bytes): The encoded value.
+    Returns:
+        The decoded value.
+    Raises:
+        ValueError: If the data is not a single valid MessagePack value.
+    """
+    import msgpack
+
+    # Every msgpack decoding error, including invalid UTF-8 in a string, is a ValueError
+    return msgpack.unpackb(data, raw=False)
+
+
+def unpack_stream(stream):
+    """
+    Decode a stream of concatenated MessagePack values lazily.
+    Args:
+        stream (file): Binary input stream.
+    Yields:
+        The decoded values in order.
+    """
+    import msgpack
+
+    yield from msgpack.Unpacker(stream, raw=False)
+
+
+def decode(data, mimetype):
+    """
+    Decode a request or response body by its content type.
+    Args:
+        data (bytes): The body.
+        mimetype (str): Its Content-Type; anything but MessagePack is decoded as JSON.
+    Returns:
+        The decoded body.
+    Raises:
+        ValueError: If the body is not valid in its format.
+    """
+    if is_msgpack(mimetype):
+        return unpack(data)
+    return json.loads(data)
+
+
+def decode_response(response):
+    """
+    Decode a downstream response body, whichever format the service answered in.
+    Args:
+        response (requests.Response or DownstreamResponse): The response.
+    Returns:
+        The decoded body.
+    """
+    return decode(response.content, response.headers.get("Content-Type"))
+
+
+def request_arguments(payload, wire_format="json"):
+    """
+    Build the body arguments for posting a payload downstream, for either HTTP client.
+    Args:
+        payload: The value to send.
+        wire_format (str): "json" or "msgpack".
+    Returns:
+        dict: json=payload, or the packed body with MessagePack Content-Type and Accept headers.
+    """
+    if wire_format != "msgpack":
+        return {"json": payload}
+    return {
+        "data": pack(payload),
+        "headers": {"Content-Type": MSGPACK_MIMETYPE, "Accept": f"{MSGPACK_MIMETYPE}, {JSON_MIMETYPE};q=0.5"}
+    }